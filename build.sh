@@ -4,5 +4,9 @@ set -o errexit
 
 pip install -r requirements.txt
 
+python manage.py vendor_assets
+python manage.py build_assets
 python manage.py collectstatic --no-input
 python manage.py migrate
+python manage.py sqlite_journal_mode
+python manage.py createcachetable
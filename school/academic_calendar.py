@@ -0,0 +1,69 @@
+"""Cached academic calendar: the term list, the active term and the active
+academic year.
+
+Almost every page needs these, and they change a few times a year. They are
+kept as one cache entry shared by all requests (and, with a shared cache
+backend, all processes) and dropped by signals on ``Term``/``AcademicYear``
+writes; bulk ``update()`` calls must call ``invalidate_calendar`` themselves.
+
+Invalidation only reaches processes sharing the cache. With the per-process
+locmem backend a write from another process (e.g. ``run_promotions``) is not
+seen until the entry expires, so it is kept for
+``settings.CALENDAR_CACHE_TIMEOUT`` seconds only.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import AcademicYear, Term
+
+CALENDAR_KEY = 'academic_calendar'
+
+
+def _build_calendar():
+    terms = list(Term.objects.order_by('id'))
+    years = list(AcademicYear.objects.order_by('-code'))
+    return {
+        'terms': terms,
+        'active_term': next((t for t in terms if t.is_active), None),
+        'years': years,
+        'active_year': next((y for y in years if y.is_active), None),
+    }
+
+
+def get_calendar():
+    calendar = cache.get(CALENDAR_KEY)
+    if calendar is None:
+        calendar = _build_calendar()
+        cache.set(CALENDAR_KEY, calendar, settings.CALENDAR_CACHE_TIMEOUT)
+    return calendar
+
+
+def invalidate_calendar():
+    cache.delete(CALENDAR_KEY)
+
+
+def all_terms():
+    """Every term, oldest first (a list, not a queryset)."""
+    return get_calendar()['terms']
+
+
+def active_term():
+    return get_calendar()['active_term']
+
+
+def get_term(term_id):
+    """The term with ``term_id`` from the cached list, or None."""
+    try:
+        term_id = int(term_id)
+    except (TypeError, ValueError):
+        return None
+    return next((t for t in all_terms() if t.id == term_id), None)
+
+
+def academic_years():
+    """Every academic year, newest first."""
+    return get_calendar()['years']
+
+
+def active_academic_year():
+    return get_calendar()['active_year']
@@ -1,6 +1,60 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
-from .models import User, Class, Subject, Student, Teacher, Term, Mark, Comment, AcademicYear, Enrollment
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.functional import cached_property
+from .models import (
+    User, Class, Subject, Student, Teacher, Term, Mark, Comment, AcademicYear, Enrollment, ClassFee, FeePayment,
+)
+
+
+class ApproximateCountPaginator(Paginator):
+    """Paginator that never counts a whole large table.
+
+    Unfiltered PostgreSQL tables use the planner's row estimate; otherwise the
+    count stops at ``COUNT_LIMIT`` rows. Once ``requested_page`` reaches the
+    end of that approximate count, the rows are counted exactly so the pages
+    beyond it stay reachable.
+    """
+    COUNT_LIMIT = 10000
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, requested_page=1):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.requested_page = requested_page
+
+    @cached_property
+    def count(self):
+        count = self._approximate_count()
+        if count >= self.COUNT_LIMIT and self.requested_page * self.per_page >= count:
+            return self.object_list.count()
+        return count
+
+    def _approximate_count(self):
+        queryset = self.object_list
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] > self.COUNT_LIMIT:
+                return row[0]
+        return queryset[:self.COUNT_LIMIT].count()
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist defaults for tables that grow with enrolment."""
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        try:
+            requested_page = max(int(request.GET.get(PAGE_VAR, 1)), 1)
+        except ValueError:
+            requested_page = 1
+        return self.paginator(queryset, per_page, orphans, allow_empty_first_page, requested_page=requested_page)
 
 
 @admin.register(User)
@@ -24,6 +78,9 @@ class UserAdmin(DjangoUserAdmin):
 class ClassAdmin(admin.ModelAdmin):
     list_display = ['name', 'level', 'promotion_rank', 'class_teacher', 'academic_year']
     list_filter = ['level', 'academic_year']
+    list_select_related = ['class_teacher']
+    search_fields = ['name', 'level']
+    autocomplete_fields = ['class_teacher']
 
 @admin.register(Subject)
 class SubjectAdmin(admin.ModelAdmin):
@@ -31,40 +88,68 @@ class SubjectAdmin(admin.ModelAdmin):
     search_fields = ['code', 'name']
 
 @admin.register(Student)
-class StudentAdmin(admin.ModelAdmin):
+class StudentAdmin(LargeTableAdmin):
     list_display = ['admission_number', 'user', 'student_class', 'guardian_name']
     list_filter = ['student_class']
+    list_select_related = ['user', 'student_class']
     search_fields = ['admission_number', 'user__first_name', 'user__last_name']
+    autocomplete_fields = ['user', 'student_class']
 
 @admin.register(Teacher)
 class TeacherAdmin(admin.ModelAdmin):
     list_display = ['employee_id', 'user']
+    list_select_related = ['user']
     search_fields = ['employee_id', 'user__first_name', 'user__last_name']
+    autocomplete_fields = ['user', 'subjects', 'classes']
 
 @admin.register(Term)
 class TermAdmin(admin.ModelAdmin):
     list_display = ['term', 'academic_year', 'start_date', 'end_date', 'is_active']
     list_filter = ['academic_year', 'is_active']
+    search_fields = ['academic_year']
 
 @admin.register(Mark)
-class MarkAdmin(admin.ModelAdmin):
+class MarkAdmin(LargeTableAdmin):
     list_display = ['student', 'subject', 'term', 'total_marks', 'grade']
     list_filter = ['term', 'subject', 'grade']
+    list_select_related = ['student__user', 'subject', 'term']
     search_fields = ['student__admission_number', 'student__user__first_name']
+    autocomplete_fields = ['student', 'subject', 'term', 'class_assigned', 'teacher']
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = ['student', 'term', 'teacher', 'created_at']
     list_filter = ['term']
+    list_select_related = ['student__user', 'term', 'teacher__user']
     search_fields = ['student__admission_number']
+    autocomplete_fields = ['student', 'term', 'teacher']
 
 @admin.register(AcademicYear)
 class AcademicYearAdmin(admin.ModelAdmin):
     list_display = ['code', 'is_active']
     list_filter = ['is_active']
+    search_fields = ['code']
 
 @admin.register(Enrollment)
-class EnrollmentAdmin(admin.ModelAdmin):
+class EnrollmentAdmin(LargeTableAdmin):
     list_display = ['student', 'academic_year', 'class_assigned', 'status', 'average_score', 'override_status']
     list_filter = ['academic_year', 'status']
-    search_fields = ['student__admission_number', 'student__user__first_name', 'student__user__last_name']
\ No newline at end of file
+    list_select_related = ['student__user', 'academic_year', 'class_assigned']
+    search_fields = ['student__admission_number', 'student__user__first_name', 'student__user__last_name']
+    autocomplete_fields = ['student', 'academic_year', 'class_assigned']
+
+@admin.register(ClassFee)
+class ClassFeeAdmin(admin.ModelAdmin):
+    list_display = ['class_assigned', 'term', 'fee_type', 'amount', 'due_date']
+    list_filter = ['term', 'fee_type']
+    list_select_related = ['class_assigned', 'term']
+    search_fields = ['class_assigned__name', 'description']
+    autocomplete_fields = ['class_assigned', 'term']
+
+@admin.register(FeePayment)
+class FeePaymentAdmin(LargeTableAdmin):
+    list_display = ['receipt_no', 'student', 'term', 'amount_paid', 'payment_method', 'payment_status', 'payment_date']
+    list_filter = ['term', 'payment_status', 'payment_method']
+    list_select_related = ['student__user', 'term']
+    search_fields = ['receipt_no', 'transaction_reference', 'student__admission_number']
+    autocomplete_fields = ['student', 'term', 'processed_by']
\ No newline at end of file
@@ -0,0 +1,276 @@
+"""Mark analytics shared by the statistics endpoints and dashboards.
+
+Everything here works from a single fetch of ``(total_marks, grade)`` rows and
+computes the distribution metrics in Python, so a class/subject/term only ever
+costs one query against the ``marks`` table. Results are cached until a mark
+in the same slice is written (see ``school.signals``), and with a
+per-process cache for ``LOCAL_CACHE_TIMEOUT`` seconds at most.
+"""
+from bisect import bisect_left
+from math import sqrt
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, OuterRef, Subquery
+
+from . import academic_calendar
+from .cache import invalidated_timeout
+from .models import Class, Enrollment, Mark, Student, Subject, Teacher
+
+PASS_MARK = 50
+GRADE_ORDER = ['A+', 'A', 'B+', 'B', 'C', 'D', 'F']
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def _percentile(sorted_values, pct):
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def describe_marks(rows):
+    """Summarise an iterable of (total_marks, grade) rows.
+
+    Returns count, mean, median, population standard deviation, min/max,
+    percentiles, a grade histogram in report order and the pass rate.
+    """
+    totals = []
+    histogram = dict.fromkeys(GRADE_ORDER, 0)
+    for total, grade in rows:
+        totals.append(float(total))
+        histogram[grade] = histogram.get(grade, 0) + 1
+    totals.sort()
+
+    n = len(totals)
+    if not n:
+        return {
+            'count': 0,
+            'mean': None,
+            'median': None,
+            'std_dev': None,
+            'min': None,
+            'max': None,
+            'percentiles': {str(p): None for p in PERCENTILES},
+            'grade_histogram': histogram,
+            'pass_mark': PASS_MARK,
+            'pass_rate': None,
+        }
+
+    mean = sum(totals) / n
+    variance = sum((t - mean) ** 2 for t in totals) / n
+    passed = n - bisect_left(totals, PASS_MARK)
+    return {
+        'count': n,
+        'mean': round(mean, 2),
+        'median': round(_percentile(totals, 50), 2),
+        'std_dev': round(sqrt(variance), 2),
+        'min': totals[0],
+        'max': totals[-1],
+        'percentiles': {str(p): round(_percentile(totals, p), 2) for p in PERCENTILES},
+        'grade_histogram': histogram,
+        'pass_mark': PASS_MARK,
+        'pass_rate': round(passed / n * 100, 2),
+    }
+
+
+def subject_statistics_key(subject_id, class_id, term_id):
+    return f'subject_stats:{subject_id}:{class_id}:{term_id}'
+
+
+def get_subject_statistics(subject_id, class_id, term_id):
+    """Distribution metrics for one subject in one class and term (cached)."""
+    key = subject_statistics_key(subject_id, class_id, term_id)
+    stats = cache.get(key)
+    if stats is None:
+        rows = Mark.objects.filter(
+            subject_id=subject_id,
+            class_assigned_id=class_id,
+            term_id=term_id,
+        ).values_list('total_marks', 'grade')
+        stats = describe_marks(rows)
+        cache.set(key, stats, invalidated_timeout())
+    return stats
+
+
+def invalidate_subject_statistics(subject_id, class_id, term_id):
+    cache.delete(subject_statistics_key(subject_id, class_id, term_id))
+
+
+ADMIN_DASHBOARD_KEY = 'admin_dashboard_snapshot'
+
+
+def build_admin_dashboard_snapshot():
+    """Collect every figure shown on the admin dashboard into a picklable dict."""
+    active_term = academic_calendar.active_term()
+    classes = list(Class.objects.all())
+    terms = academic_calendar.all_terms()
+    subjects = list(Subject.objects.all())
+
+    if active_term:
+        term_marks = Mark.objects.filter(term=active_term)
+        class_averages = list(term_marks.values('class_assigned__name').annotate(
+            average_score=Avg('total_marks'),
+            student_count=Count('student', distinct=True)
+        ))
+        subject_averages = list(term_marks.values('subject__name').annotate(
+            average_score=Avg('total_marks'),
+            student_count=Count('student', distinct=True)
+        ))
+        top_performers = list(term_marks.values(
+            'student_id', 'student__admission_number',
+            'student__user__first_name', 'student__user__last_name',
+        ).annotate(
+            average_score=Avg('total_marks')
+        ).order_by('-average_score')[:5])
+    else:
+        class_averages = []
+        subject_averages = []
+        top_performers = []
+
+    return {
+        'total_students': Student.objects.count(),
+        'total_teachers': Teacher.objects.count(),
+        'total_classes': len(classes),
+        'total_subjects': len(subjects),
+        'active_term': active_term,
+        'class_averages': class_averages,
+        'subject_averages': subject_averages,
+        'top_performers': top_performers,
+        'classes': classes,
+        'terms': terms,
+        'subjects': subjects,
+    }
+
+
+def get_admin_dashboard_snapshot():
+    snapshot = cache.get(ADMIN_DASHBOARD_KEY)
+    if snapshot is None:
+        snapshot = refresh_admin_dashboard_snapshot()
+    return snapshot
+
+
+def refresh_admin_dashboard_snapshot():
+    """Rebuild the admin dashboard snapshot and store it until the next relevant
+    write (or for ``LOCAL_CACHE_TIMEOUT`` seconds with a per-process cache)."""
+    snapshot = build_admin_dashboard_snapshot()
+    cache.set(ADMIN_DASHBOARD_KEY, snapshot, invalidated_timeout())
+    return snapshot
+
+
+def invalidate_admin_dashboard():
+    cache.delete(ADMIN_DASHBOARD_KEY)
+
+
+def _slope(values):
+    """Least-squares slope of values against their position (marks per term)."""
+    n = len(values)
+    if n < 2:
+        return None
+    mean_x = (n - 1) / 2
+    mean_y = sum(values) / n
+    num = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values))
+    den = sum((x - mean_x) ** 2 for x in range(n))
+    return round(num / den, 2)
+
+
+def trajectory_rows(marks):
+    """Group marks per student, term and subject in one query.
+
+    Each row also carries the student's enrollment status and class for the
+    term's academic year, pulled in with correlated subqueries.
+    """
+    enrollment = Enrollment.objects.filter(
+        student=OuterRef('student_id'),
+        academic_year__code=OuterRef('term__academic_year'),
+    )
+    return marks.values(
+        'student_id', 'term_id', 'term__term', 'term__academic_year', 'subject__name'
+    ).annotate(
+        score=Avg('total_marks'),
+        enrollment_status=Subquery(enrollment.values('status')[:1]),
+        enrolled_class=Subquery(enrollment.values('class_assigned__name')[:1]),
+    ).order_by('student_id', 'term__academic_year', 'term__term', 'subject__name')
+
+
+def build_trajectories(rows):
+    """Turn trajectory_rows() output into chart-ready series keyed by student id."""
+    grouped = {}
+    for row in rows:
+        student = grouped.setdefault(row['student_id'], {'terms': {}, 'years': {}, 'subjects': {}})
+        score = float(row['score'] or 0)
+        term = student['terms'].setdefault(row['term_id'], {
+            'term_id': row['term_id'],
+            'term': row['term__term'],
+            'academic_year': row['term__academic_year'],
+            'label': f"Term {row['term__term']} - {row['term__academic_year']}",
+            'class': row['enrolled_class'],
+            'enrollment_status': row['enrollment_status'],
+            'scores': [],
+        })
+        term['scores'].append(score)
+        year = student['years'].setdefault(row['term__academic_year'], {
+            'academic_year': row['term__academic_year'],
+            'class': row['enrolled_class'],
+            'enrollment_status': row['enrollment_status'],
+            'scores': [],
+        })
+        year['scores'].append(score)
+        student['subjects'].setdefault(row['subject__name'], []).append({
+            'term_id': row['term_id'],
+            'label': term['label'],
+            'score': round(score, 2),
+        })
+
+    trajectories = {}
+    for student_id, data in grouped.items():
+        terms = []
+        for term in data['terms'].values():
+            scores = term.pop('scores')
+            term['subjects'] = len(scores)
+            term['average'] = round(sum(scores) / len(scores), 2)
+            term['grade'] = Mark.grade_for(term['average'])
+            terms.append(term)
+
+        years = []
+        for year in data['years'].values():
+            scores = year.pop('scores')
+            year['average'] = round(sum(scores) / len(scores), 2)
+            year['grade'] = Mark.grade_for(year['average'])
+            years.append(year)
+
+        subjects = []
+        for name, series in data['subjects'].items():
+            values = [point['score'] for point in series]
+            subjects.append({
+                'subject': name,
+                'series': series,
+                'change': round(values[-1] - values[0], 2),
+                'slope': _slope(values),
+            })
+
+        grade_movement = []
+        for prev, cur in zip(terms, terms[1:]):
+            grade_movement.append({
+                'from_term': prev['label'],
+                'to_term': cur['label'],
+                'from_grade': prev['grade'],
+                'to_grade': cur['grade'],
+                # Positive steps mean the student moved up the grade scale
+                'steps': GRADE_ORDER.index(prev['grade']) - GRADE_ORDER.index(cur['grade']),
+            })
+
+        trajectories[student_id] = {
+            'terms': terms,
+            'years': years,
+            'subjects': subjects,
+            'grade_movement': grade_movement,
+            'overall_slope': _slope([t['average'] for t in terms]),
+        }
+    return trajectories
+
+
+def empty_trajectory():
+    return {'terms': [], 'years': [], 'subjects': [], 'grade_movement': [], 'overall_slope': None}
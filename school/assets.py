@@ -0,0 +1,143 @@
+"""Frontend asset bundles.
+
+``BUNDLES`` maps a bundle name to the static source files it concatenates.
+``build_bundles`` (run by ``manage.py build_assets`` before
+``collectstatic``) minifies and writes each bundle to ``ASSET_BUILD_DIR``,
+which is a static files directory, so collectstatic fingerprints and gzip/brotli
+compresses the bundles along with everything else and WhiteNoise serves
+them with far-future caching. Everything is read from the local static
+directories; the build needs no network access.
+
+Third-party libraries are vendored under ``static/vendor`` and committed.
+``VENDOR_FILES`` records where each came from; ``manage.py vendor_assets``
+downloads any that are missing (once, with network access) and does
+nothing when they are all present. Vendored ``.min.`` files already ship
+minified with their license banner, so bundles include them unchanged.
+
+``{% asset_bundle %}`` links the built bundle when it exists and the
+individual sources otherwise (development, or before the first build).
+
+The minifiers are deliberately conservative: they drop comments and
+whitespace but never rewrite code, and the JS minifier keeps line breaks so
+automatic semicolon insertion still holds.
+"""
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+
+BUNDLES = {
+    'site.css': ['css/style.css'],
+    'dashboard.js': ['js/dashboard.js'],
+    'bursar_dashboard.js': ['vendor/chart.umd.min.js', 'js/bursar_dashboard.js'],
+    'teacher_dashboard.js': ['js/teacher_dashboard.js'],
+}
+VENDOR_DIR = Path(__file__).resolve().parent / 'static'
+VENDOR_FILES = {
+    'vendor/chart.umd.min.js': 'https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js',
+}
+
+CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+CSS_SPACE_RE = re.compile(r'\s+')
+CSS_PUNCTUATION_RE = re.compile(r'\s*([{};,>])\s*')
+
+
+def bundle_dir():
+    return Path(settings.ASSET_BUILD_DIR)
+
+
+def minify_css(source):
+    source = CSS_COMMENT_RE.sub('', source)
+    source = CSS_SPACE_RE.sub(' ', source)
+    source = CSS_PUNCTUATION_RE.sub(r'\1', source)
+    return source.replace(';}', '}').strip() + '\n'
+
+
+def minify_js(source):
+    """Drop ``//`` comment lines, block comments that start a line, blank
+    lines and indentation. Code after a closing ``*/`` is kept; a ``/*``
+    later in a line may sit inside a string or regex, so it is left alone."""
+    lines = []
+    in_comment = False
+    for line in source.splitlines():
+        stripped = line.strip()
+        while True:
+            if in_comment:
+                end = stripped.find('*/')
+                if end == -1:
+                    stripped = ''
+                    break
+                stripped = stripped[end + 2:].strip()
+                in_comment = False
+            if not stripped.startswith('/*'):
+                break
+            stripped = stripped[2:]
+            in_comment = True
+        if not stripped or stripped.startswith('//'):
+            continue
+        lines.append(stripped)
+    return '\n'.join(lines) + '\n'
+
+
+def _read_source(path):
+    found = finders.find(path)
+    if found is None:
+        hint = ' (run manage.py vendor_assets and commit it)' if path in VENDOR_FILES else ''
+        raise FileNotFoundError(f'Bundle source not found in the static directories: {path}{hint}')
+    return Path(found).read_text(encoding='utf-8')
+
+
+def _minified(path, source):
+    if '.min.' in path:
+        return source.rstrip('\n') + '\n'
+    return minify_css(source) if path.endswith('.css') else minify_js(source)
+
+
+def build_bundle(name):
+    """The minified contents of one bundle."""
+    sources = [_minified(path, _read_source(path)) for path in BUNDLES[name]]
+    if name.endswith('.css'):
+        return ''.join(sources)
+    # Separate files so one without a trailing semicolon cannot run into the next
+    return ';\n'.join(sources)
+
+
+def fetch_vendor_files(out_dir=None):
+    """Download the ``VENDOR_FILES`` missing from ``out_dir`` (default
+    ``school/static``); returns the paths written."""
+    out = Path(out_dir or VENDOR_DIR)
+    fetched = []
+    for path, url in VENDOR_FILES.items():
+        target = out / path
+        if target.exists():
+            continue
+        with urlopen(url, timeout=30) as response:
+            content = response.read()
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(content)
+        fetched.append(path)
+    return fetched
+
+
+def build_bundles(out_dir=None):
+    """Write every bundle under ``out_dir/bundles``; returns ``{name: (source bytes, bundle bytes)}``."""
+    out = Path(out_dir or bundle_dir()) / 'bundles'
+    out.mkdir(parents=True, exist_ok=True)
+    sizes = {}
+    for name in BUNDLES:
+        content = build_bundle(name)
+        (out / name).write_text(content, encoding='utf-8')
+        source_size = sum(len(_read_source(path).encode()) for path in BUNDLES[name])
+        sizes[name] = (source_size, len(content.encode()))
+    return sizes
+
+
+@lru_cache(maxsize=None)
+def bundle_built(name):
+    """Whether ``name`` has been built (checked once per process)."""
+    # os.path rather than Path: template literals are SafeStrings, which pathlib rejects
+    return os.path.isfile(os.path.join(bundle_dir(), 'bundles', name))
@@ -0,0 +1,148 @@
+"""Cache backends that count hits and misses per key namespace.
+
+Each class wraps one of Django's backends and records the outcome of every
+``get`` under the key's namespace: the part before the first ``:``
+(``academic_calendar``, ``subject_stats``, ``data_version``...) or
+``fragment:<name>`` for ``{% cache %}`` fragments. Counts are kept per
+process and added to shared counters in the cache itself every
+``FLUSH_EVERY`` lookups, so with a shared backend the figures cover every
+worker. ``cache_stats`` reads them back for the stats endpoint.
+"""
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends import db, filebased, locmem, redis
+
+STATS_KEY_PREFIX = '_cache_stats'
+NAMESPACES_KEY = f'{STATS_KEY_PREFIX}:namespaces'
+FLUSH_EVERY = 100
+_MISSING = object()
+
+
+def key_namespace(key):
+    if key.startswith('template.cache.'):
+        # template.cache.<fragment name>.<vary-on hash>
+        return 'fragment:' + key.split('.')[2]
+    return key.split(':', 1)[0]
+
+
+class StatsMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._pending = Counter()
+        self._pending_lookups = 0
+        self._namespaces = set()
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version=version)
+        if not key.startswith(STATS_KEY_PREFIX):
+            self._record(key_namespace(key), value is not _MISSING)
+        return default if value is _MISSING else value
+
+    def _record(self, namespace, hit):
+        with self._stats_lock:
+            self._pending[namespace, 'hits' if hit else 'misses'] += 1
+            self._pending_lookups += 1
+            due = self._pending_lookups >= FLUSH_EVERY
+        if due:
+            self.flush_stats()
+
+    def flush_stats(self):
+        """Add this process's pending counts to the shared counters."""
+        with self._stats_lock:
+            pending, self._pending = self._pending, Counter()
+            self._pending_lookups = 0
+        new = {namespace for namespace, _ in pending} - self._namespaces
+        if new:
+            # Read-modify-write: a racing worker can drop a name, which its
+            # next flush puts back
+            known = set(super().get(NAMESPACES_KEY) or ())
+            super().set(NAMESPACES_KEY, sorted(known | new), None)
+            self._namespaces |= known | new
+        for (namespace, outcome), count in pending.items():
+            key = f'{STATS_KEY_PREFIX}:{namespace}:{outcome}'
+            if not self.add(key, count, None):
+                try:
+                    self.incr(key, count)
+                except ValueError:
+                    self.set(key, count, None)
+
+    def stats(self):
+        """``{namespace: {'hits', 'misses', 'hit_rate'}}`` across all processes."""
+        self.flush_stats()
+        namespaces = super().get(NAMESPACES_KEY) or []
+        counts = self.get_many([
+            f'{STATS_KEY_PREFIX}:{namespace}:{outcome}' for namespace in namespaces for outcome in ('hits', 'misses')
+        ])
+        report = {}
+        for namespace in namespaces:
+            hits = counts.get(f'{STATS_KEY_PREFIX}:{namespace}:hits', 0)
+            misses = counts.get(f'{STATS_KEY_PREFIX}:{namespace}:misses', 0)
+            lookups = hits + misses
+            report[namespace] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / lookups * 100, 2) if lookups else None,
+            }
+        return report
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._pending = Counter()
+            self._pending_lookups = 0
+        namespaces = super().get(NAMESPACES_KEY) or []
+        self.delete_many([
+            f'{STATS_KEY_PREFIX}:{namespace}:{outcome}' for namespace in namespaces for outcome in ('hits', 'misses')
+        ] + [NAMESPACES_KEY])
+        self._namespaces = set()
+
+
+class LocMemCache(StatsMixin, locmem.LocMemCache):
+    pass
+
+
+class FileBasedCache(StatsMixin, filebased.FileBasedCache):
+    pass
+
+
+class DatabaseCache(StatsMixin, db.DatabaseCache):
+    pass
+
+
+class RedisCache(StatsMixin, redis.RedisCache):
+    pass
+
+
+def is_shared(alias='default'):
+    """Whether every process sees the same entries: false for locmem, where
+    each worker and management command has a private cache, so deletes and
+    data version bumps made in one never reach the others."""
+    return not isinstance(caches[alias], locmem.LocMemCache)
+
+
+def invalidated_timeout():
+    """Timeout for entries that writes invalidate (deletes or version bumps).
+
+    With a shared cache they are kept until invalidated. With a per-process
+    one, writes from other processes never reach them, so they only live
+    ``settings.LOCAL_CACHE_TIMEOUT`` seconds.
+    """
+    return None if is_shared() else settings.LOCAL_CACHE_TIMEOUT
+
+
+def cache_stats():
+    """Backend, key settings and per-namespace hit rates of every configured cache."""
+    report = {}
+    for alias in caches.settings:
+        backend = caches[alias]
+        report[alias] = {
+            'backend': f'{type(backend).__module__}.{type(backend).__qualname__}',
+            'shared': is_shared(alias),
+            'key_prefix': backend.key_prefix,
+            'version': backend.version,
+            'namespaces': backend.stats() if isinstance(backend, StatsMixin) else None,
+        }
+    return report
@@ -0,0 +1,123 @@
+"""Conditional GET for generated downloads (PDFs, ID cards, search JSON).
+
+Each view gets a validator function that returns ``(etag, last_modified)``
+from cheap lookups - the newest ``updated_at`` and row count of the marks
+and comments involved, plus the data version counters (``data_versions.py``)
+for everything without a timestamp: names, classes, photos, payments and
+fees. A matching ``If-None-Match`` or ``If-Modified-Since`` is answered with
+``304`` before the view body (its queries and ReportLab) runs.
+
+ETags are weak: regenerated PDFs embed a creation time, so equal tags mean
+equal content rather than identical bytes. Responses are marked
+``private, no-cache`` so browsers revalidate every time instead of guessing
+a freshness lifetime from ``Last-Modified``.
+
+The version counters only cover writes from other workers and management
+commands when the cache is shared between processes. With the per-process
+locmem backend a validator could match after another process changed the
+data, so no validators are sent and every request gets a fresh response.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .cache import is_shared
+from .data_versions import get_version, last_changed
+from .models import Comment, FeePayment, Mark
+
+
+def weak_etag(*parts):
+    return 'W/"%s"' % hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def newest(*moments):
+    moments = [m for m in moments if m is not None]
+    return max(moments) if moments else None
+
+
+def download(validators):
+    """Decorator: ``validators(request, *args, **kwargs)`` -> ``(etag, last_modified)``.
+
+    The validators run once per request. Returning ``(None, None)`` (e.g.
+    for a missing object) skips the check and lets the view respond. Without
+    a shared cache the check is skipped altogether (see the module docstring).
+    """
+    def cached(request, *args, **kwargs):
+        if not hasattr(request, '_download_validators'):
+            request._download_validators = validators(request, *args, **kwargs)
+        return request._download_validators
+
+    def decorator(view):
+        conditional_view = condition(
+            etag_func=lambda request, *args, **kwargs: cached(request, *args, **kwargs)[0],
+            last_modified_func=lambda request, *args, **kwargs: cached(request, *args, **kwargs)[1],
+        )(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if is_shared():
+                response = conditional_view(request, *args, **kwargs)
+            else:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def _marks_state(**filters):
+    return Mark.objects.filter(**filters).aggregate(latest=Max('updated_at'), count=Count('id'))
+
+
+def _comments_state(**filters):
+    return Comment.objects.filter(**filters).aggregate(latest=Max('updated_at'), count=Count('id'))
+
+
+def student_report(request, student_id, term_id):
+    marks = _marks_state(student_id=student_id, term_id=term_id)
+    comments = _comments_state(student_id=student_id, term_id=term_id)
+    return (
+        weak_etag('report', student_id, term_id, marks, comments, get_version('school')),
+        newest(marks['latest'], comments['latest'], last_changed('school')),
+    )
+
+
+def class_report(request, class_id, term_id):
+    marks = _marks_state(class_assigned_id=class_id, term_id=term_id)
+    return (
+        weak_etag('class_report', class_id, term_id, marks, get_version('school')),
+        newest(marks['latest'], last_changed('school')),
+    )
+
+
+def fee_receipt(request, payment_id):
+    payment = FeePayment.objects.filter(id=payment_id).values('term_id').first()
+    if payment is None:
+        return None, None
+    # The receipt shows the term's balance, so any payment or fee change counts
+    term_id = payment['term_id']
+    return (
+        weak_etag('receipt', payment_id, get_version('payments', term_id), get_version('fees', term_id),
+                  get_version('school')),
+        newest(last_changed('payments', term_id), last_changed('fees', term_id), last_changed('school')),
+    )
+
+
+def school_data(name):
+    """Validators for downloads that depend only on people, classes and subjects.
+
+    The tag includes the user: some responses (search results) are built for
+    the requesting role, so a body cached for one user must not revalidate
+    for the next one in the same browser.
+    """
+    def validators(request, *args, **kwargs):
+        return (
+            weak_etag(name, request.user.pk, args, sorted(kwargs.items()), sorted(request.GET.lists()),
+                      get_version('school')),
+            last_changed('school'),
+        )
+    return validators
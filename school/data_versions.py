@@ -0,0 +1,67 @@
+"""Data version counters for cache keys.
+
+Each counter names a slice of data, optionally scoped (``('marks', term_id)``,
+``('payments', term_id)``, ``('fees', term_id)``, and the unscoped ``'school'``
+for classes, subjects, people and teaching assignments). Signals bump the
+counter whenever a row in that slice is written, so anything cached under a
+key that includes the current version - e.g. a ``{% cache %}`` fragment varied
+on ``{% data_version %}`` - is simply never looked up again once the data
+changes. No key enumeration is needed; stale entries age out of the cache on
+their own. Bulk writes skip signals and must bump explicitly.
+
+Counters are only seen by every process with a shared cache backend. With a
+per-process one (locmem) a bump in another worker or a management command
+never arrives, so entries keyed on versions are given a TTL instead (see
+``cache.invalidated_timeout``).
+
+Counters start at the current time in milliseconds rather than 1, so a
+counter that is evicted and recreated cannot land on a version that still has
+fragments cached under it. Alongside each counter the time it last moved is
+kept, for ``Last-Modified`` headers (see ``conditional.py``).
+"""
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+
+VERSION_KEY_PREFIX = 'data_version'
+
+
+def version_key(name, scope=None):
+    if scope is None:
+        return f'{VERSION_KEY_PREFIX}:{name}'
+    return f'{VERSION_KEY_PREFIX}:{name}:{scope}'
+
+
+def _changed_key(key):
+    return f'{key}:changed'
+
+
+def _initial_version():
+    return int(time.time() * 1000)
+
+
+def get_version(name, scope=None):
+    key = version_key(name, scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        cache.add(_changed_key(key), timezone.now(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name, scope=None):
+    key = version_key(name, scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Not set yet (or evicted): any fresh value differs from what keys used
+        cache.set(key, _initial_version(), None)
+    cache.set(_changed_key(key), timezone.now(), None)
+
+
+def last_changed(name, scope=None):
+    """When the counter last moved; unknown (evicted) counts as now."""
+    get_version(name, scope)
+    return cache.get(_changed_key(version_key(name, scope))) or timezone.now()
@@ -0,0 +1,210 @@
+"""Unified full-text search over students, guardians, teachers and payments.
+
+Each searchable record becomes one ``SearchDocument`` row whose ``body`` holds
+its normalized words (names, admission/employee numbers, phones, receipt
+numbers, transaction references). Lookups use the database's full-text
+engine: an external-content FTS5 table kept in sync by triggers on SQLite and
+a GIN-indexed tsvector on PostgreSQL (both created by migration 0010); other
+backends fall back to ``LIKE``. Documents are refreshed per record by signals, so the index stays current
+without full rebuilds.
+"""
+import re
+
+from django.db import connection
+
+from .models import FeePayment, SearchDocument, Student, Teacher
+from .search import normalize
+
+DOC_TYPES = ('student', 'guardian', 'teacher', 'payment')
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 20
+
+
+# --- Documents --------------------------------------------------------------
+
+def phone_words(phone):
+    """Digits of a phone number in local (07...) and international (2567...) form."""
+    digits = re.sub(r'\D', '', phone or '')
+    if not digits:
+        return []
+    words = [digits]
+    if digits.startswith('256') and len(digits) > 9:
+        words.append('0' + digits[3:])
+    elif digits.startswith('0'):
+        words.append('256' + digits[1:])
+    return words
+
+
+def _body(*parts):
+    return ' '.join(dict.fromkeys(normalize(' '.join(p for p in parts if p))))
+
+
+def _name(user):
+    return f'{user.first_name} {user.last_name}'.strip() or user.username
+
+
+def student_documents(student):
+    """Student and guardian documents (expects ``user`` and ``student_class`` loaded)."""
+    name = _name(student.user)
+    class_name = student.student_class.name if student.student_class else '-'
+    docs = [dict(
+        doc_type='student', object_id=student.id, title=name,
+        subtitle=f'{student.admission_number} · {class_name}',
+        body=_body(name, student.user.username, student.admission_number),
+    )]
+    if student.guardian_name or student.guardian_phone:
+        docs.append(dict(
+            doc_type='guardian', object_id=student.id, title=student.guardian_name or '-',
+            subtitle=f'{student.guardian_phone} · guardian of {name} ({student.admission_number})',
+            body=_body(student.guardian_name, student.guardian_phone, *phone_words(student.guardian_phone)),
+        ))
+    return docs
+
+
+def teacher_documents(teacher):
+    """Teacher document (expects ``user`` loaded)."""
+    name = _name(teacher.user)
+    return [dict(
+        doc_type='teacher', object_id=teacher.id, title=name,
+        subtitle=teacher.employee_id,
+        body=_body(name, teacher.user.username, teacher.employee_id, teacher.user.email,
+                   teacher.user.phone, *phone_words(teacher.user.phone)),
+    )]
+
+
+def payment_documents(payment):
+    """Payment document (expects ``student__user`` loaded)."""
+    student = payment.student
+    return [dict(
+        doc_type='payment', object_id=payment.id, title=f'Receipt {payment.receipt_no}',
+        subtitle=f'{_name(student.user)} ({student.admission_number}) · {payment.amount_paid} shs · {payment.payment_status}',
+        body=_body(payment.receipt_no, payment.transaction_reference, _name(student.user), student.admission_number),
+    )]
+
+
+def _replace(doc_types, object_ids, docs):
+    SearchDocument.objects.filter(doc_type__in=doc_types, object_id__in=object_ids).delete()
+    SearchDocument.objects.bulk_create([SearchDocument(**d) for d in docs])
+
+
+def index_students(student_ids, payments=True):
+    """Refresh student and guardian documents, plus the students' payments
+    (whose text includes the student's name and admission number). Pass
+    ``payments=False`` when only the class changed."""
+    student_ids = list(student_ids)
+    docs = []
+    for student in Student.objects.select_related('user', 'student_class').filter(id__in=student_ids):
+        docs.extend(student_documents(student))
+    _replace(('student', 'guardian'), student_ids, docs)
+    if payments:
+        index_payments(FeePayment.objects.filter(student_id__in=student_ids).values_list('id', flat=True))
+
+
+def index_teachers(teacher_ids):
+    teacher_ids = list(teacher_ids)
+    docs = []
+    for teacher in Teacher.objects.select_related('user').filter(id__in=teacher_ids):
+        docs.extend(teacher_documents(teacher))
+    _replace(('teacher',), teacher_ids, docs)
+
+
+def index_payments(payment_ids):
+    payment_ids = list(payment_ids)
+    docs = []
+    for payment in FeePayment.objects.select_related('student__user').filter(id__in=payment_ids):
+        docs.extend(payment_documents(payment))
+    _replace(('payment',), payment_ids, docs)
+
+
+def remove_documents(doc_types, object_ids):
+    SearchDocument.objects.filter(doc_type__in=doc_types, object_id__in=list(object_ids)).delete()
+
+
+def rebuild_documents(batch_size=1000):
+    """Rebuild every document; returns the number of documents written."""
+    SearchDocument.objects.all().delete()
+    sources = (
+        (Student.objects.select_related('user', 'student_class'), student_documents),
+        (Teacher.objects.select_related('user'), teacher_documents),
+        (FeePayment.objects.select_related('student__user'), payment_documents),
+    )
+    count = 0
+    for queryset, build in sources:
+        rows = []
+        for obj in queryset.iterator(chunk_size=batch_size):
+            rows.extend(SearchDocument(**d) for d in build(obj))
+            if len(rows) >= batch_size:
+                SearchDocument.objects.bulk_create(rows, batch_size=batch_size)
+                count += len(rows)
+                rows = []
+        SearchDocument.objects.bulk_create(rows, batch_size=batch_size)
+        count += len(rows)
+    return count
+
+
+# --- Queries ----------------------------------------------------------------
+
+_SQLITE_QUERY = """
+    SELECT doc_type, object_id, title, subtitle FROM (
+        SELECT d.doc_type, d.object_id, d.title, d.subtitle,
+               ROW_NUMBER() OVER (PARTITION BY d.doc_type ORDER BY f.rank) AS rn
+        FROM search_documents_fts f JOIN search_documents d ON d.id = f.rowid
+        WHERE search_documents_fts MATCH %s AND d.doc_type IN ({types})
+    ) WHERE rn <= %s
+    ORDER BY doc_type, rn
+"""
+_POSTGRES_QUERY = """
+    SELECT doc_type, object_id, title, subtitle FROM (
+        SELECT doc_type, object_id, title, subtitle,
+               ROW_NUMBER() OVER (
+                   PARTITION BY doc_type ORDER BY ts_rank(to_tsvector('simple', body), q) DESC
+               ) AS rn
+        FROM search_documents, to_tsquery('simple', %s) q
+        WHERE to_tsvector('simple', body) @@ q AND doc_type IN ({types})
+    ) ranked WHERE rn <= %s
+    ORDER BY doc_type, rn
+"""
+
+
+def _fallback_rows(words, doc_types, per_type):
+    qs = SearchDocument.objects.filter(doc_type__in=doc_types)
+    for w in words:
+        qs = qs.filter(body__icontains=w)
+    rows = []
+    for doc_type in doc_types:
+        rows.extend(qs.filter(doc_type=doc_type).order_by('title')
+                    .values_list('doc_type', 'object_id', 'title', 'subtitle')[:per_type])
+    return rows
+
+
+def search(q, limits):
+    """Ranked matches for ``q`` grouped by type.
+
+    ``limits`` maps each wanted doc type to its maximum number of results.
+    Every query word is matched as a prefix, so ``0772`` finds guardian phone
+    ``0772123456`` and ``rcp00`` finds receipt ``RCP0001``.
+    """
+    words = normalize(q)
+    limits = {t: n for t, n in limits.items() if t in DOC_TYPES and n > 0}
+    results = {t: [] for t in limits}
+    if not words or not limits:
+        return results
+    doc_types = list(limits)
+    per_type = max(limits.values())
+    placeholders = ', '.join(['%s'] * len(doc_types))
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{w}"*' for w in words)
+        with connection.cursor() as cursor:
+            cursor.execute(_SQLITE_QUERY.format(types=placeholders), [match, *doc_types, per_type])
+            rows = cursor.fetchall()
+    elif connection.vendor == 'postgresql':
+        match = ' & '.join(f'{w}:*' for w in words)
+        with connection.cursor() as cursor:
+            cursor.execute(_POSTGRES_QUERY.format(types=placeholders), [match, *doc_types, per_type])
+            rows = cursor.fetchall()
+    else:
+        rows = _fallback_rows(words, doc_types, per_type)
+    for doc_type, object_id, title, subtitle in rows:
+        if len(results[doc_type]) < limits[doc_type]:
+            results[doc_type].append({'id': object_id, 'title': title, 'subtitle': subtitle})
+    return results
@@ -0,0 +1,97 @@
+"""Password hashing in bulk.
+
+PBKDF2 is deliberately slow (~100 ms per password), so bulk jobs hash across
+a process pool and write the results with ``bulk_update``/``bulk_create``.
+
+Raising the iteration count of an existing hash needs the raw password,
+which we only see at login. ``PBKDF2WrappedPBKDF2PasswordHasher`` upgrades
+without it: the stored hash is wrapped in a full-strength PBKDF2 round, and
+``must_update`` makes Django replace it with a plain current hash the next
+time the user logs in.
+"""
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password, mask_hash
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext_noop as _
+
+from .workers import chunksize_for
+
+
+class PBKDF2WrappedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """Current-strength PBKDF2 over a weaker ``pbkdf2_sha256`` hash.
+
+    Encoded as ``algorithm$iterations$salt$inner_iterations$inner_salt$hash``.
+    """
+    algorithm = 'pbkdf2_wrapped_pbkdf2_sha256'
+    inner_hasher = PBKDF2PasswordHasher
+
+    def wrap(self, encoded, salt=None, iterations=None):
+        """Wrap an existing ``pbkdf2_sha256`` hash."""
+        algorithm, inner_iterations, inner_salt, inner_hash = encoded.split('$', 3)
+        if algorithm != self.inner_hasher.algorithm:
+            raise ValueError(f'Only {self.inner_hasher.algorithm} hashes can be wrapped, not {algorithm}')
+        outer = super().encode(inner_hash, salt or self.salt(), iterations)
+        algorithm, iterations, salt, outer_hash = outer.split('$', 3)
+        return f'{algorithm}${iterations}${salt}${inner_iterations}${inner_salt}${outer_hash}'
+
+    def decode(self, encoded):
+        algorithm, iterations, salt, inner_iterations, inner_salt, hash = encoded.split('$', 5)
+        if algorithm != self.algorithm:
+            raise ValueError(f'Not a {self.algorithm} hash: {algorithm}')
+        return {
+            'algorithm': algorithm,
+            'hash': hash,
+            'iterations': int(iterations),
+            'salt': salt,
+            'inner_iterations': int(inner_iterations),
+            'inner_salt': inner_salt,
+        }
+
+    def encode(self, password, salt, iterations=None):
+        inner = self.inner_hasher().encode(password, salt)
+        return self.wrap(inner, iterations=iterations)
+
+    def verify(self, password, encoded):
+        decoded = self.decode(encoded)
+        inner = self.inner_hasher().encode(password, decoded['inner_salt'], decoded['inner_iterations'])
+        rewrapped = self.wrap(inner, decoded['salt'], decoded['iterations'])
+        return constant_time_compare(encoded, rewrapped)
+
+    def safe_summary(self, encoded):
+        decoded = self.decode(encoded)
+        return {
+            _('algorithm'): decoded['algorithm'],
+            _('iterations'): decoded['iterations'],
+            _('inner iterations'): decoded['inner_iterations'],
+            _('salt'): mask_hash(decoded['salt']),
+            _('hash'): mask_hash(decoded['hash']),
+        }
+
+    def must_update(self, encoded):
+        # Swap for a plain current hash as soon as the raw password is available
+        return True
+
+
+def needs_iteration_upgrade(encoded):
+    """True for ``pbkdf2_sha256`` hashes below the current iteration count."""
+    parts = (encoded or '').split('$')
+    if len(parts) != 4 or parts[0] != PBKDF2PasswordHasher.algorithm:
+        return False
+    try:
+        return int(parts[1]) < PBKDF2PasswordHasher.iterations
+    except ValueError:
+        return False
+
+
+def wrap_password_hash(encoded):
+    return PBKDF2WrappedPBKDF2PasswordHasher().wrap(encoded)
+
+
+def hash_passwords(pool, raw_passwords):
+    """Hashes for ``raw_passwords``, in order, computed on ``pool``."""
+    raw_passwords = list(raw_passwords)
+    return list(pool.map(make_password, raw_passwords, chunksize=chunksize_for(raw_passwords)))
+
+
+def wrap_password_hashes(pool, hashes):
+    hashes = list(hashes)
+    return list(pool.map(wrap_password_hash, hashes, chunksize=chunksize_for(hashes)))
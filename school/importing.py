@@ -0,0 +1,346 @@
+"""Bulk onboarding of students and teachers from CSV.
+
+``parse_import`` validates every row against preloaded lookups (classes,
+subjects, existing usernames and IDs) without writing anything, which is
+what the preview shows. ``run_import`` then creates the valid rows:
+
+* the ID sequence is first moved past the IDs typed into the file, then
+  missing admission numbers / employee IDs come from one block reservation,
+* passwords are hashed on a process pool before the transaction opens,
+* users, profiles and the teacher subject/class links are ``bulk_create``d
+  in batches inside one transaction,
+* the search indexes and dashboard snapshot that signals would normally
+  maintain are refreshed explicitly.
+
+Hashing costs ~0.4 s of CPU per password, so the web page accepts at most
+``IMPORT_MAX_WEB_ROWS`` rows; ``manage.py import_people`` takes files up to
+``MAX_IMPORT_ROWS``. Between preview and import the upload is kept in a file
+under ``IMPORT_UPLOAD_DIR`` (see ``stash_upload``), not in the session.
+"""
+import csv
+import io
+import re
+import secrets
+import time
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Upper
+from django.utils.crypto import get_random_string
+
+from . import academic_calendar
+from . import fulltext
+from . import sequences
+from .analytics import invalidate_admin_dashboard
+from .data_versions import bump_version
+from .hashing import hash_passwords
+from .models import Class, Student, StudentSearchTerm, Subject, Teacher, User
+from .search import student_terms
+from .workers import process_pool
+
+MAX_IMPORT_ROWS = 5000
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y')
+
+IMPORT_COLUMNS = {
+    'student': {
+        'required': ['first_name', 'last_name', 'date_of_birth', 'guardian_name', 'guardian_phone'],
+        'optional': ['class', 'username', 'email', 'password', 'admission_number'],
+    },
+    'teacher': {
+        'required': ['first_name', 'last_name'],
+        'optional': ['username', 'email', 'password', 'phone', 'employee_id', 'subjects', 'classes'],
+    },
+}
+ID_FIELDS = {'student': 'admission_number', 'teacher': 'employee_id'}
+# Columns stored in a model field, checked against its max_length
+FIELD_COLUMNS = {
+    'first_name': (User, 'first_name'),
+    'last_name': (User, 'last_name'),
+    'username': (User, 'username'),
+    'email': (User, 'email'),
+    'phone': (User, 'phone'),
+    'guardian_name': (Student, 'guardian_name'),
+    'guardian_phone': (Student, 'guardian_phone'),
+    'admission_number': (Student, 'admission_number'),
+    'employee_id': (Teacher, 'employee_id'),
+}
+PHONE_RE = re.compile(r'^\+?[0-9 ()-]+$')
+UPLOAD_KEY_RE = re.compile(r'^[0-9a-f]{32}$')
+# Abandoned previews are deleted after this long
+UPLOAD_MAX_AGE = 24 * 60 * 60
+
+
+class CSVImportError(ValueError):
+    """The file as a whole cannot be imported (bad encoding, missing columns, too many rows)."""
+
+
+def _class_lookup():
+    """Class by lower-cased name, preferring classes of the active academic year."""
+    active_year = academic_calendar.active_academic_year()
+    active = active_year.code if active_year else None
+    lookup = {}
+    for class_obj in Class.objects.only('id', 'name', 'academic_year').order_by('id'):
+        key = class_obj.name.strip().lower()
+        if key not in lookup or class_obj.academic_year == active:
+            lookup[key] = class_obj
+    return lookup
+
+
+def _subject_lookup():
+    lookup = {}
+    for subject in Subject.objects.only('id', 'name', 'code'):
+        lookup[subject.code.strip().lower()] = subject
+        lookup.setdefault(subject.name.strip().lower(), subject)
+    return lookup
+
+
+def _split(value):
+    return [v.strip() for v in (value or '').split(';') if v.strip()]
+
+
+def _parse_date(value):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _upload_dir():
+    return Path(settings.IMPORT_UPLOAD_DIR)
+
+
+def stash_upload(content):
+    """Keep uploaded CSV text until the import is confirmed; returns its key."""
+    directory = _upload_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    cutoff = time.time() - UPLOAD_MAX_AGE
+    for stale in directory.glob('*.csv'):
+        if stale.stat().st_mtime < cutoff:
+            stale.unlink(missing_ok=True)
+    key = secrets.token_hex(16)
+    (directory / f'{key}.csv').write_text(content, encoding='utf-8')
+    return key
+
+
+def pop_upload(key):
+    """CSV text stashed under ``key`` (removed once read), or None."""
+    if not key or not UPLOAD_KEY_RE.match(key):
+        return None
+    path = _upload_dir() / f'{key}.csv'
+    try:
+        content = path.read_text(encoding='utf-8')
+    except FileNotFoundError:
+        return None
+    path.unlink(missing_ok=True)
+    return content
+
+
+def read_rows(kind, content, max_rows=MAX_IMPORT_ROWS):
+    """``[(line_number, {column: value})]`` from CSV text; raises CSVImportError."""
+    reader = csv.DictReader(io.StringIO(content))
+    headers = [h.strip().lower() for h in (reader.fieldnames or [])]
+    missing = [c for c in IMPORT_COLUMNS[kind]['required'] if c not in headers]
+    if missing:
+        raise CSVImportError(f"Missing column(s): {', '.join(missing)}")
+    reader.fieldnames = headers
+    rows = []
+    for record in reader:
+        if len(rows) >= max_rows:
+            raise CSVImportError(f'At most {max_rows} rows can be imported at once')
+        values = {k: (v or '').strip() for k, v in record.items() if k}
+        if any(values.values()):
+            rows.append((reader.line_num, values))
+    return rows
+
+
+def _field_errors(values):
+    """Length and format problems that the database would otherwise reject mid-batch."""
+    errors = []
+    for column, (model, name) in FIELD_COLUMNS.items():
+        max_length = model._meta.get_field(name).max_length
+        if len(values.get(column) or '') > max_length:
+            errors.append(f'{column} is longer than {max_length} characters')
+    if values.get('email'):
+        try:
+            validate_email(values['email'])
+        except ValidationError:
+            errors.append(f"email {values['email']} is not a valid address")
+    if values.get('username'):
+        try:
+            User.username_validator(values['username'])
+        except ValidationError:
+            errors.append('username may only contain letters, digits and @/./+/-/_')
+    for column in ('phone', 'guardian_phone'):
+        if values.get(column) and not PHONE_RE.match(values[column]):
+            errors.append(f'{column} may only contain digits, spaces, brackets, - and a leading +')
+    return errors
+
+
+def parse_import(kind, content, max_rows=MAX_IMPORT_ROWS):
+    """Validate CSV text; returns ``[{'line', 'values', 'errors', ...}]`` without writing."""
+    rows = read_rows(kind, content, max_rows)
+    id_field = ID_FIELDS[kind]
+    model = Student if kind == 'student' else Teacher
+    usernames = {v['username'].lower() for _, v in rows if v.get('username')}
+    ids = {v[id_field] for _, v in rows if v.get(id_field)}
+    taken_usernames = {u.lower() for u in User.objects.filter(username__in=usernames).values_list('username', flat=True)}
+    taken_ids = set(
+        model.objects.annotate(upper_id=Upper(id_field)).filter(upper_id__in={i.upper() for i in ids})
+        .values_list('upper_id', flat=True)
+    )
+    classes = _class_lookup()
+    subjects = _subject_lookup() if kind == 'teacher' else {}
+
+    parsed = []
+    seen_usernames, seen_ids = set(), set()
+    for line, values in rows:
+        errors = []
+        for column in IMPORT_COLUMNS[kind]['required']:
+            if not values.get(column):
+                errors.append(f'{column} is required')
+        username = values.get('username', '')
+        if username:
+            if username.lower() in taken_usernames:
+                errors.append(f'username {username} already exists')
+            elif username.lower() in seen_usernames:
+                errors.append(f'username {username} appears twice in the file')
+            seen_usernames.add(username.lower())
+        row_id = values.get(id_field, '')
+        if row_id:
+            # IDs differing only in case would be confused on cards and in search
+            if row_id.upper() in taken_ids:
+                errors.append(f'{id_field} {row_id} already exists')
+            elif row_id.upper() in seen_ids:
+                errors.append(f'{id_field} {row_id} appears twice in the file')
+            seen_ids.add(row_id.upper())
+        errors.extend(_field_errors(values))
+        row = {'line': line, 'values': values, 'errors': errors}
+        if kind == 'student':
+            row['date_of_birth'] = _parse_date(values.get('date_of_birth', ''))
+            if values.get('date_of_birth') and row['date_of_birth'] is None:
+                errors.append('date_of_birth must be YYYY-MM-DD or DD/MM/YYYY')
+            row['class'] = classes.get(values.get('class', '').lower()) if values.get('class') else None
+            if values.get('class') and row['class'] is None:
+                errors.append(f"unknown class {values['class']}")
+        else:
+            row['subjects'] = [subjects.get(s.lower()) for s in _split(values.get('subjects'))]
+            row['classes'] = [classes.get(c.lower()) for c in _split(values.get('classes'))]
+            for name, obj in zip(_split(values.get('subjects')), row['subjects']):
+                if obj is None:
+                    errors.append(f'unknown subject {name}')
+            for name, obj in zip(_split(values.get('classes')), row['classes']):
+                if obj is None:
+                    errors.append(f'unknown class {name}')
+        parsed.append(row)
+    return parsed
+
+
+def _assign_identity(kind, rows):
+    """Fill in missing IDs (one block reservation), usernames and passwords."""
+    id_field = ID_FIELDS[kind]
+    # Move the sequence past IDs typed into the file first, or the block
+    # reserved below could hand one of them out again
+    sequences.advance_past(kind, [row['values'][id_field] for row in rows if row['values'].get(id_field)])
+    missing = [row for row in rows if not row['values'].get(id_field)]
+    for row, new_id in zip(missing, sequences.reserve(kind, len(missing))):
+        row['id'] = new_id
+    for row in rows:
+        row.setdefault('id', row['values'].get(id_field))
+        row['username'] = row['values'].get('username') or row['id'].lower()
+        row['generated_password'] = '' if row['values'].get('password') else get_random_string(10)
+    # Generated usernames may clash with existing accounts; suffix those
+    generated = [row['username'] for row in rows if not row['values'].get('username')]
+    taken = set(User.objects.filter(username__in=generated).values_list('username', flat=True))
+    taken.update(row['values']['username'] for row in rows if row['values'].get('username'))
+    for row in rows:
+        if row['username'] in taken and not row['values'].get('username'):
+            row['username'] = f"{row['username']}-{get_random_string(4).lower()}"
+
+
+def _index(kind, profiles, batch_size):
+    if kind == 'student':
+        StudentSearchTerm.objects.bulk_create([
+            StudentSearchTerm(student_id=student.id, kind=term_kind, term=term)
+            for student in profiles for term_kind, term in student_terms(student)
+        ], batch_size=batch_size)
+        for start in range(0, len(profiles), batch_size):
+            fulltext.index_students([s.id for s in profiles[start:start + batch_size]])
+    else:
+        for start in range(0, len(profiles), batch_size):
+            fulltext.index_teachers([t.id for t in profiles[start:start + batch_size]])
+
+
+def run_import(kind, rows, batch_size=500, workers=None):
+    """Create the rows without errors; returns ``[{'line', 'name', 'id', 'username', 'password'}]``.
+
+    ``password`` is only filled for generated passwords, which are shown once.
+    """
+    rows = [row for row in rows if not row['errors']]
+    if not rows:
+        return []
+    _assign_identity(kind, rows)
+    with process_pool(workers) as pool:
+        hashes = hash_passwords(pool, [row['values'].get('password') or row['generated_password'] for row in rows])
+
+    user_type = 'student' if kind == 'student' else 'teacher'
+    users = [
+        User(
+            username=row['username'], password=encoded, user_type=user_type,
+            first_name=row['values']['first_name'], last_name=row['values']['last_name'],
+            email=row['values'].get('email', ''), phone=row['values'].get('phone') or None,
+        )
+        for row, encoded in zip(rows, hashes)
+    ]
+    with transaction.atomic():
+        User.objects.bulk_create(users, batch_size=batch_size)
+        if users[0].pk is None:
+            # Backends that cannot return ids from bulk inserts
+            ids = dict(User.objects.filter(username__in=[u.username for u in users]).values_list('username', 'id'))
+            for user in users:
+                user.pk = ids[user.username]
+        if kind == 'student':
+            profiles = [
+                Student(
+                    user=user, admission_number=row['id'], student_class=row['class'],
+                    date_of_birth=row['date_of_birth'], guardian_name=row['values']['guardian_name'],
+                    guardian_phone=row['values']['guardian_phone'],
+                )
+                for row, user in zip(rows, users)
+            ]
+            Student.objects.bulk_create(profiles, batch_size=batch_size)
+        else:
+            profiles = [Teacher(user=user, employee_id=row['id']) for row, user in zip(rows, users)]
+            Teacher.objects.bulk_create(profiles, batch_size=batch_size)
+        if profiles[0].pk is None:
+            model, id_field = (Student, 'admission_number') if kind == 'student' else (Teacher, 'employee_id')
+            ids = dict(model.objects.filter(**{f'{id_field}__in': [r['id'] for r in rows]}).values_list(id_field, 'id'))
+            for profile, row in zip(profiles, rows):
+                profile.pk = ids[row['id']]
+        if kind == 'teacher':
+            Teacher.subjects.through.objects.bulk_create([
+                Teacher.subjects.through(teacher_id=teacher.pk, subject_id=subject.pk)
+                for teacher, row in zip(profiles, rows) for subject in {s.pk: s for s in row['subjects']}.values()
+            ], batch_size=batch_size)
+            Teacher.classes.through.objects.bulk_create([
+                Teacher.classes.through(teacher_id=teacher.pk, class_id=class_obj.pk)
+                for teacher, row in zip(profiles, rows) for class_obj in {c.pk: c for c in row['classes']}.values()
+            ], batch_size=batch_size)
+        _index(kind, profiles, batch_size)
+    invalidate_admin_dashboard()
+    bump_version('school')
+    return [
+        {
+            'line': row['line'],
+            'name': f"{row['values']['first_name']} {row['values']['last_name']}",
+            'id': row['id'],
+            'username': row['username'],
+            'password': row['generated_password'],
+        }
+        for row in rows
+    ]
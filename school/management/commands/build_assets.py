@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from school.assets import build_bundles, bundle_dir
+
+
+class Command(BaseCommand):
+    help = ('Concatenate and minify the frontend bundles into ASSET_BUILD_DIR. '
+            'Run before collectstatic, which fingerprints and precompresses them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Directory to write bundles/ into (default: ASSET_BUILD_DIR)')
+
+    def handle(self, *args, **options):
+        out = options['output'] or bundle_dir()
+        for name, (source_size, size) in build_bundles(out).items():
+            self.stdout.write(f'{name}: {source_size:,} -> {size:,} bytes')
+        self.stdout.write(self.style.SUCCESS(f'Bundles written to {out}/bundles'))
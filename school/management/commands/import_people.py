@@ -0,0 +1,46 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from school.importing import IMPORT_COLUMNS, CSVImportError, parse_import, run_import
+
+
+class Command(BaseCommand):
+    help = ('Import students or teachers from a CSV file, for files too large for the web page. '
+            'Shows the row errors only, unless --commit is given.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORT_COLUMNS))
+        parser.add_argument('path', help='UTF-8 CSV file with the columns shown on the Bulk Import page')
+        parser.add_argument('--commit', action='store_true', help='Create the valid rows')
+        parser.add_argument('--workers', type=int, default=None, help='Hashing processes (default: CPU count)')
+        parser.add_argument('--credentials', help='Write usernames and generated passwords to this CSV file')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], encoding='utf-8-sig') as f:
+                rows = parse_import(options['kind'], f.read())
+        except (OSError, UnicodeDecodeError, CSVImportError) as exc:
+            raise CommandError(str(exc))
+
+        failed = [row for row in rows if row['errors']]
+        for row in failed:
+            self.stdout.write(self.style.ERROR(f"  line {row['line']}: {'; '.join(row['errors'])}"))
+        if not options['commit']:
+            self.stdout.write(f'{len(rows) - len(failed)} row(s) ready, {len(failed)} with errors. '
+                              f'Run again with --commit to import.')
+            return
+
+        generates_passwords = any(not row['errors'] and not row['values'].get('password') for row in rows)
+        if generates_passwords and not options['credentials']:
+            raise CommandError('Some rows have no password; pass --credentials to save the generated ones.')
+
+        created = run_import(options['kind'], rows, workers=options['workers'])
+        if options['credentials']:
+            with open(options['credentials'], 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=['line', 'name', 'id', 'username', 'password'])
+                writer.writeheader()
+                writer.writerows(created)
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Imported {len(created)} {options['kind']}(s), {len(failed)} row(s) skipped"
+        ))
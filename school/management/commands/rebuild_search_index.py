@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from school.fulltext import rebuild_documents
+from school.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the student search index and the unified full-text search documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Indexed {count} students'))
+        documents = rebuild_documents(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Wrote {documents} full-text search documents'))
@@ -1,34 +1,42 @@
 from django.core.management.base import BaseCommand
-from school.models import Student, Teacher
+
+from school.renumbering import apply_renumbering, plan_renumbering
+from school.sequences import id_pattern
 
 
 class Command(BaseCommand):
-    help = 'Regenerate student admission numbers and teacher employee IDs to ST#### and TC#### format'
+    help = 'Regenerate student admission numbers and teacher employee IDs to the configured format (e.g. ST####, TC####)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Show the planned changes without saving them')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--only', choices=['students', 'teachers'], help='Renumber just one group')
 
     def handle(self, *args, **options):
-        # Regenerate student admission numbers
-        students = Student.objects.all().order_by('id')
-        self.stdout.write('Regenerating student admission numbers...')
-        
-        for idx, student in enumerate(students, start=1):
-            old_admission = student.admission_number
-            new_admission = f"ST{idx:04d}"
-            student.admission_number = new_admission
-            student.save(update_fields=['admission_number'])
-            self.stdout.write(f'  {old_admission} → {new_admission} ({student.user.get_full_name()})')
-        
-        self.stdout.write(self.style.SUCCESS(f'✓ Updated {students.count()} student admission numbers'))
-        
-        # Regenerate teacher employee IDs
-        teachers = Teacher.objects.all().order_by('id')
-        self.stdout.write('\nRegenerating teacher employee IDs...')
-        
-        for idx, teacher in enumerate(teachers, start=1):
-            old_employee_id = teacher.employee_id
-            new_employee_id = f"TC{idx:04d}"
-            teacher.employee_id = new_employee_id
-            teacher.save(update_fields=['employee_id'])
-            self.stdout.write(f'  {old_employee_id} → {new_employee_id} ({teacher.user.get_full_name()})')
-        
-        self.stdout.write(self.style.SUCCESS(f'✓ Updated {teachers.count()} teacher employee IDs'))
-        self.stdout.write(self.style.SUCCESS('\n✓ All IDs regenerated successfully!'))
+        groups = [('student', 'students', 'student admission numbers'), ('teacher', 'teachers', 'teacher employee IDs')]
+        for name, group, label in groups:
+            if options['only'] and options['only'] != group:
+                continue
+            self.renumber(name, label, options)
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('\nDry run: nothing was saved'))
+        else:
+            self.stdout.write(self.style.SUCCESS('\n✓ All IDs regenerated successfully!'))
+
+    def renumber(self, name, label, options):
+        self.stdout.write(f'Regenerating {label} ({id_pattern(name)})...')
+        plan = plan_renumbering(name)
+        changed = [row for row in plan if row[1] != row[2]]
+        # Per-row listing only at -v 2; large schools would flood the terminal
+        if options['verbosity'] >= 2 or options['dry_run']:
+            for _, old, new, full_name in changed:
+                self.stdout.write(f'  {old} → {new} ({full_name})')
+        if options['dry_run']:
+            self.stdout.write(f'  {len(changed)} of {len(plan)} would change')
+            return
+
+        def progress(done, total):
+            self.stdout.write(f'  {done}/{total}')
+
+        count = apply_renumbering(name, plan, batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f'✓ Updated {count} {label} ({len(plan) - count} already correct)'))
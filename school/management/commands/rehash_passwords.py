@@ -1,20 +1,54 @@
 from django.core.management.base import BaseCommand
 
+from school.hashing import hash_passwords, needs_iteration_upgrade, wrap_password_hashes
+from school.workers import process_pool
+
+# Encoded-hash prefixes; anything else (and not unusable) is treated as a raw password
+HASH_PREFIXES = (
+    'pbkdf2_', 'argon2$', 'bcrypt$', 'bcrypt_sha256$', 'scrypt$', 'sha1$', 'md5$',
+    'unsalted_md5$', 'unsalted_sha1$', 'crypt$', '!',
+)
+
+
 class Command(BaseCommand):
-    help = 'Re-hash plaintext passwords stored on the custom User model if any exist.'
+    help = ('Re-hash plaintext passwords stored on the custom User model if any exist. '
+            'With --upgrade-iterations, also strengthen PBKDF2 hashes below the current iteration count.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Users loaded, hashed and written per batch')
+        parser.add_argument('--workers', type=int, default=None, help='Hashing processes (default: CPU count)')
+        parser.add_argument('--upgrade-iterations', action='store_true',
+                            help='Wrap weaker pbkdf2_sha256 hashes in a current-strength round')
 
     def handle(self, *args, **options):
         from school.models import User
-        prefixes = ('pbkdf2_', 'argon2$', 'bcrypt$', 'bcrypt_sha256$', 'sha1$', 'md5$')
-        rehashed = 0
-        for user in User.objects.all():
-            pw = user.password or ''
-            # If password doesn't look like a hashed value, assume it's raw and hash it.
-            if pw and not pw.startswith(prefixes):
-                raw = pw
-                user.set_password(raw)
-                user.save()
-                rehashed += 1
-                self.stdout.write(self.style.SUCCESS(f'Re-hashed password for: {user.username}'))
+        chunk_size = options['chunk_size']
+        upgrade = options['upgrade_iterations']
+        rehashed = upgraded = 0
+        last_id = 0
+        with process_pool(options['workers']) as pool:
+            while True:
+                # Stream by primary key so memory stays flat however many users exist
+                chunk = list(
+                    User.objects.filter(id__gt=last_id).order_by('id').only('id', 'username', 'password')[:chunk_size]
+                )
+                if not chunk:
+                    break
+                last_id = chunk[-1].id
+
+                raw = [u for u in chunk if u.password and not u.password.startswith(HASH_PREFIXES)]
+                weak = [u for u in chunk if upgrade and needs_iteration_upgrade(u.password)]
+                for user, encoded in zip(raw, hash_passwords(pool, [u.password for u in raw])):
+                    user.password = encoded
+                for user, encoded in zip(weak, wrap_password_hashes(pool, [u.password for u in weak])):
+                    user.password = encoded
+                if raw or weak:
+                    User.objects.bulk_update(raw + weak, ['password'])
+                for user in raw:
+                    self.stdout.write(self.style.SUCCESS(f'Re-hashed password for: {user.username}'))
+                rehashed += len(raw)
+                upgraded += len(weak)
 
         self.stdout.write(self.style.SUCCESS(f'Done. {rehashed} user(s) re-hashed.'))
+        if upgrade:
+            self.stdout.write(self.style.SUCCESS(f'Done. {upgraded} hash(es) upgraded to the current iteration count.'))
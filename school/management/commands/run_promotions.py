@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from school.models import PromotionRun
+from school.promotion import run_promotion
+
+
+class Command(BaseCommand):
+    help = 'Run pending promotion jobs and resume failed or interrupted ones from their last committed chunk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--run-id', type=int, help='Only process this promotion run')
+        parser.add_argument('--chunk-size', type=int, help='Students written per transaction')
+        parser.add_argument('--stale-minutes', type=int, default=settings.PROMOTION_STALE_MINUTES,
+                            help='Treat running jobs with no progress for this long as interrupted')
+
+    def handle(self, *args, **options):
+        runs = PromotionRun.objects.exclude(status='completed').order_by('created_at')
+        if options['run_id']:
+            runs = runs.filter(id=options['run_id'])
+        else:
+            stale = timezone.now() - timedelta(minutes=options['stale_minutes'])
+            runs = runs.filter(Q(status__in=['pending', 'failed']) | Q(status='running', updated_at__lt=stale))
+
+        processed = 0
+        for run in runs:
+            self.stdout.write(f'Running promotion #{run.id} ({run.source_year} → {run.target_year}) from student id > {run.last_student_id}...')
+            run = run_promotion(run, chunk_size=options['chunk_size'])
+            processed += 1
+            if run.status == 'completed':
+                self.stdout.write(self.style.SUCCESS(
+                    f'  ✓ {run.promoted} promoted, {run.repeating} repeating, {run.graduated} graduated'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f'  ✗ Failed after {run.processed} students: {run.error}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Done. {processed} run(s) processed.'))
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = ('Set the journal mode of a SQLite database (default: SQLITE_JOURNAL_MODE, i.e. WAL). '
+            'The mode is stored in the database file, so this only needs to run once per database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', help='Journal mode to set (default: SQLITE_JOURNAL_MODE)')
+        parser.add_argument('--database', default='default', help='Database alias (default: default)')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            self.stdout.write(f'{options["database"]} is not a SQLite database; nothing to do')
+            return
+        mode = options['mode'] or settings.SQLITE_JOURNAL_MODE
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA journal_mode={mode}')
+            current = cursor.fetchone()[0]
+        self.stdout.write(self.style.SUCCESS(f'Journal mode of {connection.settings_dict["NAME"]}: {current}'))
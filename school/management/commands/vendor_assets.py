@@ -0,0 +1,22 @@
+from urllib.error import URLError
+
+from django.core.management.base import BaseCommand, CommandError
+
+from school.assets import VENDOR_DIR, VENDOR_FILES, fetch_vendor_files
+
+
+class Command(BaseCommand):
+    help = ('Download the vendored third-party files (school/static/vendor) that are missing. '
+            'Commit what it writes; with every file present it does nothing and needs no network.')
+
+    def handle(self, *args, **options):
+        try:
+            fetched = fetch_vendor_files()
+        except URLError as exc:
+            raise CommandError(f'Could not download the vendored files: {exc.reason}')
+        for path in fetched:
+            self.stdout.write(f'{path} <- {VENDOR_FILES[path]}')
+        if fetched:
+            self.stdout.write(self.style.SUCCESS(f'Wrote {len(fetched)} file(s) under {VENDOR_DIR}; commit them'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Vendored files are all present'))
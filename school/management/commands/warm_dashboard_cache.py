@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from school.analytics import refresh_admin_dashboard_snapshot
+from school.cache import is_shared
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the cached admin dashboard snapshot (run after deploys or large imports). '
+            'Needs a cache shared with the web workers (CACHE_BACKEND db, file or redis).')
+
+    def handle(self, *args, **options):
+        if not is_shared():
+            raise CommandError(
+                'The default cache is per-process (locmem), so a snapshot built here would vanish '
+                'when this command exits. Set CACHE_BACKEND to db, file or redis first.'
+            )
+        snapshot = refresh_admin_dashboard_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Dashboard snapshot cached: {snapshot['total_students']} students, "
+            f"{snapshot['total_teachers']} teachers, {snapshot['total_classes']} classes"
+        ))
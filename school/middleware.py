@@ -0,0 +1,49 @@
+"""Per-request loading of the logged-in user's Student or Teacher profile.
+
+``RoleProfileMiddleware`` sets ``request.profile``, a lazy object that loads
+the profile matching ``user.type`` at most once per request, with the
+student's class joined in and the teacher's subjects and classes prefetched.
+Loading it also primes the reverse one-to-one caches on ``request.user``, so
+``request.user.student`` / ``request.user.teacher`` (e.g. in templates) no
+longer query. Pages that never touch the profile pay nothing.
+"""
+from django.utils.functional import SimpleLazyObject
+
+from .models import Student, Teacher
+
+PROFILE_ATTR = '_role_profile'
+
+
+def _load_profile(user):
+    if user.user_type == 'student':
+        return Student.objects.select_related('student_class').filter(user=user).first()
+    if user.user_type == 'teacher':
+        return Teacher.objects.prefetch_related('subjects', 'classes').filter(user=user).first()
+    return None
+
+
+def get_role_profile(request):
+    """The Student/Teacher for ``request.user``, or None (admins, bursars, anonymous users)."""
+    if not hasattr(request, PROFILE_ATTR):
+        user = request.user
+        profile = None
+        if user.is_authenticated:
+            profile = _load_profile(user)
+            if profile is not None:
+                # Reuse the request's user rather than joining a second copy
+                profile.user = user
+            for model in (Student, Teacher):
+                model._meta.get_field('user').remote_field.set_cached_value(
+                    user, profile if isinstance(profile, model) else None
+                )
+        setattr(request, PROFILE_ATTR, profile)
+    return getattr(request, PROFILE_ATTR)
+
+
+class RoleProfileMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.profile = SimpleLazyObject(lambda: get_role_profile(request))
+        return self.get_response(request)
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0006_academicyear_class_promotion_rank_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PromotionRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_year', models.CharField(max_length=9)),
+                ('target_year', models.CharField(max_length=9)),
+                ('stream_policy', models.CharField(default='same_stream', max_length=20)),
+                ('activate_target', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('total_students', models.PositiveIntegerField(default=0)),
+                ('processed', models.PositiveIntegerField(default=0)),
+                ('last_student_id', models.BigIntegerField(default=0)),
+                ('promoted', models.PositiveIntegerField(default=0)),
+                ('repeating', models.PositiveIntegerField(default=0)),
+                ('graduated', models.PositiveIntegerField(default=0)),
+                ('class_stats', models.JSONField(blank=True, default=list)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'promotion_runs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0007_promotionrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promotionrun',
+            name='previous_active_years',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='promotionrun',
+            name='rolled_back_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='promotionrun',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed'), ('rolled_back', 'Rolled Back')], default='pending', max_length=12),
+        ),
+        migrations.CreateModel(
+            name='PromotionSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rows', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='school.promotionrun')),
+            ],
+            options={
+                'db_table': 'promotion_snapshots',
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:03
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copies of the school.search helpers as of this migration, so later
+# changes to the live module cannot change what this migration writes
+MAX_TERM_LENGTH = 50
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return [w[:MAX_TERM_LENGTH] for w in _WORD_RE.findall(text)]
+
+
+def trigrams(word):
+    if len(word) <= 3:
+        return {word}
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+def index_terms(*texts):
+    words = set(normalize(' '.join(t or '' for t in texts)))
+    terms = {('w', w) for w in words}
+    for w in words:
+        terms.update(('g', g) for g in trigrams(w))
+    return terms
+
+
+def build_search_index(apps, schema_editor):
+    Student = apps.get_model('school', 'Student')
+    StudentSearchTerm = apps.get_model('school', 'StudentSearchTerm')
+    rows = []
+    for student in Student.objects.select_related('user').iterator():
+        rows.extend(
+            StudentSearchTerm(student_id=student.id, kind=kind, term=term)
+            for kind, term in index_terms(student.user.first_name, student.user.last_name, student.admission_number)
+        )
+    StudentSearchTerm.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0008_promotion_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('w', 'Word'), ('g', 'Trigram')], max_length=1)),
+                ('term', models.CharField(max_length=50)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='school.student')),
+            ],
+            options={
+                'db_table': 'student_search_terms',
+                'indexes': [models.Index(fields=['kind', 'term'], name='student_search_kind_term')],
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,150 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:07
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# Frozen copies of the school.fulltext helpers as of this migration, so later
+# changes to the live module cannot change what this migration creates
+
+SQLITE_SETUP_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_documents_fts USING fts5("
+    "body, content='search_documents', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(rowid, body) VALUES (new.id, new.body); END",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(search_documents_fts, rowid, body) VALUES ('delete', old.id, old.body); END",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(search_documents_fts, rowid, body) VALUES ('delete', old.id, old.body); "
+    "INSERT INTO search_documents_fts(rowid, body) VALUES (new.id, new.body); END",
+]
+SQLITE_TEARDOWN_SQL = [
+    "DROP TRIGGER IF EXISTS search_documents_au",
+    "DROP TRIGGER IF EXISTS search_documents_ad",
+    "DROP TRIGGER IF EXISTS search_documents_ai",
+    "DROP TABLE IF EXISTS search_documents_fts",
+]
+POSTGRES_SETUP_SQL = [
+    "CREATE INDEX IF NOT EXISTS search_documents_body_tsv "
+    "ON search_documents USING GIN (to_tsvector('simple', body))",
+]
+POSTGRES_TEARDOWN_SQL = [
+    "DROP INDEX IF EXISTS search_documents_body_tsv",
+]
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def create_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE_SETUP_SQL, 'postgresql': POSTGRES_SETUP_SQL}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE_TEARDOWN_SQL, 'postgresql': POSTGRES_TEARDOWN_SQL}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return [w[:50] for w in _WORD_RE.findall(text)]
+
+
+def phone_words(phone):
+    digits = re.sub(r'\D', '', phone or '')
+    if not digits:
+        return []
+    words = [digits]
+    if digits.startswith('256') and len(digits) > 9:
+        words.append('0' + digits[3:])
+    elif digits.startswith('0'):
+        words.append('256' + digits[1:])
+    return words
+
+
+def _body(*parts):
+    return ' '.join(dict.fromkeys(normalize(' '.join(p for p in parts if p))))
+
+
+def _name(user):
+    return f'{user.first_name} {user.last_name}'.strip() or user.username
+
+
+def student_documents(student):
+    name = _name(student.user)
+    class_name = student.student_class.name if student.student_class else '-'
+    docs = [dict(
+        doc_type='student', object_id=student.id, title=name,
+        subtitle=f'{student.admission_number} · {class_name}',
+        body=_body(name, student.user.username, student.admission_number),
+    )]
+    if student.guardian_name or student.guardian_phone:
+        docs.append(dict(
+            doc_type='guardian', object_id=student.id, title=student.guardian_name or '-',
+            subtitle=f'{student.guardian_phone} · guardian of {name} ({student.admission_number})',
+            body=_body(student.guardian_name, student.guardian_phone, *phone_words(student.guardian_phone)),
+        ))
+    return docs
+
+
+def teacher_documents(teacher):
+    name = _name(teacher.user)
+    return [dict(
+        doc_type='teacher', object_id=teacher.id, title=name,
+        subtitle=teacher.employee_id,
+        body=_body(name, teacher.user.username, teacher.employee_id, teacher.user.email,
+                   teacher.user.phone, *phone_words(teacher.user.phone)),
+    )]
+
+
+def payment_documents(payment):
+    student = payment.student
+    return [dict(
+        doc_type='payment', object_id=payment.id, title=f'Receipt {payment.receipt_no}',
+        subtitle=f'{_name(student.user)} ({student.admission_number}) · {payment.amount_paid} shs · {payment.payment_status}',
+        body=_body(payment.receipt_no, payment.transaction_reference, _name(student.user), student.admission_number),
+    )]
+
+
+def build_documents(apps, schema_editor):
+    SearchDocument = apps.get_model('school', 'SearchDocument')
+    sources = (
+        (apps.get_model('school', 'Student').objects.select_related('user', 'student_class'), student_documents),
+        (apps.get_model('school', 'Teacher').objects.select_related('user'), teacher_documents),
+        (apps.get_model('school', 'FeePayment').objects.select_related('student__user'), payment_documents),
+    )
+    rows = []
+    for queryset, build in sources:
+        for obj in queryset.iterator():
+            rows.extend(SearchDocument(**d) for d in build(obj))
+    SearchDocument.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0009_student_search_terms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(choices=[('student', 'Student'), ('guardian', 'Guardian'), ('teacher', 'Teacher'), ('payment', 'Payment')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('title', models.CharField(max_length=200)),
+                ('subtitle', models.CharField(blank=True, max_length=200)),
+                ('body', models.TextField()),
+            ],
+            options={
+                'db_table': 'search_documents',
+                'constraints': [models.UniqueConstraint(fields=('doc_type', 'object_id'), name='search_document_unique')],
+            },
+        ),
+        migrations.RunPython(create_index, drop_index),
+        migrations.RunPython(build_documents, migrations.RunPython.noop),
+    ]
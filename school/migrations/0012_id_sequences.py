@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0011_user_name_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=10, unique=True)),
+                ('next_value', models.PositiveBigIntegerField(default=1)),
+            ],
+            options={
+                'db_table': 'id_sequences',
+            },
+        ),
+    ]
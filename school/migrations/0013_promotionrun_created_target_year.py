@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0012_id_sequences'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promotionrun',
+            name='created_target_year',
+            field=models.BooleanField(default=False),
+        ),
+    ]
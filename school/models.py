@@ -17,6 +17,7 @@ class User(AbstractUser):
     
     class Meta:
         db_table = 'users'
+        indexes = [models.Index(fields=['first_name', 'last_name'], name='users_name_idx')]
 
 class AcademicYear(models.Model):
     """Represents an academic session like '2024/2025'."""
@@ -82,6 +83,60 @@ class Student(models.Model):
     class Meta:
         db_table = 'students'
 
+class StudentSearchTerm(models.Model):
+    """Normalized search index for students, kept in sync by signals.
+    ``w`` rows hold whole words (names, admission number) for prefix lookups
+    and ``g`` rows hold their trigrams for fuzzy matching.
+    """
+    KIND_CHOICES = (
+        ('w', 'Word'),
+        ('g', 'Trigram'),
+    )
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='search_terms')
+    kind = models.CharField(max_length=1, choices=KIND_CHOICES)
+    term = models.CharField(max_length=50)
+
+    class Meta:
+        db_table = 'student_search_terms'
+        indexes = [models.Index(fields=['kind', 'term'], name='student_search_kind_term')]
+
+class SearchDocument(models.Model):
+    """One searchable record for the unified search, kept in sync by signals.
+    On SQLite an FTS5 table mirrors ``body``; on PostgreSQL a GIN index over
+    its tsvector serves the lookups (see ``school.fulltext``).
+    """
+    DOC_TYPE_CHOICES = (
+        ('student', 'Student'),
+        ('guardian', 'Guardian'),
+        ('teacher', 'Teacher'),
+        ('payment', 'Payment'),
+    )
+    doc_type = models.CharField(max_length=10, choices=DOC_TYPE_CHOICES)
+    object_id = models.BigIntegerField()
+    title = models.CharField(max_length=200)
+    subtitle = models.CharField(max_length=200, blank=True)
+    body = models.TextField()
+
+    class Meta:
+        db_table = 'search_documents'
+        constraints = [
+            models.UniqueConstraint(fields=['doc_type', 'object_id'], name='search_document_unique'),
+        ]
+
+class IdSequence(models.Model):
+    """Next counter value for generated IDs sharing one prefix (e.g. ``ST``).
+    Advanced only through ``school.sequences``, which increments it with a
+    row-locking UPDATE so concurrent admins never receive the same number.
+    """
+    prefix = models.CharField(max_length=10, unique=True)
+    next_value = models.PositiveBigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.prefix} → {self.next_value}"
+
+    class Meta:
+        db_table = 'id_sequences'
+
 class Teacher(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     employee_id = models.CharField(max_length=20, unique=True)
@@ -139,6 +194,72 @@ class Enrollment(models.Model):
         db_table = 'enrollments'
         unique_together = ['student', 'academic_year']
 
+class PromotionRun(models.Model):
+    """A persisted promotion job: its parameters, progress and final report.
+    Runs are processed in chunks of students; ``last_student_id`` is the resume
+    cursor, committed together with each chunk.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('rolled_back', 'Rolled Back'),
+    )
+
+    source_year = models.CharField(max_length=9)
+    target_year = models.CharField(max_length=9)
+    stream_policy = models.CharField(max_length=20, default='same_stream')
+    activate_target = models.BooleanField(default=False)
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='pending')
+    total_students = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    last_student_id = models.BigIntegerField(default=0)
+    promoted = models.PositiveIntegerField(default=0)
+    repeating = models.PositiveIntegerField(default=0)
+    graduated = models.PositiveIntegerField(default=0)
+    class_stats = models.JSONField(default=list, blank=True)
+    # Ids of the academic years that were active before the run started
+    previous_active_years = models.JSONField(default=list, blank=True)
+    # Whether the run created the target academic year (rollback removes it)
+    created_target_year = models.BooleanField(default=False)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    rolled_back_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Promotion {self.source_year} → {self.target_year} ({self.get_status_display()})"
+
+    @property
+    def progress(self):
+        if not self.total_students:
+            return 100 if self.status == 'completed' else 0
+        return min(100, round(self.processed * 100 / self.total_students))
+
+    class Meta:
+        db_table = 'promotion_runs'
+        ordering = ['-created_at']
+
+
+class PromotionSnapshot(models.Model):
+    """Placements overwritten by one chunk of a promotion run.
+    ``rows`` holds compact lists of
+    [student_id, class_id, is_graduated, graduation_year,
+     enrollment_id, enrollment_class_id, enrollment_status, enrollment_average]
+    where the enrollment fields are null if the student had no enrollment for
+    the target year before the run.
+    """
+    run = models.ForeignKey(PromotionRun, on_delete=models.CASCADE, related_name='snapshots')
+    rows = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'promotion_snapshots'
+
 class Mark(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
@@ -162,13 +283,29 @@ class Mark(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The slice the row was loaded under, so moving a mark to another
+        # subject, class or term can invalidate the old slice too
+        instance._loaded_slice = instance.statistics_slice()
+        return instance
+
+    def statistics_slice(self):
+        # __dict__ rather than attributes: deferred fields must not trigger a query
+        return tuple(self.__dict__.get(name) for name in ('subject_id', 'class_assigned_id', 'term_id'))
+
     def save(self, *args, **kwargs):
         self.total_marks = self.assignment_marks + self.midterm_marks + self.exam_marks
         self.grade = self.calculate_grade()
         super().save(*args, **kwargs)
     
     def calculate_grade(self):
-        total = float(self.total_marks)
+        return self.grade_for(self.total_marks)
+
+    @staticmethod
+    def grade_for(total) -> str:
+        total = float(total)
         if total >= 90:
             return 'A+'
         elif total >= 80:
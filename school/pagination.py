@@ -0,0 +1,132 @@
+"""Keyset (seek) pagination for the management lists.
+
+Pages are addressed by the sort value and id of the row at the page edge
+instead of an OFFSET, so fetching any page is one index range scan of
+``page_size + 1`` rows however large the table or deep the page.
+"""
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+
+PAGE_SIZE = 50
+CURSOR_PARAMS = ('after', 'before')
+
+
+def encode_cursor(value, pk):
+    return base64.urlsafe_b64encode(json.dumps([value, pk]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """``(value, pk)`` from a cursor token, or None if missing or malformed."""
+    if not token:
+        return None
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    # Sort values are strings or numbers; anything else cannot come from encode_cursor
+    if not isinstance(pk, int) or isinstance(pk, bool) or isinstance(value, bool):
+        return None
+    if not isinstance(value, (str, int, float)):
+        return None
+    return value, pk
+
+
+def _sort_value(row, field):
+    for part in field.split('__'):
+        row = getattr(row, part, None)
+    return row
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def keyset_paginate(queryset, sort_field, descending=False, after=None, before=None, page_size=PAGE_SIZE):
+    """One page of ``queryset`` ordered by ``sort_field`` then pk.
+
+    ``sort_field`` must be non-null (annotate a ``Coalesce`` for nullable
+    columns). ``after``/``before`` are cursor tokens from a previous page.
+    """
+    cursor = decode_cursor(before) or decode_cursor(after)
+    backwards = cursor is not None and decode_cursor(before) is not None
+    # Paging backwards walks the index the other way, then flips the rows
+    desc = descending != backwards
+    if cursor is not None:
+        value, pk = cursor
+        op = 'lt' if desc else 'gt'
+        queryset = queryset.filter(
+            Q(**{f'{sort_field}__{op}': value}) | Q(**{sort_field: value, f'pk__{op}': pk})
+        )
+    prefix = '-' if desc else ''
+    rows = list(queryset.order_by(f'{prefix}{sort_field}', f'{prefix}pk')[:page_size + 1])
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+    has_next = True if backwards else more
+    has_previous = more if backwards else cursor is not None
+    if not rows:
+        return KeysetPage(rows)
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(_sort_value(rows[-1], sort_field), rows[-1].pk) if has_next else None,
+        previous_cursor=encode_cursor(_sort_value(rows[0], sort_field), rows[0].pk) if has_previous else None,
+    )
+
+
+def parse_sort(params, sorts, default):
+    """``(key, descending)`` from ``?sort=key`` or ``?sort=-key``."""
+    sort = params.get('sort', default)
+    key = sort.lstrip('-')
+    if key not in sorts:
+        return default, False
+    return key, sort.startswith('-')
+
+
+def page_links(params, page, sorts, sort_key, descending):
+    """Query strings for the previous/next pages and for sorting by each column.
+
+    Filters in ``params`` are kept; cursors are dropped when the sort changes.
+    """
+    base = params.copy()
+    for name in CURSOR_PARAMS:
+        base.pop(name, None)
+
+    def with_params(**extra):
+        qs = base.copy()
+        for name, value in extra.items():
+            qs[name] = value
+        return qs.urlencode()
+
+    sort_links = {}
+    for key in sorts:
+        # Clicking the active column flips its direction
+        flip = key == sort_key and not descending
+        sort_links[key] = with_params(sort=f'-{key}' if flip else key)
+    return {
+        'next_query': with_params(after=page.next_cursor) if page.has_next else '',
+        'previous_query': with_params(before=page.previous_cursor) if page.has_previous else '',
+        'sort_links': sort_links,
+        'sort_key': sort_key,
+        'sort_descending': descending,
+    }
@@ -0,0 +1,133 @@
+"""Bulk photo ingest from a ZIP of ``<admission or employee number>.<ext>`` files.
+
+Entry names come from the ZIP's central directory, so matching them to
+students and teachers takes one query per model before any image is read.
+Matched entries are then streamed out of the archive a batch at a time (the
+archive is never extracted), decoded and resized on a process pool, saved
+through the photo field's storage, and written back with ``bulk_update``.
+"""
+import io
+import posixpath
+import zipfile
+import zlib
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models.functions import Upper
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .data_versions import bump_version
+from .models import Student, Teacher
+from .workers import chunksize_for, process_pool
+
+PHOTO_MAX_SIZE = (600, 600)
+PHOTO_QUALITY = 85
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tif', '.tiff'}
+BATCH_SIZE = 32
+# Skip decompression bombs: entries that claim to inflate beyond this
+MAX_ENTRY_SIZE = 25 * 1024 * 1024
+
+
+def resize_photo(data):
+    """JPEG bytes of the image in ``data`` fitted into PHOTO_MAX_SIZE, or None if undecodable."""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail(PHOTO_MAX_SIZE)
+            out = io.BytesIO()
+            image.convert('RGB').save(out, 'JPEG', quality=PHOTO_QUALITY, optimize=True)
+            return out.getvalue()
+    except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def _photo_entries(archive):
+    """``({ID (upper-cased file stem): ZipInfo}, duplicates)`` for image entries,
+    ignoring folders and OS metadata.
+
+    IDs named by more than one entry (``ST0001.jpg`` and ``st0001.png``) are
+    left out, since either photo could be the right one; their file names
+    are returned in ``duplicates``.
+    """
+    by_key = {}
+    for info in archive.infolist():
+        name = posixpath.basename(info.filename)
+        stem, ext = posixpath.splitext(name)
+        if info.is_dir() or name.startswith('.') or '__MACOSX' in info.filename:
+            continue
+        if ext.lower() in IMAGE_EXTENSIONS and stem:
+            by_key.setdefault(stem.strip().upper(), []).append(info)
+    entries = {key: infos[0] for key, infos in by_key.items() if len(infos) == 1}
+    duplicates = sorted(info.filename for infos in by_key.values() if len(infos) > 1 for info in infos)
+    return entries, duplicates
+
+
+def _read_entry(archive, info):
+    """``(bytes, None)`` or ``(None, reason)`` for one archive entry."""
+    if info.file_size > MAX_ENTRY_SIZE:
+        return None, 'too large'
+    try:
+        return archive.read(info), None
+    except NotImplementedError:
+        return None, 'unsupported compression'
+    except RuntimeError:
+        return None, 'encrypted'
+    except (zipfile.BadZipFile, zlib.error, EOFError, OSError):
+        return None, 'corrupt entry'
+
+
+def _by_upper_id(queryset, field, keys):
+    """``{upper-cased ID: obj}`` matching ``keys`` whatever case the IDs are stored in."""
+    rows = queryset.annotate(upper_id=Upper(field)).filter(upper_id__in=keys).only('id', field, 'photo')
+    return {obj.upper_id: obj for obj in rows}
+
+
+def ingest_photo_zip(fileobj, workers=None):
+    """Attach photos from a ZIP to matching students/teachers.
+
+    Returns a report dict: ``students`` and ``teachers`` (counts updated),
+    ``unmatched`` (IDs with no student or teacher), ``duplicates`` (entries
+    sharing an ID, all skipped) and ``failed`` (``"name (reason)"`` for
+    entries that were too large, unreadable or not an image). Raises
+    ``zipfile.BadZipFile`` if the file is not a ZIP at all.
+    """
+    report = {'students': 0, 'teachers': 0, 'unmatched': [], 'duplicates': [], 'failed': []}
+    with zipfile.ZipFile(fileobj) as archive:
+        entries, report['duplicates'] = _photo_entries(archive)
+        # Case-insensitive matching: file systems and cameras rarely keep case
+        keys = list(entries)
+        students = _by_upper_id(Student.objects.all(), 'admission_number', keys)
+        teachers = _by_upper_id(Teacher.objects.all(), 'employee_id', keys)
+        report['unmatched'] = sorted(k for k in keys if k not in students and k not in teachers)
+
+        matched = [k for k in keys if k in students or k in teachers]
+        with process_pool(workers) as pool:
+            for start in range(0, len(matched), BATCH_SIZE):
+                batch = []
+                for key in matched[start:start + BATCH_SIZE]:
+                    data, reason = _read_entry(archive, entries[key])
+                    if data is None:
+                        report['failed'].append(f'{entries[key].filename} ({reason})')
+                        continue
+                    batch.append((key, data))
+                resized = pool.map(resize_photo, [data for _, data in batch], chunksize=chunksize_for(batch, 4))
+                updated_students, updated_teachers = [], []
+                for (key, _), jpeg in zip(batch, resized):
+                    if jpeg is None:
+                        report['failed'].append(f'{entries[key].filename} (not a readable image)')
+                        continue
+                    for obj, updated in ((students.get(key), updated_students), (teachers.get(key), updated_teachers)):
+                        if obj is not None:
+                            field = obj._meta.get_field('photo')
+                            name = field.generate_filename(obj, f'{key}.jpg')
+                            obj.photo.name = field.storage.save(name, ContentFile(jpeg), max_length=field.max_length)
+                            updated.append(obj)
+                with transaction.atomic():
+                    Student.objects.bulk_update(updated_students, ['photo'])
+                    Teacher.objects.bulk_update(updated_teachers, ['photo'])
+                report['students'] += len(updated_students)
+                report['teachers'] += len(updated_teachers)
+    if report['students'] or report['teachers']:
+        # bulk_update skips signals; photos appear on ID cards and reports
+        bump_version('school')
+    return report
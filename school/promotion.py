@@ -0,0 +1,423 @@
+"""Set-based student promotion.
+
+``build_promotion_plan`` works out every student's placement for the next
+academic year without writing anything: averages come from one grouped query
+and target classes from a promotion-rank index (see ``StreamMapper``).
+
+Real runs are stored as ``PromotionRun`` records and executed by
+``run_promotion`` in chunks of students. Each chunk is written with bulk
+operations inside its own transaction together with the run's resume cursor,
+so an interrupted run can be picked up again (``manage.py run_promotions``)
+without ever leaving a half-written chunk behind.
+
+The admin page hands runs to an in-process thread, which dies with its
+worker (restart, timeout). Runs that stop making progress for
+``PROMOTION_STALE_MINUTES`` are marked failed by ``fail_stale_runs`` so they
+can be resumed or rolled back; ``run_promotions`` (e.g. from cron) is the
+dependable way to execute and resume them.
+"""
+import heapq
+import logging
+import threading
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Avg, Count
+from django.utils import timezone
+
+from . import fulltext
+from .academic_calendar import invalidate_calendar
+from .analytics import PASS_MARK, invalidate_admin_dashboard
+from .data_versions import bump_version
+from .models import AcademicYear, Class, Enrollment, Mark, PromotionRun, PromotionSnapshot, Student
+
+logger = logging.getLogger(__name__)
+
+STREAM_POLICIES = (
+    ('same_stream', 'Keep the same stream'),
+    ('balance', 'Balance streams by size'),
+    ('first', 'First stream only'),
+)
+
+
+def stream_of(class_obj):
+    """Stream label of a class, e.g. 'East' for 'P5 East' at level 'P5'."""
+    name = class_obj.name.strip()
+    level = (class_obj.level or '').strip()
+    if level and name.lower().startswith(level.lower()):
+        name = name[len(level):].strip(' -')
+    return name.lower()
+
+
+class StreamMapper:
+    """Resolve target classes for promotion from a precomputed rank index.
+
+    Classes are indexed by promotion_rank and by (promotion_rank, stream) once,
+    so every lookup is a dict access. The ``balance`` policy keeps a small heap
+    of planned sizes per rank and always fills the emptiest stream; ``sizes``
+    seeds it with students already placed (class pk -> count).
+    """
+
+    def __init__(self, classes, policy='same_stream', sizes=None):
+        if policy not in dict(STREAM_POLICIES):
+            raise ValueError(f'Unknown stream policy: {policy}')
+        sizes = sizes or {}
+        self.policy = policy
+        self.by_rank = {}
+        self.by_rank_stream = {}
+        for c in classes:
+            self.by_rank.setdefault(c.promotion_rank, []).append(c)
+            self.by_rank_stream.setdefault((c.promotion_rank, stream_of(c)), c)
+        self._heaps = {}
+        for rank, streams in self.by_rank.items():
+            heap = [(sizes.get(c.pk, 0), i) for i, c in enumerate(streams)]
+            heapq.heapify(heap)
+            self._heaps[rank] = heap
+
+    def has_rank(self, rank):
+        return rank in self.by_rank
+
+    def _balanced(self, rank):
+        heap = self._heaps[rank]
+        size, i = heapq.heappop(heap)
+        heapq.heappush(heap, (size + 1, i))
+        return self.by_rank[rank][i]
+
+    def resolve(self, current_class, rank):
+        """Target class at ``rank`` for a student currently in ``current_class``."""
+        if rank not in self.by_rank:
+            return None
+        if self.policy == 'first':
+            return self.by_rank[rank][0]
+        if self.policy == 'same_stream' and current_class is not None:
+            match = self.by_rank_stream.get((rank, stream_of(current_class)))
+            if match is not None:
+                return match
+        return self._balanced(rank)
+
+
+def target_classes_for(source_year, target_year_code, create=False):
+    """Classes of the target year, adding shells copied from the source year.
+
+    With ``create=False`` the missing shells are returned unsaved (for previews);
+    otherwise they are bulk-created. Returns (all_target_classes, new_classes).
+    """
+    current_classes = Class.objects.filter(academic_year=source_year).order_by('id')
+    target_classes = list(Class.objects.filter(academic_year=target_year_code).order_by('id'))
+    existing_target = {(c.name, c.level) for c in target_classes}
+    new_classes = []
+    for c in current_classes:
+        key = (c.name, c.level)
+        if key not in existing_target:
+            existing_target.add(key)
+            new_classes.append(Class(
+                name=c.name,
+                level=c.level,
+                class_teacher=None,
+                academic_year=target_year_code,
+                promotion_rank=c.promotion_rank,
+            ))
+    if create and new_classes:
+        Class.objects.bulk_create(new_classes)
+    return target_classes + new_classes, new_classes
+
+
+def source_students(source_year):
+    return Student.objects.select_related('user', 'student_class').filter(
+        student_class__academic_year=source_year
+    ).order_by('id')
+
+
+def student_averages(source_year, student_ids=None):
+    """student_id -> average total mark over the source year, in one grouped query."""
+    marks = Mark.objects.filter(term__academic_year=source_year)
+    if student_ids is not None:
+        marks = marks.filter(student_id__in=student_ids)
+    return dict(marks.values('student_id').annotate(a=Avg('total_marks')).values_list('student_id', 'a'))
+
+
+def source_class_stats(source_year):
+    return [
+        {
+            'class_assigned__name': row['class_assigned__name'],
+            'average_score': float(row['average_score'] or 0),
+            'count': row['count'],
+        }
+        for row in Mark.objects.filter(term__academic_year=source_year)
+        .values('class_assigned__name')
+        .annotate(average_score=Avg('total_marks'), count=Count('student', distinct=True))
+        .order_by('class_assigned__name')
+    ]
+
+
+def plan_placements(students, averages, mapper):
+    """Decide promoted/repeating/graduated and the target class for each student."""
+    placements = []
+    counts = {'promoted': 0, 'repeating': 0, 'graduated': 0}
+    for s in students:
+        avg = averages.get(s.id) or 0
+        current_class = s.student_class
+        has_next = current_class is not None and mapper.has_rank(current_class.promotion_rank + 1)
+        if avg >= PASS_MARK and has_next:
+            status = 'promoted'
+            new_class = mapper.resolve(current_class, current_class.promotion_rank + 1)
+        elif avg >= PASS_MARK:
+            status = 'graduated'
+            new_class = None
+        else:
+            # Repeat the same level in the target year
+            status = 'repeating'
+            new_class = mapper.resolve(current_class, current_class.promotion_rank) if current_class else None
+        counts[status] += 1
+        placements.append({
+            'student': s,
+            'average': avg,
+            'from_class': current_class,
+            'to_class': new_class,
+            'status': status,
+        })
+    return placements, counts
+
+
+def build_promotion_plan(source_year, target_year_code, stream_policy='same_stream'):
+    """Compute the full promotion plan for ``source_year`` without touching the database."""
+    classes, new_classes = target_classes_for(source_year, target_year_code)
+    mapper = StreamMapper(classes, stream_policy)
+    placements, counts = plan_placements(
+        source_students(source_year), student_averages(source_year), mapper
+    )
+    return {
+        'source_year': source_year,
+        'target_year': target_year_code,
+        'stream_policy': stream_policy,
+        'new_classes': new_classes,
+        'placements': placements,
+        'class_stats': source_class_stats(source_year),
+        **counts,
+    }
+
+
+def write_placements(placements, target_year):
+    """Bulk-write enrollments and student placements for one chunk of a plan.
+
+    Returns compact snapshot rows of the state that was overwritten (see
+    ``PromotionSnapshot``) so the chunk can be rolled back later.
+    """
+    existing = {
+        e.student_id: e
+        for e in Enrollment.objects.filter(
+            academic_year=target_year,
+            student_id__in=[p['student'].id for p in placements],
+        )
+    }
+    to_create = []
+    to_update = []
+    students = []
+    snapshot = []
+    for p in placements:
+        s = p['student']
+        new_class = p['to_class']
+        enr = existing.get(s.id)
+        if enr is None:
+            snapshot.append([s.id, s.student_class_id, s.is_graduated, s.graduation_year, None, None, None, None])
+            enr = Enrollment(student=s, academic_year=target_year)
+            to_create.append(enr)
+        else:
+            snapshot.append([
+                s.id, s.student_class_id, s.is_graduated, s.graduation_year,
+                enr.id, enr.class_assigned_id, enr.status, str(enr.average_score),
+            ])
+            to_update.append(enr)
+        enr.class_assigned = new_class
+        enr.status = p['status']
+        enr.average_score = p['average']
+
+        if p['status'] == 'graduated':
+            s.is_graduated = True
+            s.graduation_year = target_year.code
+            s.student_class = None
+        else:
+            s.is_graduated = False
+            s.graduation_year = None
+            s.student_class = new_class
+        students.append(s)
+
+    Enrollment.objects.bulk_create(to_create, batch_size=500)
+    Enrollment.objects.bulk_update(to_update, ['class_assigned', 'status', 'average_score'], batch_size=500)
+    Student.objects.bulk_update(students, ['is_graduated', 'graduation_year', 'student_class'], batch_size=500)
+    # bulk_update skips the signals that keep the search subtitles' class current
+    fulltext.index_students([s.id for s in students], payments=False)
+    return snapshot
+
+
+def _prepare_run(run):
+    """Create/activate the target year and class shells (idempotent on resume)."""
+    with transaction.atomic():
+        if run.started_at is None:
+            run.previous_active_years = list(AcademicYear.objects.filter(is_active=True).values_list('id', flat=True))
+        target_year, created = AcademicYear.objects.get_or_create(
+            code=run.target_year, defaults={'is_active': run.activate_target}
+        )
+        if created:
+            run.created_target_year = True
+        if run.activate_target:
+            AcademicYear.objects.exclude(pk=target_year.pk).update(is_active=False)
+            transaction.on_commit(invalidate_calendar)
+            if not target_year.is_active:
+                target_year.is_active = True
+                target_year.save(update_fields=['is_active'])
+        classes, _ = target_classes_for(run.source_year, run.target_year, create=True)
+        if run.started_at is None:
+            run.started_at = timezone.now()
+            run.total_students = source_students(run.source_year).count()
+            run.class_stats = source_class_stats(run.source_year)
+        run.status = 'running'
+        run.error = ''
+        run.save()
+    return target_year, classes
+
+
+def run_promotion(run, chunk_size=None):
+    """Execute (or resume) a PromotionRun chunk by chunk. Returns the run."""
+    if run.status in ('completed', 'rolled_back'):
+        return run
+    chunk_size = chunk_size or settings.PROMOTION_CHUNK_SIZE
+    try:
+        target_year, classes = _prepare_run(run)
+        sizes = dict(
+            Enrollment.objects.filter(academic_year=target_year, class_assigned__isnull=False)
+            .values('class_assigned_id').annotate(n=Count('id')).values_list('class_assigned_id', 'n')
+        )
+        mapper = StreamMapper(classes, run.stream_policy, sizes)
+        while True:
+            chunk = list(source_students(run.source_year).filter(id__gt=run.last_student_id)[:chunk_size])
+            if not chunk:
+                break
+            averages = student_averages(run.source_year, [s.id for s in chunk])
+            placements, counts = plan_placements(chunk, averages, mapper)
+            with transaction.atomic():
+                snapshot = write_placements(placements, target_year)
+                PromotionSnapshot.objects.create(run=run, rows=snapshot)
+                run.last_student_id = chunk[-1].id
+                run.processed += len(chunk)
+                run.promoted += counts['promoted']
+                run.repeating += counts['repeating']
+                run.graduated += counts['graduated']
+                run.save(update_fields=[
+                    'last_student_id', 'processed', 'promoted', 'repeating', 'graduated', 'updated_at',
+                ])
+        run.status = 'completed'
+        run.finished_at = timezone.now()
+        run.save(update_fields=['status', 'finished_at', 'updated_at'])
+    except Exception as exc:
+        logger.exception('Promotion run %s failed', run.pk)
+        run.status = 'failed'
+        run.error = str(exc)
+        run.save(update_fields=['status', 'error', 'updated_at'])
+    finally:
+        # Bulk writes skip model signals, so drop derived caches explicitly
+        invalidate_admin_dashboard()
+        bump_version('school')
+    return run
+
+
+class RollbackError(ValueError):
+    """The run cannot be rolled back in its current state."""
+
+
+ROLLBACK_STATUSES = ('completed', 'failed')
+
+
+@transaction.atomic
+def rollback_promotion(run):
+    """Restore every placement a run overwrote, using its snapshots.
+
+    Students and pre-existing enrollments are restored with bulk_update,
+    enrollments created by the run are deleted, and the previously active
+    academic years are reactivated. A target year created by the run is
+    deleted once no enrollments refer to it (deactivated otherwise). Class
+    shells created for the target year are left in place.
+
+    The run row is locked and its status re-checked inside the transaction,
+    so of two concurrent rollbacks the second raises ``RollbackError``.
+    """
+    run = PromotionRun.objects.select_for_update().get(pk=run.pk)
+    if run.status not in ROLLBACK_STATUSES:
+        raise RollbackError(f'Run #{run.id} cannot be rolled back while it is {run.get_status_display().lower()}.')
+    students = []
+    enrollments = []
+    created_for = []
+    for snapshot in run.snapshots.order_by('id').iterator():
+        for student_id, class_id, is_graduated, graduation_year, enr_id, enr_class_id, enr_status, enr_avg in snapshot.rows:
+            students.append(Student(
+                id=student_id,
+                student_class_id=class_id,
+                is_graduated=is_graduated,
+                graduation_year=graduation_year,
+            ))
+            if enr_id is None:
+                created_for.append(student_id)
+            else:
+                enrollments.append(Enrollment(
+                    id=enr_id,
+                    class_assigned_id=enr_class_id,
+                    status=enr_status,
+                    average_score=Decimal(enr_avg),
+                ))
+
+    Student.objects.bulk_update(students, ['student_class', 'is_graduated', 'graduation_year'], batch_size=500)
+    for i in range(0, len(students), 500):
+        fulltext.index_students([s.id for s in students[i:i + 500]], payments=False)
+    Enrollment.objects.bulk_update(enrollments, ['class_assigned', 'status', 'average_score'], batch_size=500)
+    target_enrollments = Enrollment.objects.filter(academic_year__code=run.target_year)
+    for i in range(0, len(created_for), 500):
+        target_enrollments.filter(student_id__in=created_for[i:i + 500]).delete()
+
+    if run.activate_target and run.previous_active_years:
+        AcademicYear.objects.update(is_active=False)
+        AcademicYear.objects.filter(id__in=run.previous_active_years).update(is_active=True)
+    if run.created_target_year:
+        target_year = AcademicYear.objects.filter(code=run.target_year)
+        if Enrollment.objects.filter(academic_year__code=run.target_year).exists():
+            target_year.update(is_active=False)
+        else:
+            target_year.delete()
+    transaction.on_commit(invalidate_calendar)
+
+    run.status = 'rolled_back'
+    run.rolled_back_at = timezone.now()
+    run.save(update_fields=['status', 'rolled_back_at', 'updated_at'])
+    transaction.on_commit(invalidate_admin_dashboard)
+    transaction.on_commit(lambda: bump_version('school'))
+    return len(students)
+
+
+def fail_stale_runs():
+    """Mark pending or running runs with no progress for PROMOTION_STALE_MINUTES as failed."""
+    stale = timezone.now() - timedelta(minutes=settings.PROMOTION_STALE_MINUTES)
+    return PromotionRun.objects.filter(status__in=['pending', 'running'], updated_at__lt=stale).update(
+        status='failed',
+        error=f'No progress for {settings.PROMOTION_STALE_MINUTES} minutes; the worker running it probably '
+              f'stopped. Resume with manage.py run_promotions or roll it back.',
+        updated_at=timezone.now(),
+    )
+
+
+def _run_in_thread(run_id):
+    try:
+        run_promotion(PromotionRun.objects.get(pk=run_id))
+    finally:
+        close_old_connections()
+
+
+def start_promotion_run(run):
+    """Hand a run to a background worker thread, or run it inline if disabled."""
+    if settings.PROMOTION_RUN_IN_BACKGROUND:
+        transaction.on_commit(
+            lambda: threading.Thread(target=_run_in_thread, args=(run.pk,), daemon=True).start()
+        )
+    else:
+        run_promotion(run)
+    return run
@@ -0,0 +1,69 @@
+"""Renumbering of admission numbers and employee IDs.
+
+The new IDs are planned in memory from one ``values_list`` query, then
+applied in two ``bulk_update`` phases inside a single transaction: every
+changed row first moves to a temporary unique value, then to its final ID.
+No row ever holds an ID another row still has, so the unique constraints
+cannot trip halfway through, and a failure rolls everything back.
+"""
+from django.db import transaction
+
+from . import fulltext
+from .analytics import invalidate_admin_dashboard
+from .data_versions import bump_version
+from .models import Student, Teacher
+from .search import index_students
+from .sequences import SEQUENCE_FIELDS, format_id, reset, sequence_config
+
+
+def plan_renumbering(name):
+    """``[(pk, old_id, new_id, full_name)]`` for every row of sequence ``name``, by pk."""
+    model, field = SEQUENCE_FIELDS[name]
+    prefix, width = sequence_config(name)
+    rows = model.objects.order_by('id').values_list('id', field, 'user__first_name', 'user__last_name')
+    return [
+        (pk, old, format_id(prefix, width, index), f'{first} {last}'.strip())
+        for index, (pk, old, first, last) in enumerate(rows.iterator(), start=1)
+    ]
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _reindex(name, pks, batch_size):
+    """Refresh the search indexes that store the renumbered IDs (bulk_update skips signals)."""
+    for batch in _batches(pks, batch_size):
+        if name == 'student':
+            index_students(Student.objects.select_related('user').filter(id__in=batch))
+            fulltext.index_students(batch)
+        else:
+            fulltext.index_teachers(batch)
+
+
+def apply_renumbering(name, plan, batch_size=500, progress=None):
+    """Apply a plan from ``plan_renumbering``; returns the number of rows changed.
+
+    ``progress(done, total)`` is called after each final-phase batch.
+    """
+    model, field = SEQUENCE_FIELDS[name]
+    changes = [(pk, new) for pk, old, new, _ in plan if old != new]
+    if not changes:
+        return 0
+    with transaction.atomic():
+        # Phase 1: park changed rows on values no real ID can take
+        parked = [model(pk=pk, **{field: f'~{pk}'}) for pk, _ in changes]
+        model.objects.bulk_update(parked, [field], batch_size=batch_size)
+        # Phase 2: final IDs
+        done = 0
+        for batch in _batches(changes, batch_size):
+            model.objects.bulk_update([model(pk=pk, **{field: new}) for pk, new in batch], [field])
+            done += len(batch)
+            if progress:
+                progress(done, len(changes))
+        reset(name)
+        _reindex(name, [pk for pk, _ in changes], batch_size)
+    invalidate_admin_dashboard()
+    bump_version('school')
+    return len(changes)
@@ -0,0 +1,134 @@
+"""Indexed student search.
+
+Names and admission numbers are normalized into ``StudentSearchTerm`` rows:
+whole words for prefix lookups and trigrams for fuzzy matching. Lookups are
+index range scans on (kind, term) instead of ``icontains`` table scans, and
+results are ranked: exact admission number, then prefix matches. Fuzzy
+matches by shared trigrams are only a fallback for queries nothing else
+matched (typos), since IDs like ``ST0005`` share trigrams with every other
+admission number.
+"""
+import re
+import unicodedata
+
+from django.db.models import Count
+
+from .models import Student, StudentSearchTerm
+
+MAX_TERM_LENGTH = 50
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize(text):
+    """Lowercase, strip accents and split into alphanumeric words."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return [w[:MAX_TERM_LENGTH] for w in _WORD_RE.findall(text)]
+
+
+def trigrams(word):
+    if len(word) <= 3:
+        return {word}
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+def index_terms(*texts):
+    """(kind, term) pairs for the given texts: words plus their trigrams."""
+    words = set(normalize(' '.join(t or '' for t in texts)))
+    terms = {('w', w) for w in words}
+    for w in words:
+        terms.update(('g', g) for g in trigrams(w))
+    return terms
+
+
+def student_terms(student):
+    """(kind, term) pairs indexed for one student (expects ``student.user`` loaded)."""
+    return index_terms(student.user.first_name, student.user.last_name, student.admission_number)
+
+
+def index_student(student):
+    index_students([student])
+
+
+def index_students(students, batch_size=1000):
+    """Reindex several students with one delete and one insert (expects ``user`` loaded)."""
+    students = list(students)
+    StudentSearchTerm.objects.filter(student_id__in=[s.id for s in students]).delete()
+    StudentSearchTerm.objects.bulk_create([
+        StudentSearchTerm(student_id=s.id, kind=kind, term=term)
+        for s in students
+        for kind, term in student_terms(s)
+    ], batch_size=batch_size)
+
+
+def rebuild_index(batch_size=1000):
+    """Rebuild the whole index; returns the number of students indexed."""
+    StudentSearchTerm.objects.all().delete()
+    count = 0
+    rows = []
+    for student in Student.objects.select_related('user').iterator(chunk_size=batch_size):
+        rows.extend(
+            StudentSearchTerm(student_id=student.id, kind=kind, term=term)
+            for kind, term in student_terms(student)
+        )
+        count += 1
+        if len(rows) >= batch_size:
+            StudentSearchTerm.objects.bulk_create(rows, batch_size=batch_size)
+            rows = []
+    StudentSearchTerm.objects.bulk_create(rows, batch_size=batch_size)
+    return count
+
+
+def _prefix_matches(words, limit):
+    """Students with a word starting with every query word (index range scans)."""
+    matches = None
+    for w in words:
+        qs = StudentSearchTerm.objects.filter(kind='w', term__gte=w, term__lt=w + '\uffff')
+        if matches is not None:
+            qs = qs.filter(student_id__in=matches.values('student_id'))
+        matches = qs
+    # Closest (shortest) matching words first, e.g. 'ann' before 'annabel'
+    ids = matches.order_by('term', 'student_id').values_list('student_id', flat=True)[:limit * 3]
+    return list(dict.fromkeys(ids))[:limit]
+
+
+def _fuzzy_matches(words, limit):
+    grams = set()
+    for w in words:
+        grams.update(trigrams(w))
+    if not grams:
+        return []
+    min_hits = max(1, len(grams) // 2)
+    rows = (
+        StudentSearchTerm.objects.filter(kind='g', term__in=grams)
+        .values('student_id')
+        .annotate(hits=Count('id'))
+        .filter(hits__gte=min_hits)
+        .order_by('-hits', 'student_id')[:limit]
+    )
+    return [r['student_id'] for r in rows]
+
+
+def search_student_ids(q, limit=10):
+    """Ranked student ids for a query: exact admission, then prefix; fuzzy
+    matches only when neither found anything."""
+    words = normalize(q)
+    if not words:
+        return []
+    q = q.strip()
+    ranked = list(
+        Student.objects.filter(admission_number__in={q, q.upper()}).values_list('id', flat=True)[:1]
+    )
+    for sid in _prefix_matches(words, limit):
+        if sid not in ranked:
+            ranked.append(sid)
+    if not ranked:
+        ranked = _fuzzy_matches(words, limit)
+    return ranked[:limit]
+
+
+def search_students(q, limit=10):
+    """Ranked Student objects (with user and class loaded) for a query."""
+    ids = search_student_ids(q, limit)
+    students = Student.objects.select_related('user', 'student_class').in_bulk(ids)
+    return [students[sid] for sid in ids if sid in students]
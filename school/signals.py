@@ -0,0 +1,127 @@
+"""Cache invalidation and search indexing hooks for data derived from the school models."""
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .academic_calendar import invalidate_calendar
+from .analytics import invalidate_admin_dashboard, invalidate_subject_statistics
+from .data_versions import bump_version
+from .search import index_student
+from . import fulltext
+from .models import AcademicYear, Class, ClassFee, FeePayment, Mark, Student, Subject, Teacher, Term, User
+
+
+@receiver(post_save, sender=Mark)
+@receiver(post_delete, sender=Mark)
+def mark_changed(sender, instance, **kwargs):
+    current = instance.statistics_slice()
+    previous = getattr(instance, '_loaded_slice', current)
+    for subject_id, class_id, term_id in {current, previous}:
+        if None in (subject_id, class_id, term_id):
+            continue
+        invalidate_subject_statistics(subject_id, class_id, term_id)
+        bump_version('marks', term_id)
+    invalidate_admin_dashboard()
+    # A later save of the same instance moves it from here
+    instance._loaded_slice = current
+
+
+@receiver(post_save, sender=FeePayment)
+@receiver(post_delete, sender=FeePayment)
+def payments_changed(sender, instance, **kwargs):
+    bump_version('payments', instance.term_id)
+
+
+@receiver(post_save, sender=ClassFee)
+@receiver(post_delete, sender=ClassFee)
+def fees_changed(sender, instance, **kwargs):
+    bump_version('fees', instance.term_id)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+@receiver(post_save, sender=Class)
+@receiver(post_delete, sender=Class)
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+@receiver(post_save, sender=Term)
+@receiver(post_delete, sender=Term)
+def dashboard_model_changed(sender, **kwargs):
+    invalidate_admin_dashboard()
+    bump_version('school')
+
+
+@receiver(m2m_changed, sender=Teacher.classes.through)
+@receiver(m2m_changed, sender=Teacher.subjects.through)
+def teaching_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version('school')
+
+
+@receiver(post_save, sender=Term)
+@receiver(post_delete, sender=Term)
+@receiver(post_save, sender=AcademicYear)
+@receiver(post_delete, sender=AcademicYear)
+def calendar_changed(sender, **kwargs):
+    invalidate_calendar()
+
+
+# Student fields that appear in the student, guardian and payment documents
+# (names come from the user, see user_changed)
+FULLTEXT_STUDENT_FIELDS = {
+    'admission_number', 'guardian_name', 'guardian_phone', 'student_class', 'student_class_id', 'user', 'user_id',
+}
+
+
+@receiver(post_save, sender=Student)
+def student_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not FULLTEXT_STUDENT_FIELDS & set(update_fields):
+        return
+    fulltext.index_students([instance.id])
+    if update_fields and 'admission_number' not in update_fields:
+        return
+    index_student(instance)
+
+
+@receiver(post_delete, sender=Student)
+def student_deleted(sender, instance, **kwargs):
+    fulltext.remove_documents(('student', 'guardian'), [instance.id])
+
+
+@receiver(post_save, sender=Teacher)
+def teacher_saved(sender, instance, **kwargs):
+    fulltext.index_teachers([instance.id])
+
+
+@receiver(post_delete, sender=Teacher)
+def teacher_deleted(sender, instance, **kwargs):
+    fulltext.remove_documents(('teacher',), [instance.id])
+
+
+@receiver(post_save, sender=FeePayment)
+def payment_saved(sender, instance, **kwargs):
+    fulltext.index_payments([instance.id])
+
+
+@receiver(post_delete, sender=FeePayment)
+def payment_deleted(sender, instance, **kwargs):
+    fulltext.remove_documents(('payment',), [instance.id])
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Logging in only touches last_login (and password when a hash is
+    # upgraded), which nothing derived from users shows
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    # Names appear in cached fragments, reports, ID cards and receipts
+    bump_version('school')
+    if instance.user_type == 'student':
+        invalidate_admin_dashboard()
+        student = Student.objects.filter(user=instance).first()
+        if student is not None:
+            index_student(student)
+            fulltext.index_students([student.id])
+    elif instance.user_type == 'teacher':
+        fulltext.index_teachers(Teacher.objects.filter(user=instance).values_list('id', flat=True))
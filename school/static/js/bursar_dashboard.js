@@ -0,0 +1,28 @@
+// Bursar dashboard charts (Chart.js, vendored); the series are embedded with json_script
+(function () {
+  function series(id) {
+    var el = document.getElementById(id);
+    return el ? JSON.parse(el.textContent) : null;
+  }
+
+  var daily = series('bursar-daily');
+  var methods = series('bursar-methods');
+
+  var ctx1 = document.getElementById('dailyChart');
+  if (ctx1 && daily) {
+    new Chart(ctx1, {
+      type: 'line',
+      data: { labels: daily.labels, datasets: [{ label: 'Collections (shs)', data: daily.values, borderColor: '#2563eb', backgroundColor: 'rgba(37,99,235,0.1)', tension: .3, fill: true }] },
+      options: { plugins: { legend: { display: false } }, scales: { y: { beginAtZero: true } } }
+    });
+  }
+
+  var ctx2 = document.getElementById('methodChart');
+  if (ctx2 && methods) {
+    new Chart(ctx2, {
+      type: 'doughnut',
+      data: { labels: methods.labels, datasets: [{ data: methods.values, backgroundColor: ['#2563eb', '#10b981', '#f59e0b', '#ef4444', '#8b5cf6'] }] },
+      options: { plugins: { legend: { position: 'bottom' } } }
+    });
+  }
+})();
@@ -0,0 +1,11 @@
+// Shared dashboard behaviour (loaded on every base_dashboard.html page)
+
+// Close the user dropdown when clicking outside it
+document.addEventListener('click', function (event) {
+  var dropdown = document.getElementById('userDropdown');
+  var trigger = document.querySelector('.user-menu-trigger');
+
+  if (dropdown && trigger && !trigger.contains(event.target) && !dropdown.contains(event.target)) {
+    dropdown.classList.remove('active');
+  }
+});
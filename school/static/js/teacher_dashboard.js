@@ -0,0 +1,14 @@
+// Report downloads on the teacher dashboard. Each button carries the report
+// URL for class 0 / term 0 in data-url; prefix picks its form's selects.
+function openReport(button, prefix) {
+  var c = document.getElementById(prefix + 'class_id').value;
+  var t = document.getElementById(prefix + 'term_id').value;
+  var s = document.getElementById(prefix + 'subject_id').value;
+  if (c && t) {
+    var url = button.dataset.url.replace('0/0', c + '/' + t);
+    if (s) { url += '?subject_id=' + s; }
+    window.open(url);
+  } else {
+    alert('Please select both class and term.');
+  }
+}
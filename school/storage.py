@@ -0,0 +1,62 @@
+"""Content-addressed storage for uploaded photos, and the static files storage.
+
+Files are named by the SHA-256 of their bytes and sharded two levels deep
+under their upload directory, e.g.
+``students/photos/3f/a2/3fa2…c1.jpg``. Identical uploads map to the same
+name, so re-uploading a picture stores nothing new, and no directory grows
+beyond a few hundred entries however many photos there are. Because a name
+can never point at different content, hashed files are served with
+private immutable cache headers (see ``views.serve_media``).
+
+Several records may share one file, so application code must not delete
+photo files when a record changes.
+"""
+import hashlib
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+HASHED_NAME_RE = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.[A-Za-z0-9]+)?$')
+
+
+def is_hashed_name(name):
+    return bool(HASHED_NAME_RE.search(name or ''))
+
+
+class ContentHashedStorage(FileSystemStorage):
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        hexdigest = digest.hexdigest()
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        ext = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, hexdigest[:2], hexdigest[2:4], hexdigest + ext)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Same bytes already stored under this name
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+class FingerprintedStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """WhiteNoise's hashed, precompressed static storage, usable before collectstatic.
+
+    Until a manifest exists (development, tests, a fresh checkout) URLs fall
+    back to the plain file names instead of raising; once collectstatic has
+    written one, a missing entry is an error as usual.
+    """
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
@@ -0,0 +1,26 @@
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from school.assets import BUNDLES, bundle_built
+
+register = template.Library()
+
+
+@register.simple_tag
+def asset_bundle(name):
+    """``<link>``/``<script>`` tags for a bundle: the built file in production,
+    the individual sources in development or before ``build_assets`` has run.
+
+    ``{% asset_bundle 'bursar_dashboard.js' %}``
+    """
+    if not settings.DEBUG and bundle_built(name):
+        paths = [f'bundles/{name}']
+    else:
+        paths = BUNDLES[name]
+    if name.endswith('.css'):
+        html = '<link rel="stylesheet" href="{}">'
+    else:
+        html = '<script src="{}"></script>'
+    return format_html_join('', html, ((static(path),) for path in paths))
@@ -0,0 +1,26 @@
+from django import template
+
+from school.cache import invalidated_timeout
+from school.data_versions import get_version
+
+register = template.Library()
+
+
+@register.simple_tag
+def data_version(name, scope=None):
+    """Current version of a data counter, for ``{% cache %}`` vary-on arguments.
+
+    ``{% data_version 'marks' active_term.id as marks_version %}``
+    """
+    return get_version(name, scope)
+
+
+@register.simple_tag
+def fragment_timeout():
+    """Timeout for fragments varied on data versions: none with a shared cache,
+    ``LOCAL_CACHE_TIMEOUT`` with a per-process one, whose counters miss other
+    processes' writes.
+
+    ``{% fragment_timeout as timeout %}{% cache timeout name marks_version %}``
+    """
+    return invalidated_timeout()
@@ -1,3 +1,1425 @@
-from django.test import TestCase
+import datetime
+import json
+import shutil
+import subprocess
+import time
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.http import Http404, HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import academic_calendar
+from .admin import ApproximateCountPaginator, StudentAdmin
+from .analytics import ADMIN_DASHBOARD_KEY, get_admin_dashboard_snapshot, get_subject_statistics
+from .assets import build_bundle, build_bundles, bundle_built, fetch_vendor_files, minify_js
+from .cache import FileBasedCache, LocMemCache
+from .data_versions import bump_version
+from .hashing import PBKDF2WrappedPBKDF2PasswordHasher, wrap_password_hash
+from .importing import parse_import, pop_upload, run_import
+from .middleware import RoleProfileMiddleware, get_role_profile
+from .pagination import encode_cursor, keyset_paginate
+from .photos import ingest_photo_zip
+from .promotion import (
+    RollbackError, StreamMapper, build_promotion_plan, rollback_promotion, run_promotion, write_placements,
+)
+from .renumbering import apply_renumbering, plan_renumbering
+from .search import search_student_ids
+from .sequences import advance_past, next_id
+from .views import serve_media
+from .models import (
+    User, Student, Teacher, Class, Subject, Term, Mark, AcademicYear, Enrollment, ClassFee, FeePayment, Comment,
+    PromotionRun, SearchDocument,
+)
+
+
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class TeacherDashboardQueryTests(TestCase):
+    """The teacher dashboard must not issue one query per class taught."""
+
+    # Session, user, teacher + prefetches and the grouped stats
+    QUERY_BUDGET = 8
+
+    def setUp(self):
+        cache.clear()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.term = Term.objects.create(
+            term='1', academic_year='2024/2025', is_active=True,
+            start_date=datetime.date(2024, 1, 8), end_date=datetime.date(2024, 4, 5),
+        )
+        cls.subject = Subject.objects.create(name='Mathematics', code='MTH')
+        user = User.objects.create_user('teacher1', password='pass', user_type='teacher')
+        cls.teacher = Teacher.objects.create(user=user, employee_id='TC0001')
+        cls.teacher.subjects.add(cls.subject)
+
+    def add_class_with_marks(self, index):
+        class_obj = Class.objects.create(name=f'P{index}', level=f'P{index}', promotion_rank=index)
+        self.teacher.classes.add(class_obj)
+        for n in range(2):
+            user = User.objects.create_user(f'student{index}_{n}', password='pass', user_type='student')
+            student = Student.objects.create(
+                user=user, admission_number=f'ST{index:02d}{n:02d}', student_class=class_obj,
+                date_of_birth=datetime.date(2014, 1, 1), guardian_name='Guardian', guardian_phone='0700000000',
+            )
+            Mark.objects.create(
+                student=student, subject=self.subject, term=self.term, class_assigned=class_obj,
+                teacher=self.teacher, assignment_marks=15, midterm_marks=20, exam_marks=30,
+            )
+
+    def dashboard_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('teacher_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_query_count_independent_of_class_count(self):
+        self.client.force_login(self.teacher.user)
+        self.add_class_with_marks(1)
+        # Warm the caches shared across requests (academic calendar), then
+        # invalidate the dashboard fragment so both counts are full renders
+        self.dashboard_queries()
+        bump_version('marks', self.term.id)
+        one_class, _ = self.dashboard_queries()
+
+        for index in range(2, 11):
+            self.add_class_with_marks(index)
+        ten_classes, response = self.dashboard_queries()
+
+        self.assertEqual(one_class, ten_classes)
+        self.assertLessEqual(ten_classes, self.QUERY_BUDGET)
+        class_statistics = response.context['figures']['class_statistics']
+        self.assertEqual(len(class_statistics), 10)
+        self.assertTrue(all(cs['total_students'] == 2 for cs in class_statistics))
+
+    def test_cached_fragment_skips_statistics_until_marks_change(self):
+        self.client.force_login(self.teacher.user)
+        self.add_class_with_marks(1)
+        rendered, _ = self.dashboard_queries()
+        cached, response = self.dashboard_queries()
+        self.assertLess(cached, rendered)
+        self.assertContains(response, 'P1')
+        self.assertNotContains(response, 'E 1')
+
+        mark = Mark.objects.get(student__admission_number='ST0100')
+        mark.exam_marks = 0
+        mark.save()
+        _, response = self.dashboard_queries()
+        self.assertContains(response, 'E 1')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class RoleProfileMiddlewareTests(TestCase):
+    """request.profile loads the user's Student/Teacher once, and only when used."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.class_obj = Class.objects.create(name='P4', level='P4')
+        cls.subject = Subject.objects.create(name='Mathematics', code='MTH')
+        user = User.objects.create_user('student1', password='pass', user_type='student')
+        cls.student = Student.objects.create(
+            user=user, admission_number='ST0001', student_class=cls.class_obj,
+            date_of_birth=datetime.date(2014, 1, 1), guardian_name='Guardian', guardian_phone='0700000000',
+            photo='students/photos/st0001.jpg',
+        )
+        user = User.objects.create_user('teacher1', password='pass', user_type='teacher')
+        cls.teacher = Teacher.objects.create(user=user, employee_id='TC0001')
+        cls.teacher.subjects.add(cls.subject)
+        cls.teacher.classes.add(cls.class_obj)
+        cls.admin = User.objects.create_user('admin1', password='pass', user_type='admin')
+
+    def process(self, user):
+        request = RequestFactory().get('/')
+        # A fresh copy, so no reverse one-to-one caches are primed yet
+        request.user = User.objects.get(pk=user.pk) if user.is_authenticated else user
+        RoleProfileMiddleware(lambda request: HttpResponse())(request)
+        return request
+
+    def test_untouched_profile_costs_nothing(self):
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(pk=self.student.user.pk)
+        with self.assertNumQueries(0):
+            RoleProfileMiddleware(lambda request: HttpResponse())(request)
+
+    def test_student_profile_loaded_once_with_class(self):
+        request = self.process(self.student.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(request.profile.admission_number, 'ST0001')
+            self.assertEqual(request.profile.student_class.name, 'P4')
+            self.assertEqual(request.user.student, request.profile)
+            self.assertIs(get_role_profile(request).user, request.user)
+        with self.assertNumQueries(0):
+            with self.assertRaises(Teacher.DoesNotExist):
+                request.user.teacher
+
+    def test_teacher_profile_prefetches_subjects_and_classes(self):
+        request = self.process(self.teacher.user)
+        with self.assertNumQueries(3):
+            self.assertEqual([s.name for s in request.profile.subjects.all()], ['Mathematics'])
+            self.assertEqual([c.name for c in request.profile.classes.all()], ['P4'])
+        with self.assertNumQueries(0):
+            self.assertEqual(request.user.teacher, request.profile)
+            with self.assertRaises(Student.DoesNotExist):
+                request.user.student
+
+    def test_no_profile_for_admins_or_anonymous_users(self):
+        for user in (self.admin, AnonymousUser()):
+            request = self.process(user)
+            with self.assertNumQueries(0):
+                self.assertIsNone(get_role_profile(request))
+                self.assertFalse(request.profile)
+
+    def test_profile_page_and_avatar_use_request_profile(self):
+        self.client.force_login(self.student.user)
+        response = self.client.get(reverse('my_profile'))
+        self.assertContains(response, 'Admission: ST0001')
+        self.assertContains(response, 'Class: P4')
+        self.assertContains(response, 'students/photos/st0001.jpg')
+        self.assertIs(response.wsgi_request.profile.user, response.wsgi_request.user)
+
+    def test_role_page_without_profile_is_404(self):
+        user = User.objects.create_user('student2', password='pass', user_type='student')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('student_dashboard')).status_code, 404)
+        self.assertEqual(self.client.get(reverse('my_profile')).status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class TrajectoryTests(TestCase):
+    """One student over three terms in two years: averages 45, 55 and 70."""
+
+    # Session, user, class, roster and the grouped trajectory rows
+    QUERY_BUDGET = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin1', password='pass', user_type='admin')
+        cls.class_obj = Class.objects.create(name='P5', level='P5', promotion_rank=5)
+        cls.years = {code: AcademicYear.objects.create(code=code) for code in ['2023/2024', '2024/2025']}
+        cls.terms = [
+            Term.objects.create(term=term, academic_year=year, start_date=datetime.date(2024, 1, 8),
+                                end_date=datetime.date(2024, 4, 5))
+            for year, term in [('2023/2024', '3'), ('2024/2025', '1'), ('2024/2025', '2')]
+        ]
+        cls.maths = Subject.objects.create(name='Mathematics', code='MTH')
+        cls.english = Subject.objects.create(name='English', code='ENG')
+        cls.student = cls.add_student(1, {cls.maths: [50, 60, 80], cls.english: [40, 50, 60]})
+        Enrollment.objects.create(student=cls.student, academic_year=cls.years['2024/2025'],
+                                  class_assigned=cls.class_obj, status='promoted')
+
+    @classmethod
+    def add_student(cls, n, totals):
+        user = User.objects.create_user(f'student{n}', password='pass', user_type='student', first_name=f'Pupil{n:02d}')
+        student = Student.objects.create(
+            user=user, admission_number=f'ST{n:04d}', student_class=cls.class_obj,
+            date_of_birth=datetime.date(2014, 1, 1), guardian_name='Guardian', guardian_phone='0700000000',
+        )
+        for subject, scores in totals.items():
+            for term, total in zip(cls.terms, scores):
+                Mark.objects.create(student=student, subject=subject, term=term, class_assigned=cls.class_obj,
+                                    assignment_marks=0, midterm_marks=0, exam_marks=total)
+        return student
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_student_trajectory(self):
+        data = self.client.get(reverse('student_trajectory', args=[self.student.id])).json()
+        self.assertEqual(data['student']['admission'], 'ST0001')
+        self.assertEqual([(t['label'], t['average'], t['grade']) for t in data['terms']], [
+            ('Term 3 - 2023/2024', 45.0, 'D'), ('Term 1 - 2024/2025', 55.0, 'C'), ('Term 2 - 2024/2025', 70.0, 'B+'),
+        ])
+        self.assertEqual([(t['class'], t['enrollment_status']) for t in data['terms']],
+                         [(None, None), ('P5', 'promoted'), ('P5', 'promoted')])
+        self.assertEqual([(y['academic_year'], y['average']) for y in data['years']],
+                         [('2023/2024', 45.0), ('2024/2025', 62.5)])
+        self.assertEqual({s['subject']: (s['change'], s['slope']) for s in data['subjects']},
+                         {'English': (20.0, 10.0), 'Mathematics': (30.0, 15.0)})
+        self.assertEqual([m['steps'] for m in data['grade_movement']], [1, 2])
+        self.assertEqual(data['overall_slope'], 12.5)
+
+    def test_student_without_marks_gets_an_empty_trajectory(self):
+        student = self.add_student(2, {})
+        data = self.client.get(reverse('student_trajectory', args=[student.id])).json()
+        self.assertEqual((data['terms'], data['subjects'], data['overall_slope']), ([], [], None))
+
+    def test_class_trajectory_query_count_independent_of_student_count(self):
+        url = reverse('class_trajectory', args=[self.class_obj.id])
+        with CaptureQueriesContext(connection) as one:
+            self.client.get(url)
+        for n in range(2, 7):
+            self.add_student(n, {self.maths: [30, 40, 50]})
+        with CaptureQueriesContext(connection) as six:
+            data = self.client.get(url).json()
+        self.assertEqual(len(one), len(six))
+        self.assertLessEqual(len(six), self.QUERY_BUDGET)
+        self.assertEqual([r['student']['admission'] for r in data['results']],
+                         ['ST0001', 'ST0002', 'ST0003', 'ST0004', 'ST0005', 'ST0006'])
+        self.assertEqual(data['results'][1]['overall_slope'], 10.0)
+
+    def test_trajectories_are_admin_only(self):
+        self.client.force_login(User.objects.create_user('teacher1', password='pass', user_type='teacher'))
+        self.assertEqual(self.client.get(reverse('student_trajectory', args=[self.student.id])).status_code, 302)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class AdminChangelistQueryTests(TestCase):
+    """Admin changelists must not issue one query per row."""
+
+    # Session, user, result count, rows and the list_filter choices
+    QUERY_BUDGET = 8
+    CHANGELISTS = ['student', 'teacher', 'mark', 'comment', 'enrollment', 'classfee', 'feepayment']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser('root', 'root@example.com', 'pass', user_type='admin')
+        cls.term = Term.objects.create(
+            term='1', academic_year='2024/2025', is_active=True,
+            start_date=datetime.date(2024, 1, 8), end_date=datetime.date(2024, 4, 5),
+        )
+        cls.year = AcademicYear.objects.create(code='2024/2025', is_active=True)
+        cls.subject = Subject.objects.create(name='Mathematics', code='MTH')
+        cls.class_obj = Class.objects.create(name='P5', level='P5', promotion_rank=5)
+        ClassFee.objects.create(class_assigned=cls.class_obj, term=cls.term, amount=1000,
+                                due_date=datetime.date(2024, 2, 1), fee_type='tuition')
+
+    def add_rows(self, start, count):
+        for n in range(start, start + count):
+            user = User.objects.create_user(f'student{n}', password='pass', user_type='student')
+            student = Student.objects.create(
+                user=user, admission_number=f'ST{n:04d}', student_class=self.class_obj,
+                date_of_birth=datetime.date(2014, 1, 1), guardian_name='Guardian', guardian_phone='0700000000',
+            )
+            tuser = User.objects.create_user(f'teacher{n}', password='pass', user_type='teacher')
+            teacher = Teacher.objects.create(user=tuser, employee_id=f'TC{n:04d}')
+            Mark.objects.create(
+                student=student, subject=self.subject, term=self.term, class_assigned=self.class_obj,
+                teacher=teacher, assignment_marks=15, midterm_marks=20, exam_marks=30,
+            )
+            Comment.objects.create(student=student, term=self.term, teacher=teacher, class_teacher_comment='Good')
+            Enrollment.objects.create(student=student, academic_year=self.year, class_assigned=self.class_obj)
+            FeePayment.objects.create(student=student, term=self.term, payment_method='cash',
+                                      amount_paid=500, receipt_no=f'RCP{n:04d}')
+
+    def changelist_queries(self, model_name):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(f'admin:school_{model_name}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_independent_of_row_count(self):
+        self.client.force_login(self.superuser)
+        self.add_rows(1, 1)
+        few = {name: self.changelist_queries(name) for name in self.CHANGELISTS}
+        self.add_rows(2, 15)
+        many = {name: self.changelist_queries(name) for name in self.CHANGELISTS}
+
+        self.assertEqual(few, many)
+        for name, queries in many.items():
+            self.assertLessEqual(queries, self.QUERY_BUDGET, name)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+@mock.patch.object(ApproximateCountPaginator, 'COUNT_LIMIT', 4)
+@mock.patch.object(StudentAdmin, 'list_per_page', 2)
+class ApproximateCountPaginatorTests(TestCase):
+    """Ten students, two per page, counted up to four rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser('root', 'root@example.com', 'pass', user_type='admin')
+        for n in range(10):
+            Student.objects.create(
+                user=User.objects.create_user(f'student{n}', password='pass', user_type='student'),
+                admission_number=f'ST{n:04d}', date_of_birth=datetime.date(2014, 1, 1),
+                guardian_name='Guardian', guardian_phone='0700000000',
+            )
+
+    def setUp(self):
+        self.client.force_login(self.superuser)
+
+    def changelist(self, page):
+        response = self.client.get(reverse('admin:school_student_changelist'), {'p': page})
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    def test_count_is_capped_before_the_last_capped_page(self):
+        cl = self.changelist(1)
+        self.assertEqual(cl.result_count, 4)
+        self.assertEqual(cl.paginator.num_pages, 2)
+
+    def test_pages_past_the_cap_are_counted_exactly(self):
+        self.assertEqual(self.changelist(2).paginator.num_pages, 5)
+        cl = self.changelist(5)
+        self.assertEqual(cl.result_count, 10)
+        self.assertEqual(len(cl.result_list), 2)
+
+    def test_malformed_page_numbers_count_like_the_first_page(self):
+        self.assertEqual(self.changelist('x').result_count, 4)
+
+
+def _file_caches(location):
+    """A CACHES setting with one cache shared by every process, on disk."""
+    return {'default': {'BACKEND': 'school.cache.FileBasedCache', 'LOCATION': location}}
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, LOCAL_CACHE_TIMEOUT=60)
+class AdminDashboardSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.school_class = Class.objects.create(name='P5 East', level='5')
+
+    def add_student(self, n):
+        user = User.objects.create_user(f'student{n}', password='pass', user_type='student')
+        return Student.objects.create(
+            user=user, admission_number=f'ST{n:04d}', student_class=self.school_class,
+            date_of_birth=datetime.date(2014, 1, 1), guardian_name='Guardian', guardian_phone='0700000000',
+        )
+
+    def total_students(self):
+        return get_admin_dashboard_snapshot()['total_students']
+
+    def test_snapshot_is_cached_until_a_write_invalidates_it(self):
+        self.add_student(1)
+        self.assertEqual(self.total_students(), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.total_students(), 1)
+        self.add_student(2)
+        self.assertEqual(self.total_students(), 2)
+
+    def test_per_process_snapshot_expires_after_writes_elsewhere(self):
+        self.assertEqual(self.total_students(), 0)
+        # Another process's invalidation only reaches its own cache
+        with mock.patch('school.analytics.cache', LocMemCache('another-process', {})):
+            self.add_student(1)
+        self.assertEqual(self.total_students(), 0)
+        with mock.patch('time.time', return_value=time.time() + 61):
+            self.assertEqual(self.total_students(), 1)
+
+    def test_shared_snapshot_is_kept_until_invalidated(self):
+        with TemporaryDirectory() as tmp, self.settings(CACHES=_file_caches(tmp)):
+            self.total_students()
+            with mock.patch('time.time', return_value=time.time() + 3600), self.assertNumQueries(0):
+                self.total_students()
+
+    def test_warm_command_needs_a_shared_cache(self):
+        with self.assertRaises(CommandError):
+            call_command('warm_dashboard_cache', stdout=StringIO())
+        self.add_student(1)
+        with TemporaryDirectory() as tmp, self.settings(CACHES=_file_caches(tmp)):
+            call_command('warm_dashboard_cache', stdout=StringIO())
+            self.assertEqual(FileBasedCache(tmp, {}).get(ADMIN_DASHBOARD_KEY)['total_students'], 1)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class CacheStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache.reset_stats()
+        self.client.force_login(User.objects.create_user('admin1', password='pass', user_type='admin'))
+
+    def test_reports_hit_rate_per_namespace(self):
+        cache.get('academic_calendar')
+        cache.set('academic_calendar', {}, None)
+        cache.get('academic_calendar')
+        cache.get('academic_calendar')
+
+        stats = self.client.get(reverse('cache_stats')).json()['caches']['default']
+        self.assertEqual(stats['namespaces']['academic_calendar'], {'hits': 2, 'misses': 1, 'hit_rate': 66.67})
+
+        self.client.post(reverse('cache_stats'))
+        self.assertEqual(cache.stats(), {})
+
+
+class AcademicCalendarTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        today = datetime.date.today()
+        self.first = Term.objects.create(term='1', academic_year='2024/2025', start_date=today,
+                                         end_date=today, is_active=True)
+        self.second = Term.objects.create(term='2', academic_year='2024/2025', start_date=today, end_date=today)
+
+    @override_settings(CALENDAR_CACHE_TIMEOUT=60)
+    def test_writes_from_other_processes_show_once_the_entry_expires(self):
+        self.assertEqual(academic_calendar.active_term(), self.first)
+        # A bulk update skips the signals, as a write from another process would
+        Term.objects.filter(pk=self.first.pk).update(is_active=False)
+        Term.objects.filter(pk=self.second.pk).update(is_active=True)
+        self.assertEqual(academic_calendar.active_term(), self.first)
+        with mock.patch('time.time', return_value=time.time() + 61):
+            self.assertEqual(academic_calendar.active_term(), self.second)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ConditionalDownloadTests(TestCase):
+    def setUp(self):
+        self.cache_dir = self.enterContext(TemporaryDirectory())
+        self.enterContext(self.settings(CACHES=_file_caches(self.cache_dir)))
+        cache.clear()
+        self.client.force_login(User.objects.create_user('admin1', password='pass', user_type='admin'))
+        user = User.objects.create_user('teacher1', password='pass', user_type='teacher', first_name='Ann')
+        self.teacher = Teacher.objects.create(user=user, employee_id='TC0001')
+        self.url = reverse('teacher_id_card_pdf', args=[self.teacher.id])
+
+    def rename_elsewhere(self, other_cache):
+        """Rename the teacher as another process would, bumping versions in ``other_cache``."""
+        with mock.patch('school.data_versions.cache', other_cache):
+            self.teacher.user.first_name = 'Anne'
+            self.teacher.user.save()
+
+    def test_unchanged_card_is_not_regenerated(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(any('teachers' in q['sql'] for q in ctx.captured_queries))
+
+    def test_renaming_the_teacher_changes_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.teacher.user.first_name = 'Anne'
+        self.teacher.user.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_rename_in_another_process_changes_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.rename_elsewhere(FileBasedCache(self.cache_dir, {}))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_per_process_cache_sends_no_validators(self):
+        with self.settings(CACHES={'default': {'BACKEND': 'school.cache.LocMemCache'}}):
+            response = self.client.get(self.url)
+            self.assertFalse(response.has_header('ETag'))
+            self.rename_elsewhere(LocMemCache('another-process', {}))
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH='*',
+                                       HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_search_results_do_not_revalidate_for_another_user(self):
+        url = reverse('search_students') + '?q=ann'
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(self.teacher.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class SubjectStatisticsInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.term = Term.objects.create(term='1', academic_year='2024/2025', is_active=True,
+                                        start_date=datetime.date(2024, 1, 8), end_date=datetime.date(2024, 4, 5))
+        self.maths = Subject.objects.create(name='Mathematics', code='MTH')
+        self.english = Subject.objects.create(name='English', code='ENG')
+        self.class_obj = Class.objects.create(name='P5', level='P5', promotion_rank=5)
+        user = User.objects.create_user('student1', password='pass', user_type='student')
+        self.student = Student.objects.create(
+            user=user, admission_number='ST0001', student_class=self.class_obj,
+            date_of_birth=datetime.date(2014, 1, 1), guardian_name='Guardian', guardian_phone='0700000000',
+        )
+
+    def count(self, subject):
+        return get_subject_statistics(subject.id, self.class_obj.id, self.term.id)['count']
+
+    def add_mark(self):
+        Mark.objects.create(student=self.student, subject=self.maths, term=self.term,
+                            class_assigned=self.class_obj, exam_marks=40)
+
+    def test_moving_a_mark_invalidates_both_slices(self):
+        self.add_mark()
+        self.assertEqual(self.count(self.maths), 1)
+        self.assertEqual(self.count(self.english), 0)
+
+        mark = Mark.objects.get()
+        mark.subject = self.english
+        mark.save()
+        self.assertEqual(self.count(self.maths), 0)
+        self.assertEqual(self.count(self.english), 1)
+
+    @override_settings(LOCAL_CACHE_TIMEOUT=60)
+    def test_marks_written_elsewhere_show_once_the_entry_expires(self):
+        self.assertEqual(self.count(self.maths), 0)
+        with mock.patch('school.analytics.cache', LocMemCache('another-process', {})):
+            self.add_mark()
+        self.assertEqual(self.count(self.maths), 0)
+        with mock.patch('time.time', return_value=time.time() + 61):
+            self.assertEqual(self.count(self.maths), 1)
+
+
+@override_settings(LOCAL_CACHE_TIMEOUT=60)
+class FragmentTimeoutTests(SimpleTestCase):
+    template = Template(
+        "{% load cache data_versions %}{% fragment_timeout as timeout %}"
+        "{% data_version 'marks' 1 as marks_version %}{% cache timeout figures marks_version %}{{ value }}{% endcache %}"
+    )
+
+    def render_twice(self):
+        """The fragment as rendered first, and as rendered an hour later from other data."""
+        first = self.template.render(Context({'value': 'old'}))
+        with mock.patch('time.time', return_value=time.time() + 3600):
+            return first, self.template.render(Context({'value': 'new'}))
+
+    def test_per_process_fragments_expire(self):
+        cache.clear()
+        self.assertEqual(self.render_twice(), ('old', 'new'))
+
+    def test_shared_fragments_are_kept_until_the_version_moves(self):
+        with TemporaryDirectory() as tmp, self.settings(CACHES=_file_caches(tmp)):
+            self.assertEqual(self.render_twice(), ('old', 'old'))
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, PROMOTION_RUN_IN_BACKGROUND=False)
+class PromotionTestCase(TestCase):
+    """P4 East/West and P5 East/West in 2024/2025; passing P4 students move up, P5 leavers graduate."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin1', password='pass', user_type='admin')
+        cls.year = AcademicYear.objects.create(code='2024/2025', is_active=True)
+        cls.term = Term.objects.create(
+            term='1', academic_year='2024/2025', is_active=True,
+            start_date=datetime.date(2024, 1, 8), end_date=datetime.date(2024, 4, 5),
+        )
+        subject = Subject.objects.create(name='Mathematics', code='MTH')
+        cls.classes = {}
+        for name, level, rank in [('P4 East', 'P4', 4), ('P4 West', 'P4', 4), ('P5 East', 'P5', 5), ('P5 West', 'P5', 5)]:
+            cls.classes[name] = Class.objects.create(name=name, level=level, promotion_rank=rank, academic_year='2024/2025')
+        cls.students = {}
+        for key, class_name, exam in [
+            ('east_pass', 'P4 East', 50), ('west_pass', 'P4 West', 50), ('east_fail', 'P4 East', 5),
+            ('leaver', 'P5 East', 50),
+        ]:
+            user = User.objects.create_user(key, password='pass', user_type='student')
+            student = Student.objects.create(
+                user=user, admission_number=key.upper(), student_class=cls.classes[class_name],
+                date_of_birth=datetime.date(2014, 1, 1), guardian_name='Guardian', guardian_phone='0700000000',
+            )
+            Mark.objects.create(student=student, subject=subject, term=cls.term, class_assigned=student.student_class,
+                                assignment_marks=15, midterm_marks=20, exam_marks=exam)
+            cls.students[key] = student
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def start_run(self, **data):
+        return self.client.post(reverse('promotion'), {
+            'source_year': '2024/2025', 'target_year': '2025/2026', 'stream_policy': 'same_stream', **data,
+        })
+
+
+class PromotionReportTests(PromotionTestCase):
+    def test_invalid_run_id_is_not_found(self):
+        self.assertEqual(self.client.get(reverse('promotion_report') + '?run=abc').status_code, 404)
+
+    def test_real_run_does_not_build_the_preview_plan(self):
+        with mock.patch('school.views.build_promotion_plan') as build_plan:
+            response = self.start_run(activate_target='on')
+        build_plan.assert_not_called()
+        run = PromotionRun.objects.get()
+        self.assertRedirects(response, f"{reverse('promotion_report')}?run={run.id}")
+        self.assertEqual(run.status, 'completed')
+        self.assertContains(self.client.get(response['Location']), 'Completed')
+
+    def test_stalled_run_is_marked_failed(self):
+        run = PromotionRun.objects.create(source_year='2024/2025', target_year='2025/2026', status='running')
+        PromotionRun.objects.filter(pk=run.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        status = self.client.get(reverse('promotion_run_status', args=[run.id])).json()
+        self.assertEqual(status['status'], 'failed')
+
+
+class PromotionRollbackTests(PromotionTestCase):
+    def placements(self):
+        return {
+            s.admission_number: (s.student_class_id, s.is_graduated, s.graduation_year)
+            for s in Student.objects.all()
+        }
+
+    def test_rollback_restores_placements_and_active_years(self):
+        previous = AcademicYear.objects.create(code='2025/2026')
+        Enrollment.objects.create(student=self.students['east_fail'], academic_year=previous,
+                                  class_assigned=self.classes['P4 West'], status='enrolled')
+        before = self.placements()
+        self.start_run(activate_target='on')
+        run = PromotionRun.objects.get()
+        self.assertEqual(run.status, 'completed')
+        self.assertTrue(AcademicYear.objects.get(code='2025/2026').is_active)
+        self.assertNotEqual(self.placements(), before)
+
+        self.client.post(reverse('promotion_rollback', args=[run.id]))
+        run.refresh_from_db()
+        self.assertEqual(run.status, 'rolled_back')
+        self.assertEqual(self.placements(), before)
+        enrollment = Enrollment.objects.get()
+        self.assertEqual((enrollment.class_assigned, enrollment.status), (self.classes['P4 West'], 'enrolled'))
+        self.assertEqual(list(AcademicYear.objects.filter(is_active=True)), [self.year])
+
+    def test_search_documents_follow_placements_and_rollback(self):
+        def subtitles():
+            return dict(SearchDocument.objects.filter(doc_type='student', object_id__in=[
+                self.students['east_pass'].id, self.students['leaver'].id,
+            ]).values_list('title', 'subtitle'))
+
+        before = {'east_pass': 'EAST_PASS · P4 East', 'leaver': 'LEAVER · P5 East'}
+        self.assertEqual(subtitles(), before)
+        self.start_run()
+        self.assertEqual(subtitles(), {'east_pass': 'EAST_PASS · P5 East', 'leaver': 'LEAVER · -'})
+        rollback_promotion(PromotionRun.objects.get())
+        self.assertEqual(subtitles(), before)
+
+    def test_target_year_is_only_activated_on_request_and_removed_on_rollback(self):
+        self.start_run()
+        run = PromotionRun.objects.get()
+        self.assertFalse(AcademicYear.objects.get(code='2025/2026').is_active)
+        self.assertTrue(run.created_target_year)
+
+        rollback_promotion(run)
+        self.assertFalse(AcademicYear.objects.filter(code='2025/2026').exists())
+        self.assertFalse(Enrollment.objects.exists())
+        self.assertEqual(list(AcademicYear.objects.filter(is_active=True)), [self.year])
+
+    def test_second_rollback_is_rejected(self):
+        self.start_run(activate_target='on')
+        run = PromotionRun.objects.get()
+        rollback_promotion(run)
+        with self.assertRaises(RollbackError):
+            rollback_promotion(run)
+        response = self.client.post(reverse('promotion_rollback', args=[run.id]), follow=True)
+        self.assertContains(response, 'cannot be rolled back')
+
+
+class PromotionPlanTests(PromotionTestCase):
+    def test_plan_places_every_student(self):
+        plan = build_promotion_plan('2024/2025', '2025/2026')
+        placed = {p['student'].admission_number: (p['status'], p['to_class'] and p['to_class'].name)
+                  for p in plan['placements']}
+        self.assertEqual(placed, {
+            'EAST_PASS': ('promoted', 'P5 East'),
+            'WEST_PASS': ('promoted', 'P5 West'),
+            'EAST_FAIL': ('repeating', 'P4 East'),
+            'LEAVER': ('graduated', None),
+        })
+        self.assertEqual((plan['promoted'], plan['repeating'], plan['graduated']), (2, 1, 1))
+        self.assertEqual(len(plan['new_classes']), 4)
+
+    def test_dry_run_writes_nothing(self):
+        counts = [model.objects.count() for model in (AcademicYear, Class, Enrollment, PromotionRun)]
+        placements = list(Student.objects.values_list('student_class_id', 'is_graduated'))
+        response = self.start_run(dry_run='1', activate_target='on')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'P5 West')
+        self.assertEqual([model.objects.count() for model in (AcademicYear, Class, Enrollment, PromotionRun)], counts)
+        self.assertEqual(list(Student.objects.values_list('student_class_id', 'is_graduated')), placements)
+
+
+class StreamPolicyTests(TestCase):
+    def setUp(self):
+        self.p4_east = Class(pk=1, name='P4 East', level='P4', promotion_rank=4)
+        self.p5 = [Class(pk=pk, name=f'P5 {stream}', level='P5', promotion_rank=5)
+                   for pk, stream in [(2, 'North'), (3, 'East'), (4, 'West')]]
+
+    def test_same_stream_keeps_the_stream(self):
+        mapper = StreamMapper(self.p5, 'same_stream')
+        self.assertEqual(mapper.resolve(self.p4_east, 5).name, 'P5 East')
+        self.assertIsNone(mapper.resolve(self.p4_east, 6))
+
+    def test_first_uses_the_first_stream(self):
+        mapper = StreamMapper(self.p5, 'first')
+        self.assertEqual({mapper.resolve(self.p4_east, 5).name for _ in range(3)}, {'P5 North'})
+
+    def test_balance_fills_the_emptiest_stream(self):
+        mapper = StreamMapper(self.p5, 'balance', sizes={2: 2, 3: 0, 4: 1})
+        placed = [mapper.resolve(self.p4_east, 5).name for _ in range(3)]
+        self.assertEqual(placed, ['P5 East', 'P5 East', 'P5 West'])
+
+    def test_unknown_policy_is_rejected(self):
+        with self.assertRaises(ValueError):
+            StreamMapper(self.p5, 'random')
+
+
+class PromotionRunTests(PromotionTestCase):
+    def test_chunked_run_matches_the_plan_and_resumes_after_a_failure(self):
+        plan = build_promotion_plan('2024/2025', '2025/2026')
+        expected = {p['student'].id: (p['status'], p['to_class'] and p['to_class'].name) for p in plan['placements']}
+        run = PromotionRun.objects.create(source_year='2024/2025', target_year='2025/2026')
+
+        calls = []
+
+        def fail_second_chunk(placements, target_year):
+            calls.append(len(placements))
+            if len(calls) == 2:
+                raise RuntimeError('worker died')
+            return write_placements(placements, target_year)
+
+        with mock.patch('school.promotion.write_placements', side_effect=fail_second_chunk), \
+                self.assertLogs('school.promotion', 'ERROR'):
+            run = run_promotion(run, chunk_size=1)
+        self.assertEqual((run.status, run.processed), ('failed', 1))
+        self.assertEqual(Enrollment.objects.count(), 1)
+
+        run = run_promotion(run, chunk_size=1)
+        self.assertEqual(run.status, 'completed')
+        self.assertEqual((run.processed, run.promoted, run.repeating, run.graduated), (4, 2, 1, 1))
+        self.assertEqual(run.snapshots.count(), 4)
+        enrolled = {
+            e.student_id: (e.status, e.class_assigned and e.class_assigned.name)
+            for e in Enrollment.objects.select_related('class_assigned')
+        }
+        self.assertEqual(enrolled, expected)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class StudentSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ids = {}
+        for n, (first, last) in enumerate([('Annabel', 'Okello'), ('Ann', 'Mugisha'), ('Brian', 'Ann'),
+                                           ('Peter', 'Otim'), ('Grace', 'Nakato')], start=1):
+            user = User.objects.create_user(f'student{n}', password='pass', user_type='student',
+                                            first_name=first, last_name=last)
+            self.ids[first] = Student.objects.create(
+                user=user, admission_number=f'ST{n:04d}', date_of_birth=datetime.date(2014, 1, 1),
+                guardian_name='Guardian', guardian_phone='0700000000',
+            ).id
+
+    def test_admission_number_finds_only_that_student(self):
+        self.assertEqual(search_student_ids('ST0005'), [self.ids['Grace']])
+        self.assertEqual(search_student_ids('st0004'), [self.ids['Peter']])
+
+    def test_admission_prefix_lists_matching_ids_in_order(self):
+        self.assertEqual(search_student_ids('ST000'), list(self.ids.values()))
+        self.assertEqual(search_student_ids(' ST0001 '), [self.ids['Annabel']])
+
+    def test_closest_prefix_matches_rank_first(self):
+        self.assertEqual(search_student_ids('ann'), [self.ids['Ann'], self.ids['Brian'], self.ids['Annabel']])
+        self.assertEqual(search_student_ids('ann oke'), [self.ids['Annabel']])
+
+    def test_fuzzy_matches_are_a_fallback_for_typos(self):
+        self.assertEqual(search_student_ids('Anabel'), [self.ids['Annabel']])
+        self.assertEqual(search_student_ids('Nakatto')[:1], [self.ids['Grace']])
+        self.assertEqual(search_student_ids('xyz'), [])
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class GlobalSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('student1', password='pass', user_type='student', first_name='Amina')
+        self.student = Student.objects.create(
+            user=user, admission_number='ST0001', date_of_birth=datetime.date(2014, 1, 1),
+            guardian_name='Grace Okello', guardian_phone='0772123456',
+        )
+
+    def search(self, user_type, q):
+        user, _ = User.objects.get_or_create(username=f'{user_type}1', defaults={'user_type': user_type})
+        self.client.force_login(user)
+        return self.client.get(reverse('global_search'), {'q': q}).json()['results']
+
+    def test_guardians_are_hidden_from_teachers(self):
+        results = self.search('teacher', 'okello')
+        self.assertNotIn('guardian', results)
+        self.assertEqual(self.search('teacher', '0772'), {'student': []})
+
+    def test_bursars_find_guardians_by_phone(self):
+        results = self.search('bursar', '0772')
+        self.assertEqual([r['id'] for r in results['guardian']], [self.student.id])
+
+    def test_saving_unindexed_fields_skips_reindexing(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.student.save(update_fields=['is_graduated'])
+        self.assertFalse(any('search_' in q['sql'] for q in ctx.captured_queries))
+
+        self.student.guardian_phone = '0700111222'
+        self.student.save(update_fields=['guardian_phone'])
+        self.assertEqual([r['id'] for r in self.search('admin', '0700111')['guardian']], [self.student.id])
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class KeysetPaginationTests(TestCase):
+    """120 students: two full pages of 50 and one of 20, with first names repeated."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin1', password='pass', user_type='admin')
+        users = User.objects.bulk_create([
+            User(username=f'student{n}', user_type='student', first_name=['Ann', 'Brian', 'Grace'][n % 3])
+            for n in range(120)
+        ])
+        Student.objects.bulk_create([
+            Student(user=user, admission_number=f'ST{n:04d}', date_of_birth=datetime.date(2014, 1, 1),
+                    guardian_name='Guardian', guardian_phone='0700000000')
+            for n, user in enumerate(users)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def page(self, query=''):
+        response = self.client.get(reverse('manage_students') + '?' + query)
+        self.assertEqual(response.status_code, 200)
+        context = response.context
+        return [s.admission_number for s in context['students']], context['previous_query'], context['next_query']
+
+    def walk(self, sort):
+        """Every page forwards from the first, then backwards from the last."""
+        forward = []
+        rows, previous, following = self.page(f'sort={sort}')
+        self.assertEqual(previous, '')
+        forward.append(rows)
+        while following:
+            rows, previous, following = self.page(following)
+            forward.append(rows)
+        backward = [rows]
+        while previous:
+            rows, previous, _ = self.page(previous)
+            backward.append(rows)
+        return forward, backward[::-1]
+
+    def test_pages_cover_every_row_once_in_both_directions(self):
+        for sort, key in [('admission', None), ('-admission', None), ('name', 'first_name')]:
+            forward, backward = self.walk(sort)
+            self.assertEqual([len(rows) for rows in forward], [50, 50, 20], sort)
+            self.assertEqual(backward, forward, sort)
+            numbers = [number for rows in forward for number in rows]
+            self.assertEqual(len(set(numbers)), 120, sort)
+            if key is None:
+                self.assertEqual(numbers, sorted(numbers, reverse=sort.startswith('-')))
+
+    def test_ties_on_the_sort_value_are_split_by_id(self):
+        page = keyset_paginate(Student.objects.all(), 'user__first_name', page_size=30)
+        self.assertEqual({s.user.first_name for s in page}, {'Ann'})
+        following = keyset_paginate(Student.objects.all(), 'user__first_name', after=page.next_cursor, page_size=30)
+        names = [s.user.first_name for s in following]
+        self.assertEqual(names, ['Ann'] * 10 + ['Brian'] * 20)
+        self.assertGreater(following.items[0].pk, page.items[-1].pk)
+
+    def test_invalid_cursors_show_the_first_page(self):
+        first, _, _ = self.page()
+        for cursor in ['garbage', '%%%', encode_cursor(None, 1), encode_cursor(['ST0001'], 1),
+                       encode_cursor('ST0001', 'x'), encode_cursor('ST0001', True)]:
+            for param in ('after', 'before'):
+                rows, previous, _ = self.page(urlencode({param: cursor}))
+                self.assertEqual((rows, previous), (first, ''), f'{param}={cursor}')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class AdminListFilterTests(TestCase):
+    """Class and subject filters on the student and teacher lists."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin1', password='pass', user_type='admin')
+        cls.class_obj = Class.objects.create(name='P4', level='P4')
+        cls.subject = Subject.objects.create(name='Mathematics', code='MTH')
+        for n, class_obj in enumerate([cls.class_obj, None]):
+            Student.objects.create(
+                user=User.objects.create_user(f'student{n}', password='pass', user_type='student'),
+                admission_number=f'ST{n:04d}', student_class=class_obj, date_of_birth=datetime.date(2014, 1, 1),
+                guardian_name='Guardian', guardian_phone='0700000000',
+            )
+            teacher = Teacher.objects.create(
+                user=User.objects.create_user(f'teacher{n}', password='pass', user_type='teacher'),
+                employee_id=f'TC{n:04d}',
+            )
+            if class_obj:
+                teacher.classes.add(class_obj)
+                teacher.subjects.add(cls.subject)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def listed(self, view, params):
+        response = self.client.get(reverse(view), params)
+        self.assertEqual(response.status_code, 200)
+        rows = response.context['students' if view == 'manage_students' else 'teachers']
+        return [getattr(row, 'admission_number', None) or row.employee_id for row in rows]
+
+    def test_filters_narrow_the_lists(self):
+        self.assertEqual(self.listed('manage_students', {'class_id': self.class_obj.id}), ['ST0000'])
+        self.assertEqual(self.listed('manage_teachers', {'class_id': self.class_obj.id}), ['TC0000'])
+        self.assertEqual(self.listed('manage_teachers', {'subject_id': self.subject.id}), ['TC0000'])
+
+    def test_non_numeric_filters_are_ignored(self):
+        for value in ('abc', '1.5', '-1', '١'):
+            self.assertEqual(self.listed('manage_students', {'class_id': value}), ['ST0000', 'ST0001'])
+            self.assertEqual(self.listed('manage_teachers', {'class_id': value, 'subject_id': value}),
+                             ['TC0000', 'TC0001'])
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class IdSequenceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.school_class = Class.objects.create(name='P5 East', level='5')
+        self.client.force_login(User.objects.create_user('admin1', password='pass', user_type='admin'))
+
+    def add_student(self, username, admission_number=''):
+        return self.client.post(reverse('manage_students'), {
+            'action': 'add', 'username': username, 'password': 'pass', 'first_name': 'Ann',
+            'last_name': 'Okello', 'admission_number': admission_number, 'class_id': self.school_class.id,
+            'date_of_birth': '2014-01-01', 'guardian_name': 'Guardian', 'guardian_phone': '0700000000',
+        }, follow=True)
+
+    def test_advance_past_skips_typed_ids_and_never_moves_back(self):
+        self.assertEqual(next_id('student'), 'ST0001')
+        advance_past('student', ['ST0002', 'X7'])
+        self.assertEqual(next_id('student'), 'ST0003')
+        advance_past('student', ['ST0001'])
+        self.assertEqual(next_id('student'), 'ST0004')
+
+    def test_generated_numbers_skip_a_typed_admission_number(self):
+        self.add_student('student1')
+        self.add_student('student2', 'ST0002')
+        self.add_student('student3')
+        self.assertEqual(list(Student.objects.order_by('id').values_list('admission_number', flat=True)),
+                         ['ST0001', 'ST0002', 'ST0003'])
+
+    def test_taken_admission_number_adds_neither_user_nor_student(self):
+        self.add_student('student1', 'ST0001')
+        response = self.add_student('student2', 'ST0001')
+        self.assertContains(response, 'already in use')
+        self.assertFalse(User.objects.filter(username='student2').exists())
+        self.assertEqual(Student.objects.count(), 1)
+
+    def test_generated_employee_ids_skip_a_typed_one(self):
+        for username, employee_id in [('teacher1', 'TC0004'), ('teacher2', '')]:
+            self.client.post(reverse('manage_teachers'), {
+                'action': 'add', 'username': username, 'password': 'pass', 'first_name': 'Ann',
+                'last_name': 'Okello', 'employee_id': employee_id,
+            })
+        self.assertEqual(Teacher.objects.get(user__username='teacher2').employee_id, 'TC0005')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class RenumberingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.students = []
+        for n, admission in enumerate(['X9', 'ST0001', 'ST0005']):
+            user = User.objects.create_user(f'student{n}', password='pass', user_type='student')
+            self.students.append(Student.objects.create(
+                user=user, admission_number=admission, date_of_birth=datetime.date(2014, 1, 1),
+                guardian_name='Guardian', guardian_phone='0700000000',
+            ))
+
+    def test_plan_numbers_rows_by_primary_key(self):
+        plan = plan_renumbering('student')
+        self.assertEqual([(old, new) for _, old, new, _ in plan],
+                         [('X9', 'ST0001'), ('ST0001', 'ST0002'), ('ST0005', 'ST0003')])
+
+    def test_apply_swaps_ids_resets_the_sequence_and_reindexes_in_bulk(self):
+        with CaptureQueriesContext(connection) as ctx:
+            changed = apply_renumbering('student', plan_renumbering('student'), batch_size=500)
+        self.assertEqual(changed, 3)
+        self.assertEqual(list(Student.objects.order_by('id').values_list('admission_number', flat=True)),
+                         ['ST0001', 'ST0002', 'ST0003'])
+        term_deletes = [q for q in ctx.captured_queries
+                        if q['sql'].startswith('DELETE FROM "student_search_terms"')]
+        self.assertEqual(len(term_deletes), 1)
+        self.assertEqual(search_student_ids('ST0002')[0], self.students[1].id)
+        self.assertEqual(next_id('student'), 'ST0004')
+
+    def test_second_apply_changes_nothing(self):
+        apply_renumbering('student', plan_renumbering('student'))
+        self.assertEqual(apply_renumbering('student', plan_renumbering('student')), 0)
+
+
+WRAPPED_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher', 'school.hashing.PBKDF2WrappedPBKDF2PasswordHasher']
+
+
+@override_settings(PASSWORD_HASHERS=WRAPPED_HASHERS)
+@mock.patch.object(PBKDF2WrappedPBKDF2PasswordHasher, 'iterations', 2000)
+class WrappedPasswordHasherTests(TestCase):
+    def legacy_hash(self, password):
+        return PBKDF2PasswordHasher().encode(password, 'legacysalt', iterations=1000)
+
+    def test_verifies_a_wrapped_legacy_hash(self):
+        wrapped = wrap_password_hash(self.legacy_hash('secret'))
+        self.assertTrue(wrapped.startswith('pbkdf2_wrapped_pbkdf2_sha256$2000$'))
+        self.assertTrue(check_password('secret', wrapped))
+        self.assertFalse(check_password('wrong', wrapped))
+
+    def test_login_replaces_the_wrapped_hash(self):
+        user = User.objects.create(username='legacy', user_type='admin',
+                                   password=wrap_password_hash(self.legacy_hash('secret')))
+        self.assertTrue(self.client.login(username='legacy', password='secret'))
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('md5$'))
+        self.assertTrue(user.check_password('secret'))
+
+    def test_safe_summary_masks_salts_and_hash(self):
+        summary = PBKDF2WrappedPBKDF2PasswordHasher().safe_summary(wrap_password_hash(self.legacy_hash('secret')))
+        self.assertEqual(summary['algorithm'], 'pbkdf2_wrapped_pbkdf2_sha256')
+        self.assertEqual((summary['iterations'], summary['inner iterations']), (2000, 1000))
+        self.assertTrue(summary['hash'].endswith('*' * 10))
+
+    def test_only_pbkdf2_sha256_hashes_can_be_wrapped(self):
+        with self.assertRaises(ValueError):
+            wrap_password_hash('md5$salt$abc')
+        with self.assertRaises(ValueError):
+            PBKDF2WrappedPBKDF2PasswordHasher().decode('md5$1$salt$1$salt$abc')
+
+    def test_rehash_passwords_is_idempotent(self):
+        User.objects.create(username='plain', user_type='student', password='plaintext')
+        User.objects.create(username='weak', user_type='student', password=self.legacy_hash('weakpass'))
+        out = StringIO()
+        call_command('rehash_passwords', '--upgrade-iterations', '--workers', '1', stdout=out)
+        self.assertIn('1 user(s) re-hashed', out.getvalue())
+        self.assertIn('1 hash(es) upgraded', out.getvalue())
+        hashes = dict(User.objects.values_list('username', 'password'))
+        self.assertTrue(check_password('plaintext', hashes['plain']))
+        self.assertTrue(hashes['weak'].startswith('pbkdf2_wrapped_pbkdf2_sha256$'))
+        self.assertTrue(check_password('weakpass', hashes['weak']))
+
+        out = StringIO()
+        call_command('rehash_passwords', '--upgrade-iterations', '--workers', '1', stdout=out)
+        self.assertIn('0 user(s) re-hashed', out.getvalue())
+        self.assertIn('0 hash(es) upgraded', out.getvalue())
+        self.assertEqual(dict(User.objects.values_list('username', 'password')), hashes)
+
+
+STUDENT_CSV_HEADER = 'first_name,last_name,date_of_birth,guardian_name,guardian_phone,admission_number,password,email\n'
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class StudentImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('existing', password='pass', user_type='student')
+        Student.objects.create(user=user, admission_number='ST0005', date_of_birth=datetime.date(2014, 1, 1),
+                               guardian_name='Guardian', guardian_phone='0700000000')
+
+    def csv(self, *lines):
+        return STUDENT_CSV_HEADER + ''.join(line + '\n' for line in lines)
+
+    def errors(self, content):
+        return {row['line']: row['errors'] for row in parse_import('student', content) if row['errors']}
+
+    def test_generated_ids_skip_ids_typed_into_the_file(self):
+        rows = parse_import('student', self.csv(
+            'Ann,Okello,2014-01-01,G,0700000000,ST0006,pass1234,',
+            'Ben,Okello,2014-01-01,G,0700000000,,pass1234,',
+        ))
+        created = run_import('student', rows, workers=1)
+        self.assertEqual([c['id'] for c in created], ['ST0006', 'ST0007'])
+        self.assertEqual(next_id('student'), 'ST0008')
+        self.assertEqual(Student.objects.filter(user__username='st0007').count(), 1)
+
+    def test_duplicate_and_existing_ids_are_row_errors(self):
+        errors = self.errors(self.csv(
+            'Ann,Okello,2014-01-01,G,0700000000,ST0009,,',
+            'Ben,Okello,2014-01-01,G,0700000000,st0009,,',
+            'Cai,Okello,2014-01-01,G,0700000000,st0005,,',
+        ))
+        self.assertEqual(errors, {
+            3: ['admission_number st0009 appears twice in the file'],
+            4: ['admission_number st0005 already exists'],
+        })
+
+    def test_lengths_and_formats_are_checked_before_writing(self):
+        errors = self.errors(self.csv(
+            'Ann,Okello,2014-01-01,G,0700 000 000 000 000,,,',
+            'Ben,Okello,2014-01-01,G,call me,,,',
+            'Cai,Okello,2014-01-01,G,0700000000,,,not-an-email',
+            f"Dan,Okello,2014-01-01,{'G' * 101},0700000000,,,",
+            ',Okello,31/02/2014,G,0700000000,,,',
+        ))
+        self.assertEqual(errors[2], ['guardian_phone is longer than 15 characters'])
+        self.assertEqual(errors[3], ['guardian_phone may only contain digits, spaces, brackets, - and a leading +'])
+        self.assertEqual(errors[4], ['email not-an-email is not a valid address'])
+        self.assertEqual(errors[5], ['guardian_name is longer than 100 characters'])
+        self.assertEqual(errors[6], ['first_name is required', 'date_of_birth must be YYYY-MM-DD or DD/MM/YYYY'])
+
+    def test_preview_then_import_through_the_page(self):
+        with self.settings(IMPORT_UPLOAD_DIR=self.enterContext(TemporaryDirectory())):
+            self.client.force_login(User.objects.create_user('admin1', password='pass', user_type='admin'))
+            upload = SimpleUploadedFile('intake.csv', self.csv(
+                'Ann,Okello,2014-01-01,G,0700000000,,,',
+                'Ben,Okello,not a date,G,0700000000,,,',
+            ).encode())
+            response = self.client.post(reverse('bulk_import'), {'action': 'preview', 'kind': 'student', 'file': upload})
+            self.assertEqual((response.context['valid_count'], response.context['error_count']), (1, 1))
+            pending = self.client.session['bulk_import']
+            self.assertEqual(set(pending), {'kind', 'key'})
+
+            response = self.client.post(reverse('bulk_import'), {'action': 'import', 'kind': 'student'})
+            self.assertEqual(len(response.context['created']), 1)
+            self.assertTrue(response.context['created'][0]['password'])
+            self.assertTrue(Student.objects.filter(user__first_name='Ann').exists())
+            self.assertIsNone(pop_upload(pending['key']))
+
+            response = self.client.post(reverse('bulk_import'), {'action': 'import', 'kind': 'student'}, follow=True)
+            self.assertContains(response, 'Nothing to import')
+
+    def test_import_people_command_saves_generated_credentials(self):
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'intake.csv'
+            path.write_text(self.csv('Ann,Okello,2014-01-01,G,0700000000,,,'))
+            with self.assertRaises(CommandError):
+                call_command('import_people', 'student', str(path), '--commit', stdout=StringIO())
+            credentials = Path(tmp) / 'credentials.csv'
+            call_command('import_people', 'student', str(path), '--commit', '--workers', '1',
+                         '--credentials', str(credentials), stdout=StringIO())
+            self.assertIn('ST0006', credentials.read_text())
+        self.assertTrue(Student.objects.filter(admission_number='ST0006').exists())
+
+
+def _image_bytes(fmt='PNG'):
+    out = BytesIO()
+    Image.new('RGB', (40, 30), 'navy').save(out, fmt)
+    return out.getvalue()
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class PhotoZipTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.enterContext(self.settings(MEDIA_ROOT=self.enterContext(TemporaryDirectory())))
+        self.students = {}
+        for n, admission in enumerate(['St0001', 'ST0002', 'ST0003', 'ST0004']):
+            user = User.objects.create_user(f'student{n}', password='pass', user_type='student')
+            self.students[admission] = Student.objects.create(
+                user=user, admission_number=admission, date_of_birth=datetime.date(2014, 1, 1),
+                guardian_name='Guardian', guardian_phone='0700000000',
+            )
+
+    def archive(self, entries, method=zipfile.ZIP_STORED):
+        out = BytesIO()
+        with zipfile.ZipFile(out, 'w', method) as archive:
+            for name, data in entries:
+                archive.writestr(name, data)
+        return out.getvalue()
+
+    def test_matches_ids_case_insensitively(self):
+        report = ingest_photo_zip(BytesIO(self.archive([('photos/st0001.JPG', _image_bytes('JPEG'))])), workers=1)
+        self.assertEqual((report['students'], report['unmatched'], report['failed']), (1, [], []))
+        self.students['St0001'].refresh_from_db()
+        self.assertTrue(self.students['St0001'].photo.name.endswith('.jpg'))
+
+    def test_entries_sharing_an_id_are_reported_and_skipped(self):
+        report = ingest_photo_zip(BytesIO(self.archive([
+            ('ST0002.jpg', _image_bytes('JPEG')), ('extra/st0002.png', _image_bytes()), ('NOBODY.png', _image_bytes()),
+        ])), workers=1)
+        self.assertEqual(report['duplicates'], ['ST0002.jpg', 'extra/st0002.png'])
+        self.assertEqual((report['students'], report['unmatched']), (0, ['NOBODY']))
+        self.students['ST0002'].refresh_from_db()
+        self.assertFalse(self.students['ST0002'].photo)
+
+    def test_unreadable_entries_are_reported_per_entry(self):
+        data = bytearray(self.archive([('ST0003.png', _image_bytes()), ('ST0004.png', _image_bytes())]))
+        # Mark the first entry as AES-encrypted (method 99) in its local and central headers
+        data[8:10] = (99).to_bytes(2, 'little')
+        central = data.find(b'PK\x01\x02')
+        data[central + 10:central + 12] = (99).to_bytes(2, 'little')
+        corrupt = bytearray(self.archive([('ST0001.png', _image_bytes() * 4)], zipfile.ZIP_DEFLATED))
+        corrupt[60:80] = b'\xff' * 20
+
+        report = ingest_photo_zip(BytesIO(bytes(data)), workers=1)
+        self.assertEqual(report['failed'], ['ST0003.png (unsupported compression)'])
+        self.assertEqual(report['students'], 1)
+        report = ingest_photo_zip(BytesIO(bytes(corrupt)), workers=1)
+        self.assertEqual(report['failed'], ['ST0001.png (corrupt entry)'])
+
+    def test_upload_page_reports_a_broken_archive(self):
+        self.client.force_login(User.objects.create_user('admin1', password='pass', user_type='admin'))
+        upload = SimpleUploadedFile('photos.zip', b'not a zip')
+        response = self.client.post(reverse('bulk_photo_upload'), {'archive': upload}, follow=True)
+        self.assertContains(response, 'not a valid ZIP archive')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class MediaAccessTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.enterContext(self.settings(MEDIA_ROOT=self.enterContext(TemporaryDirectory())))
+        self.students = []
+        for n, colour in enumerate(['navy', 'olive']):
+            user = User.objects.create_user(f'student{n}', password='pass', user_type='student')
+            student = Student.objects.create(
+                user=user, admission_number=f'ST000{n + 1}', date_of_birth=datetime.date(2014, 1, 1),
+                guardian_name='Guardian', guardian_phone='0700000000',
+            )
+            out = BytesIO()
+            Image.new('RGB', (8, 8), colour).save(out, 'PNG')
+            student.photo.save('photo.png', ContentFile(out.getvalue()))
+            self.students.append(student)
+        self.factory = RequestFactory()
+
+    def fetch(self, user, student):
+        request = self.factory.get('/media/' + student.photo.name)
+        request.user = user
+        return serve_media(request, student.photo.name)
+
+    def test_media_urls_are_routed_to_the_checked_view(self):
+        self.assertIs(resolve('/media/' + self.students[0].photo.name).func, serve_media)
+
+    def test_anonymous_users_are_sent_to_login(self):
+        response = self.fetch(AnonymousUser(), self.students[0])
+        self.assertEqual(response.status_code, 302)
+
+    def test_students_see_only_their_own_photo(self):
+        own, other = self.students
+        response = self.fetch(own.user, own)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, max-age=31536000, immutable')
+        with self.assertRaises(Http404):
+            self.fetch(own.user, other)
+
+    def test_bursars_see_student_photos(self):
+        bursar = User.objects.create_user('bursar1', password='pass', user_type='bursar')
+        response = self.fetch(bursar, self.students[1])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Cache-Control'].startswith('private'))
+
+
+CHART_STAND_IN = '''/*! Stand-in for the vendored Chart.js: records each chart's config */
+window.Chart=function(canvas,config){charts.push({canvas:canvas.id,config:config});};
+'''
+CHARTS_DRIVER = r'''
+var charts = [];
+var elements = {
+  'bursar-daily': { textContent: JSON.stringify({ labels: ['Mon', 'Tue'], values: [1500, 2500] }) },
+  'bursar-methods': { textContent: JSON.stringify({ labels: ['cash', 'bank'], values: [3, 1] }) },
+  dailyChart: { id: 'dailyChart' },
+  methodChart: { id: 'methodChart' }
+};
+var window = globalThis;
+var document = { getElementById: function (id) { return elements[id] || null; } };
+'''
+
+
+class AssetBundleTests(SimpleTestCase):
+    def setUp(self):
+        bundle_built.cache_clear()
+        self.addCleanup(bundle_built.cache_clear)
+        # Listed first so it wins over a committed copy of the real library
+        vendor_dir = self.enterContext(TemporaryDirectory())
+        (Path(vendor_dir) / 'vendor').mkdir()
+        (Path(vendor_dir) / 'vendor' / 'chart.umd.min.js').write_text(CHART_STAND_IN)
+        self.enterContext(self.settings(STATICFILES_DIRS=[vendor_dir, *settings.STATICFILES_DIRS]))
+
+    def test_minify_js_keeps_code_around_block_comments(self):
+        source = '/* a */ foo();\n/* b\n   c */ bar();\n  // d\nvar s = "/* e */";\n\n/**/ /* f */ baz();\n'
+        self.assertEqual(minify_js(source), 'foo();\nbar();\nvar s = "/* e */";\nbaz();\n')
+
+    def test_build_bundle_keeps_vendored_files_and_minifies_ours(self):
+        bundle = build_bundle('bursar_dashboard.js')
+        self.assertTrue(bundle.startswith(CHART_STAND_IN + ';\n'))
+        self.assertIn("new Chart(ctx2, {\ntype: 'doughnut',", bundle)
+        self.assertNotIn('// Bursar dashboard charts', bundle)
+        self.assertNotIn('\n  ', bundle)
+
+    @skipUnless(shutil.which('node'), 'node is not installed')
+    def test_built_bundle_passes_the_dashboard_series_to_chart_js(self):
+        script = CHARTS_DRIVER + build_bundle('bursar_dashboard.js') + '\nconsole.log(JSON.stringify(charts));\n'
+        result = subprocess.run(['node'], input=script, capture_output=True, text=True, timeout=30)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        daily, methods = json.loads(result.stdout)
+        self.assertEqual((daily['canvas'], daily['config']['type']), ('dailyChart', 'line'))
+        self.assertEqual(daily['config']['data']['labels'], ['Mon', 'Tue'])
+        self.assertEqual(daily['config']['data']['datasets'][0]['data'], [1500, 2500])
+        self.assertEqual((methods['canvas'], methods['config']['type']), ('methodChart', 'doughnut'))
+        self.assertEqual(methods['config']['options']['plugins']['legend'], {'position': 'bottom'})
+
+    def test_missing_vendored_files_are_downloaded_once(self):
+        with TemporaryDirectory() as tmp:
+            with mock.patch('school.assets.urlopen', return_value=BytesIO(b'/*! lib */')) as urlopen:
+                self.assertEqual(fetch_vendor_files(tmp), ['vendor/chart.umd.min.js'])
+                self.assertEqual(fetch_vendor_files(tmp), [])
+            urlopen.assert_called_once()
+            self.assertEqual((Path(tmp) / 'vendor' / 'chart.umd.min.js').read_bytes(), b'/*! lib */')
+
+    @override_settings(DEBUG=False)
+    def test_asset_bundle_links_the_built_bundle_once_it_exists(self):
+        template = Template("{% load assets %}{% asset_bundle 'bursar_dashboard.js' %}")
+        with TemporaryDirectory() as tmp, self.settings(ASSET_BUILD_DIR=tmp):
+            self.assertHTMLEqual(template.render(Context()),
+                                 '<script src="/static/vendor/chart.umd.min.js"></script>'
+                                 '<script src="/static/js/bursar_dashboard.js"></script>')
+            build_bundles(tmp)
+            bundle_built.cache_clear()
+            self.assertHTMLEqual(template.render(Context()),
+                                 '<script src="/static/bundles/bursar_dashboard.js"></script>')
+
+    def test_asset_bundle_links_the_sources_in_debug(self):
+        with TemporaryDirectory() as tmp, self.settings(DEBUG=True, ASSET_BUILD_DIR=tmp):
+            build_bundles(tmp)
+            html = Template("{% load assets %}{% asset_bundle 'site.css' %}").render(Context())
+        self.assertHTMLEqual(html, '<link rel="stylesheet" href="/static/css/style.css">')
+
+
+@skipUnless(connection.vendor == 'sqlite' and settings.SQLITE_TUNING, 'SQLite tuning is disabled')
+class SQLiteTuningTests(TestCase):
+    """Every new SQLite connection gets the tuned PRAGMAs and IMMEDIATE transactions."""
+
+    def setUp(self):
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = str(Path(tmp.name) / 'tuning.sqlite3')
+
+    def open_connection(self, **options):
+        settings_dict = {**connection.settings_dict, 'NAME': self.path}
+        settings_dict['OPTIONS'] = {**settings_dict['OPTIONS'], **options}
+        new = type(connections['default'])(settings_dict)
+        self.addCleanup(new.close)
+        return new
+
+    def pragma(self, conn, name):
+        with conn.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied_on_connection(self):
+        conn = self.open_connection()
+        levels = {'OFF': 0, 'NORMAL': 1, 'FULL': 2, 'EXTRA': 3}
+        self.assertEqual(self.pragma(conn, 'synchronous'), levels[settings.SQLITE_PRAGMAS['synchronous'].upper()])
+        self.assertEqual(self.pragma(conn, 'cache_size'), settings.SQLITE_PRAGMAS['cache_size'])
+        self.assertEqual(self.pragma(conn, 'mmap_size'), settings.SQLITE_PRAGMAS['mmap_size'])
+        self.assertEqual(self.pragma(conn, 'busy_timeout'), connection.settings_dict['OPTIONS']['timeout'] * 1000)
+
+    def test_transactions_take_the_write_lock_when_they_begin(self):
+        writer = self.open_connection()
+        with writer.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (n INTEGER)')
+        other = self.open_connection(timeout=0)
+        # Starts the transaction the way atomic() does; nothing written yet
+        writer.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+        try:
+            with self.assertRaisesMessage(OperationalError, 'database is locked'):
+                with other.cursor() as cursor:
+                    cursor.execute('INSERT INTO t VALUES (1)')
+        finally:
+            writer.rollback()
+            writer.set_autocommit(True)
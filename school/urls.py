@@ -1,6 +1,4 @@
 from django.urls import path
-from django.conf import settings
-from django.conf.urls.static import static
 from . import views
 
 urlpatterns = [
@@ -21,11 +19,18 @@ urlpatterns = [
 
     # Admin (app) URLs — use a non-conflicting prefix to avoid Django admin site clash
     path('portal/admin/dashboard/', views.admin_dashboard, name='admin_dashboard'),
+    path('portal/admin/cache-stats/', views.cache_stats, name='cache_stats'),
     path('portal/admin/students/', views.manage_students, name='manage_students'),
     path('portal/admin/student/<int:student_id>/', views.admin_view_student, name='admin_view_student'),
     path('portal/admin/teachers/', views.manage_teachers, name='manage_teachers'),
+    path('portal/admin/import/', views.bulk_import, name='bulk_import'),
+    path('portal/admin/photos/upload/', views.bulk_photo_upload, name='bulk_photo_upload'),
+    path('portal/admin/student/<int:student_id>/trajectory/', views.student_trajectory, name='student_trajectory'),
+    path('portal/admin/class/<int:class_id>/trajectory/', views.class_trajectory, name='class_trajectory'),
     path('portal/admin/teacher/<int:teacher_id>/', views.admin_view_teacher, name='admin_view_teacher'),
     path('portal/search/students/', views.search_students, name='search_students'),
+    path('portal/search/', views.global_search, name='global_search'),
+    path('portal/stats/subject/<int:subject_id>/class/<int:class_id>/term/<int:term_id>/', views.subject_statistics, name='subject_statistics'),
 
     # ID Cards (Admin)
     path('portal/admin/id-cards/', views.admin_id_cards, name='admin_id_cards'),
@@ -37,6 +42,8 @@ urlpatterns = [
     # Promotion URLs
     path('portal/admin/promotion/', views.promotion_view, name='promotion'),
     path('portal/admin/promotion/report/', views.promotion_report, name='promotion_report'),
+    path('portal/admin/promotion/run/<int:run_id>/status/', views.promotion_run_status, name='promotion_run_status'),
+    path('portal/admin/promotion/run/<int:run_id>/rollback/', views.promotion_rollback, name='promotion_rollback'),
     
     # Fee Management URLs
     path('portal/admin/fees/', views.manage_fees, name='manage_fees'),
@@ -64,7 +71,3 @@ urlpatterns = [
     path('student/fees/', views.student_my_fees, name='student_my_fees'),
     path('report/pdf/<int:student_id>/<int:term_id>/', views.generate_pdf_report, name='generate_pdf_report'),
 ]
-
-# Serve media files in development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
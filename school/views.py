@@ -1,11 +1,13 @@
 import zipfile
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.db.models import Avg, Sum, Count, Q
+from django.db.models import Avg, Sum, Count, Q, Prefetch, prefetch_related_objects
 from django.utils import timezone
-from django.http import HttpResponse, JsonResponse
+from django.utils.functional import SimpleLazyObject
+from django.http import Http404, HttpResponse, JsonResponse
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet
@@ -16,8 +18,29 @@ from io import BytesIO
 import csv
 import json
 from decimal import Decimal, InvalidOperation
-from .models import User, Student, Teacher, Class, Subject, Term, Mark, Comment, ClassFee, FeePayment, AcademicYear, Enrollment
-from django.db import connection
+from .models import User, Student, Teacher, Class, Subject, Term, Mark, Comment, ClassFee, FeePayment, AcademicYear, Enrollment, PromotionRun
+from .analytics import (
+    build_trajectories, empty_trajectory, get_admin_dashboard_snapshot, get_subject_statistics, trajectory_rows,
+)
+from . import search as student_search
+from . import academic_calendar
+from . import cache as app_cache
+from . import conditional
+from . import fulltext
+from . import sequences as id_sequences
+from .middleware import get_role_profile
+from .importing import IMPORT_COLUMNS, CSVImportError, parse_import, pop_upload, run_import, stash_upload
+from .photos import ingest_photo_zip
+from .storage import is_hashed_name
+from .pagination import keyset_paginate, page_links, parse_sort
+from .promotion import (
+    STREAM_POLICIES, RollbackError, build_promotion_plan, fail_stale_runs, rollback_promotion,
+    start_promotion_run,
+)
+from django.db import IntegrityError, connection, transaction
+from django.conf import settings
+from django.core.cache import caches
+from django.views.static import serve as static_serve
 
 # --- Helpers to repair invalid decimal data in marks ---
 def _as_decimal_safe(v):
@@ -134,6 +157,7 @@ def batch_student_reports_zip(request, class_id, term_id):
     return response
 
 @login_required
+@conditional.download(conditional.class_report)
 def class_pdf_report(request, class_id, term_id):
     class_obj = get_object_or_404(Class, id=class_id)
     term = get_object_or_404(Term, id=term_id)
@@ -204,6 +228,13 @@ def is_student(user):
 def is_bursar(user):
     return user.user_type == 'bursar'
 
+def _role_profile_or_404(request, model):
+    """The Student/Teacher loaded once per request by RoleProfileMiddleware."""
+    profile = get_role_profile(request)
+    if not isinstance(profile, model):
+        raise Http404(f'No {model._meta.verbose_name} profile for this account.')
+    return profile
+
 @login_required
 @user_passes_test(is_admin)
 def admin_view_student(request, student_id):
@@ -224,6 +255,53 @@ def admin_view_student(request, student_id):
     }
     return render(request, 'admin/student_detail.html', context)
 
+def _trajectories_for(marks, where_clause, params):
+    try:
+        return build_trajectories(trajectory_rows(marks))
+    except InvalidOperation:
+        _cleanup_marks(where_clause, params)
+        return build_trajectories(trajectory_rows(marks))
+
+@login_required
+@user_passes_test(is_admin)
+def student_trajectory(request, student_id):
+    """Per-term and per-year averages, subject trends and grade movement for one student."""
+    student = get_object_or_404(Student.objects.select_related('user', 'student_class'), id=student_id)
+    trajectories = _trajectories_for(Mark.objects.filter(student=student), "student_id=%s", [student.id])
+    return JsonResponse({
+        'student': {
+            'id': student.id,
+            'name': student.user.get_full_name(),
+            'admission': student.admission_number,
+            'class': student.student_class.name if student.student_class else '-',
+        },
+        **trajectories.get(student.id, empty_trajectory()),
+    })
+
+@login_required
+@user_passes_test(is_admin)
+def class_trajectory(request, class_id):
+    """Trajectories for every student currently placed in a class, from one grouped query."""
+    class_obj = get_object_or_404(Class, id=class_id)
+    roster = Student.objects.filter(student_class=class_obj).values(
+        'id', 'admission_number', 'user__first_name', 'user__last_name'
+    ).order_by('user__first_name', 'user__last_name')
+    trajectories = _trajectories_for(
+        Mark.objects.filter(student__student_class=class_obj),
+        "student_id IN (SELECT id FROM students WHERE student_class_id=%s)", [class_obj.id],
+    )
+    results = []
+    for s in roster:
+        results.append({
+            'student': {
+                'id': s['id'],
+                'name': f"{s['user__first_name']} {s['user__last_name']}".strip(),
+                'admission': s['admission_number'],
+            },
+            **trajectories.get(s['id'], empty_trajectory()),
+        })
+    return JsonResponse({'class': class_obj.name, 'results': results})
+
 @login_required
 @user_passes_test(is_admin)
 def admin_view_teacher(request, teacher_id):
@@ -235,16 +313,15 @@ def admin_view_teacher(request, teacher_id):
 
 @login_required
 @user_passes_test(lambda u: is_admin(u) or is_teacher(u) or is_bursar(u))
+@conditional.download(conditional.school_data('search_students'))
 def search_students(request):
-    """Return JSON list of students filtered by query q (name or admission)."""
+    """Return JSON list of students matching query q (name or admission), ranked
+    exact admission number first, then prefix matches, then fuzzy matches."""
     q = request.GET.get('q', '').strip()
-    qs = Student.objects.select_related('user', 'student_class')
     if q:
-        qs = qs.filter(
-            Q(user__first_name__icontains=q) | Q(user__last_name__icontains=q) |
-            Q(admission_number__icontains=q)
-        )
-    qs = qs.order_by('user__first_name')[:10]
+        qs = student_search.search_students(q, limit=10)
+    else:
+        qs = Student.objects.select_related('user', 'student_class').order_by('user__first_name')[:10]
     results = []
     for s in qs:
         results.append({
@@ -256,6 +333,105 @@ def search_students(request):
         })
     return JsonResponse({'results': results})
 
+def _search_types_for(user):
+    if is_admin(user):
+        return fulltext.DOC_TYPES
+    if is_bursar(user):
+        return ('student', 'guardian', 'payment')
+    # Guardian documents carry phone numbers, which teachers never saw
+    return ('student',)
+
+def _search_result_url(user, doc_type, object_id):
+    if doc_type == 'payment':
+        return reverse('generate_fee_receipt', args=[object_id])
+    if doc_type == 'teacher':
+        return reverse('admin_view_teacher', args=[object_id])
+    # Student and guardian documents both point at the student
+    if is_admin(user):
+        return reverse('admin_view_student', args=[object_id])
+    if is_bursar(user):
+        return reverse('student_fee_detail', args=[object_id])
+    return ''
+
+@login_required
+@user_passes_test(lambda u: is_admin(u) or is_teacher(u) or is_bursar(u))
+def global_search(request):
+    """Unified search across students, guardians, teachers and payments.
+
+    ``types`` (comma separated) narrows the result types, ``limit`` sets the
+    per-type limit and ``limit_<type>`` overrides it for one type. Types the
+    user's role may not see are dropped.
+    """
+    q = request.GET.get('q', '').strip()
+    allowed = _search_types_for(request.user)
+    wanted = [t for t in request.GET.get('types', '').split(',') if t in allowed] or list(allowed)
+
+    def _limit(value, default):
+        try:
+            return max(0, min(int(value), fulltext.MAX_LIMIT))
+        except (TypeError, ValueError):
+            return default
+
+    default_limit = _limit(request.GET.get('limit'), fulltext.DEFAULT_LIMIT)
+    limits = {t: _limit(request.GET.get(f'limit_{t}'), default_limit) for t in wanted}
+    results = fulltext.search(q, limits)
+    for doc_type, items in results.items():
+        for item in items:
+            item['type'] = doc_type
+            item['url'] = _search_result_url(request.user, doc_type, item['id'])
+    return JsonResponse({'query': q, 'results': results})
+
+@login_required
+@user_passes_test(lambda u: is_admin(u) or is_teacher(u))
+def subject_statistics(request, subject_id, class_id, term_id):
+    """Return distribution metrics (mean, median, spread, grades, pass rate) for
+    one subject in a class and term as JSON."""
+    subject = get_object_or_404(Subject, id=subject_id)
+    class_obj = get_object_or_404(Class, id=class_id)
+    term = get_object_or_404(Term, id=term_id)
+    try:
+        stats = get_subject_statistics(subject.id, class_obj.id, term.id)
+    except InvalidOperation:
+        _cleanup_marks("subject_id=%s AND class_assigned_id=%s AND term_id=%s", [subject.id, class_obj.id, term.id])
+        stats = get_subject_statistics(subject.id, class_obj.id, term.id)
+    return JsonResponse({
+        'subject': subject.name,
+        'class': class_obj.name,
+        'term': str(term),
+        **stats,
+    })
+
+def _may_view_media(request, path):
+    """Whether ``request.user`` may see the uploaded file at ``path``.
+
+    Admins see every file. Teachers and bursars see student photos (student
+    search shows them) and their own; students see only their own photo.
+    """
+    user = request.user
+    if is_admin(user):
+        return True
+    profile = get_role_profile(request)
+    if profile is not None and profile.photo and profile.photo.name == path:
+        return True
+    if is_teacher(user) or is_bursar(user):
+        return Student.objects.filter(photo=path).exists()
+    return False
+
+@login_required
+def serve_media(request, path):
+    """Serve an uploaded file to a user allowed to see it. Content-hashed
+    names never change content, so they may be cached for a year without
+    revalidation, but only by the browser: the files are photos of students
+    and staff, so shared caches must not keep them."""
+    if not _may_view_media(request, path):
+        raise Http404('No such file')
+    response = static_serve(request, path, document_root=settings.MEDIA_ROOT)
+    if is_hashed_name(path):
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'private, max-age=3600'
+    return response
+
 # Login View
 def login_view(request, user_type=None):
     """Generic login view that can be used for admin/teacher/student logins.
@@ -333,8 +509,9 @@ def logout_view(request):
 @login_required
 def my_profile(request):
     user = request.user
-    student = getattr(user, 'student', None)
-    teacher = getattr(user, 'teacher', None)
+    profile = get_role_profile(request)
+    student = profile if isinstance(profile, Student) else None
+    teacher = profile if isinstance(profile, Teacher) else None
     context = {
         'user_obj': user,
         'student': student,
@@ -355,13 +532,11 @@ def account_settings(request):
         user.save()
         # Optional avatar update for student/teacher
         photo_file = request.FILES.get('photo')
+        profile = get_role_profile(request)
         try:
-            if photo_file and hasattr(user, 'student') and user.student:
-                user.student.photo = photo_file
-                user.student.save(update_fields=['photo'])
-            elif photo_file and hasattr(user, 'teacher') and user.teacher:
-                user.teacher.photo = photo_file
-                user.teacher.save(update_fields=['photo'])
+            if photo_file and profile is not None:
+                profile.photo = photo_file
+                profile.save(update_fields=['photo'])
         except Exception:
             pass
         messages.success(request, 'Settings updated successfully.')
@@ -373,126 +548,121 @@ def account_settings(request):
 @login_required
 @user_passes_test(is_admin)
 def admin_dashboard(request):
-    # Get active term for current statistics
-    active_term = Term.objects.filter(is_active=True).first()
-    
-    # Basic statistics
-    student_count = Student.objects.count()
-    teacher_count = Teacher.objects.count()
-    class_count = Class.objects.count()
-    subject_count = Subject.objects.count()
-    
-    # Performance statistics for active term
-    if active_term:
-        class_averages = Mark.objects.filter(term=active_term).values(
-            'class_assigned__name'
-        ).annotate(
-            average_score=Avg('total_marks'),
-            student_count=Count('student', distinct=True)
-        )
-        
-        subject_averages = Mark.objects.filter(term=active_term).values(
-            'subject__name'
-        ).annotate(
-            average_score=Avg('total_marks'),
-            student_count=Count('student', distinct=True)
-        )
-        
-        top_performers = Student.objects.filter(
-            mark__term=active_term
-        ).annotate(
-            average_score=Avg('mark__total_marks')
-        ).order_by('-average_score')[:5]
-    else:
-        class_averages = []
-        subject_averages = []
-        top_performers = []
-    
-    classes = Class.objects.all()
-    terms = Term.objects.all()
-    subjects = Subject.objects.all()
-    context = {
-        'total_students': student_count,
-        'total_teachers': teacher_count,
-        'total_classes': class_count,
-        'total_subjects': subject_count,
-        'active_term': active_term,
-        'class_averages': class_averages,
-        'subject_averages': subject_averages,
-        'top_performers': top_performers,
-        'classes': classes,
-        'terms': terms,
-        'subjects': subjects,
-    }
+    # Counts, active-term averages and the report pickers come from a cached
+    # snapshot that is dropped whenever one of the underlying models changes
+    context = get_admin_dashboard_snapshot()
     return render(request, 'admin/dashboard.html', context)
 
+@login_required
+@user_passes_test(is_admin)
+def cache_stats(request):
+    """Per-namespace cache hit rates as JSON; POST resets the counters."""
+    if request.method == 'POST':
+        for alias in settings.CACHES:
+            backend = caches[alias]
+            if hasattr(backend, 'reset_stats'):
+                backend.reset_stats()
+    return JsonResponse({'caches': app_cache.cache_stats()})
+
+# Sortable columns of the management lists (?sort=key or ?sort=-key)
+STUDENT_SORTS = {'admission': 'admission_number', 'name': 'user__first_name'}
+TEACHER_SORTS = {'employee_id': 'employee_id', 'name': 'user__first_name'}
+
+def _id_param(params, name):
+    """The ``name`` query parameter if it is a numeric id, else '' (the filter is ignored)."""
+    value = params.get(name, '')
+    return value if value.isascii() and value.isdigit() else ''
+
 @login_required
 @user_passes_test(is_admin)
 def manage_students(request):
-    students = Student.objects.select_related('user', 'student_class').all()
-    classes = Class.objects.all()
+    classes = Class.objects.only('id', 'name')
+    # Only the columns the table shows
+    students = Student.objects.select_related('user', 'student_class').only(
+        'id', 'admission_number', 'photo', 'guardian_name', 'is_graduated', 'user', 'student_class',
+        'user__first_name', 'user__last_name', 'user__email', 'student_class__name',
+    )
     # Apply filters (GET only)
-    selected_class_id = request.GET.get('class_id')
+    selected_class_id = _id_param(request.GET, 'class_id')
     if selected_class_id:
         students = students.filter(student_class_id=selected_class_id)
+    graduation_status = request.GET.get('status', '')
+    if graduation_status == 'current':
+        students = students.filter(is_graduated=False)
+    elif graduation_status == 'graduated':
+        students = students.filter(is_graduated=True)
     
     if request.method == 'POST':
         # Handle student creation/update
         action = request.POST.get('action')
         if action == 'add':
-            # Create user first
-            user = User.objects.create_user(
-                username=request.POST.get('username'),
-                email=request.POST.get('email'),
-                password=request.POST.get('password'),
-                first_name=request.POST.get('first_name'),
-                last_name=request.POST.get('last_name'),
-                user_type='student'
-            )
-            # Auto-generate admission number if not provided
-            admission_number = request.POST.get('admission_number')
-            if not admission_number:
-                # Extract numeric part from existing ST numbers
-                existing = Student.objects.filter(admission_number__startswith='ST').order_by('admission_number').last()
-                if existing and existing.admission_number.startswith('ST'):
-                    try:
-                        last_num = int(existing.admission_number[2:])
-                        next_id = last_num + 1
-                    except ValueError:
-                        next_id = 1
-                else:
-                    next_id = 1
-                admission_number = f"ST{next_id:04d}"
-            Student.objects.create(
-                user=user,
-                admission_number=admission_number,
-                student_class_id=request.POST.get('class_id'),
-                date_of_birth=request.POST.get('date_of_birth'),
-                guardian_name=request.POST.get('guardian_name'),
-                guardian_phone=request.POST.get('guardian_phone'),
-                photo=request.FILES.get('photo')
-            )
+            # Auto-generate admission number if not provided; a typed one moves
+            # the sequence past it so later generated numbers cannot collide
+            admission_number = request.POST.get('admission_number', '').strip()
+            try:
+                with transaction.atomic():
+                    user = User.objects.create_user(
+                        username=request.POST.get('username'),
+                        email=request.POST.get('email'),
+                        password=request.POST.get('password'),
+                        first_name=request.POST.get('first_name'),
+                        last_name=request.POST.get('last_name'),
+                        user_type='student'
+                    )
+                    if admission_number:
+                        id_sequences.advance_past('student', [admission_number])
+                    else:
+                        admission_number = id_sequences.next_id('student')
+                    Student.objects.create(
+                        user=user,
+                        admission_number=admission_number,
+                        student_class_id=request.POST.get('class_id'),
+                        date_of_birth=request.POST.get('date_of_birth'),
+                        guardian_name=request.POST.get('guardian_name'),
+                        guardian_phone=request.POST.get('guardian_phone'),
+                        photo=request.FILES.get('photo')
+                    )
+            except IntegrityError:
+                messages.error(request, 'Student not added: the username or admission number is already in use.')
+                return redirect('manage_students')
             messages.success(request, f'Student added successfully. Admission Number: {admission_number}')
         
         return redirect('manage_students')
     
-    context = {'students': students, 'classes': classes, 'selected_class_id': selected_class_id}
+    sort_key, descending = parse_sort(request.GET, STUDENT_SORTS, 'admission')
+    page = keyset_paginate(
+        students, STUDENT_SORTS[sort_key], descending,
+        after=request.GET.get('after'), before=request.GET.get('before'),
+    )
+    context = {
+        'students': page,
+        'classes': classes,
+        'selected_class_id': selected_class_id,
+        'graduation_status': graduation_status,
+        'id_pattern': id_sequences.id_pattern('student'),
+        # Exact totals only for the unfiltered list, where the cached snapshot has them
+        'total_count': None if selected_class_id or graduation_status else get_admin_dashboard_snapshot()['total_students'],
+        **page_links(request.GET, page, STUDENT_SORTS, sort_key, descending),
+    }
     return render(request, 'admin/students.html', context)
 
 @login_required
 @user_passes_test(is_admin)
 def manage_teachers(request):
-    teachers = Teacher.objects.select_related('user').prefetch_related('subjects', 'classes').all()
-    subjects = Subject.objects.all()
-    classes = Class.objects.all()
-    # Apply filters
-    selected_subject_id = request.GET.get('subject_id')
-    selected_class_id = request.GET.get('class_id')
+    teachers = Teacher.objects.select_related('user').only(
+        'id', 'employee_id', 'photo', 'user', 'user__first_name', 'user__last_name', 'user__email',
+    )
+    subjects = Subject.objects.only('id', 'name')
+    classes = Class.objects.only('id', 'name')
+    # Apply filters; subqueries keep one row per teacher without DISTINCT
+    selected_subject_id = _id_param(request.GET, 'subject_id')
+    selected_class_id = _id_param(request.GET, 'class_id')
     if selected_subject_id:
-        teachers = teachers.filter(subjects__id=selected_subject_id)
+        teachers = teachers.filter(id__in=Teacher.subjects.through.objects.filter(
+            subject_id=selected_subject_id).values('teacher_id'))
     if selected_class_id:
-        teachers = teachers.filter(classes__id=selected_class_id)
-    teachers = teachers.distinct()
+        teachers = teachers.filter(id__in=Teacher.classes.through.objects.filter(
+            class_id=selected_class_id).values('teacher_id'))
     
     if request.method == 'POST':
         action = request.POST.get('action')
@@ -502,123 +672,220 @@ def manage_teachers(request):
             if not first_name or not last_name:
                 messages.error(request, 'First name and last name are required.')
                 return redirect('manage_teachers')
-            user = User.objects.create_user(
-                username=request.POST.get('username'),
-                email=request.POST.get('email'),
-                password=request.POST.get('password'),
-                first_name=first_name,
-                last_name=last_name,
-                user_type='teacher'
-            )
-            # Auto-generate employee ID if not provided
-            employee_id = request.POST.get('employee_id')
-            if not employee_id:
-                # Extract numeric part from existing TC numbers
-                existing = Teacher.objects.filter(employee_id__startswith='TC').order_by('employee_id').last()
-                if existing and existing.employee_id.startswith('TC'):
-                    try:
-                        last_num = int(existing.employee_id[2:])
-                        next_id = last_num + 1
-                    except ValueError:
-                        next_id = 1
-                else:
-                    next_id = 1
-                employee_id = f"TC{next_id:04d}"
-            teacher = Teacher.objects.create(
-                user=user,
-                employee_id=employee_id,
-                photo=request.FILES.get('photo')
-            )
-            # Add subjects and classes
-            subject_ids = request.POST.getlist('subjects')
-            class_ids = request.POST.getlist('classes')
-            teacher.subjects.set(subject_ids)
-            teacher.classes.set(class_ids)
+            # Auto-generate employee ID if not provided; a typed one moves the
+            # sequence past it
+            employee_id = request.POST.get('employee_id', '').strip()
+            try:
+                with transaction.atomic():
+                    user = User.objects.create_user(
+                        username=request.POST.get('username'),
+                        email=request.POST.get('email'),
+                        password=request.POST.get('password'),
+                        first_name=first_name,
+                        last_name=last_name,
+                        user_type='teacher'
+                    )
+                    if employee_id:
+                        id_sequences.advance_past('teacher', [employee_id])
+                    else:
+                        employee_id = id_sequences.next_id('teacher')
+                    teacher = Teacher.objects.create(
+                        user=user,
+                        employee_id=employee_id,
+                        photo=request.FILES.get('photo')
+                    )
+                    # Add subjects and classes
+                    subject_ids = request.POST.getlist('subjects')
+                    class_ids = request.POST.getlist('classes')
+                    teacher.subjects.set(subject_ids)
+                    teacher.classes.set(class_ids)
+            except IntegrityError:
+                messages.error(request, 'Teacher not added: the username or employee ID is already in use.')
+                return redirect('manage_teachers')
             messages.success(request, f'Teacher added successfully. Employee ID: {employee_id}')
         
         return redirect('manage_teachers')
     
+    sort_key, descending = parse_sort(request.GET, TEACHER_SORTS, 'employee_id')
+    page = keyset_paginate(
+        teachers, TEACHER_SORTS[sort_key], descending,
+        after=request.GET.get('after'), before=request.GET.get('before'),
+    )
+    # Subjects and classes for the teachers on this page only
+    prefetch_related_objects(
+        page.items,
+        Prefetch('subjects', queryset=Subject.objects.only('id', 'name')),
+        Prefetch('classes', queryset=Class.objects.only('id', 'name')),
+    )
     context = {
-        'teachers': teachers,
+        'teachers': page,
         'subjects': subjects,
         'classes': classes,
         'selected_subject_id': selected_subject_id,
         'selected_class_id': selected_class_id,
+        'id_pattern': id_sequences.id_pattern('teacher'),
+        'total_count': None if selected_subject_id or selected_class_id else get_admin_dashboard_snapshot()['total_teachers'],
+        **page_links(request.GET, page, TEACHER_SORTS, sort_key, descending),
     }
     return render(request, 'admin/teachers.html', context)
 
-# Teacher Views
 @login_required
-@user_passes_test(is_teacher)
-def teacher_dashboard(request):
-    teacher = Teacher.objects.get(user=request.user)
-    active_term = Term.objects.filter(is_active=True).first()
-    
-    # Get teacher's classes and subjects
-    teacher_classes = teacher.classes.all()
-    teacher_subjects = teacher.subjects.all()
-    
+@user_passes_test(is_admin)
+def bulk_import(request):
+    """CSV onboarding of students or teachers: upload and preview per-row
+    errors first, then import the valid rows in bulk."""
+    kind = request.POST.get('kind') or request.GET.get('kind') or 'student'
+    if kind not in IMPORT_COLUMNS:
+        kind = 'student'
+    context = {'kind': kind, 'columns': IMPORT_COLUMNS[kind], 'max_rows': settings.IMPORT_MAX_WEB_ROWS}
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if action == 'preview':
+            upload = request.FILES.get('file')
+            if not upload:
+                messages.error(request, 'Choose a CSV file to upload.')
+                return redirect(f"{reverse('bulk_import')}?kind={kind}")
+            try:
+                content = upload.read().decode('utf-8-sig')
+                rows = parse_import(kind, content, max_rows=settings.IMPORT_MAX_WEB_ROWS)
+            except UnicodeDecodeError:
+                messages.error(request, 'The file must be a UTF-8 encoded CSV.')
+            except CSVImportError as exc:
+                messages.error(request, f'{exc}. Larger files can be imported with manage.py import_people.')
+            else:
+                # Kept until the admin confirms; rows are re-validated on import
+                request.session['bulk_import'] = {'kind': kind, 'key': stash_upload(content)}
+                context.update({
+                    'rows': rows,
+                    'valid_count': sum(1 for r in rows if not r['errors']),
+                    'error_count': sum(1 for r in rows if r['errors']),
+                })
+        elif action == 'import':
+            pending = request.session.pop('bulk_import', None)
+            content = pop_upload(pending.get('key')) if pending else None
+            if content is None:
+                messages.error(request, 'Nothing to import. Upload the file again.')
+                return redirect(f"{reverse('bulk_import')}?kind={kind}")
+            kind = pending['kind']
+            rows = parse_import(kind, content, max_rows=settings.IMPORT_MAX_WEB_ROWS)
+            try:
+                created = run_import(kind, rows)
+            except IntegrityError:
+                messages.error(request, 'Some IDs or usernames were taken while importing; nothing was saved. '
+                                        'Upload the file again.')
+                return redirect(f"{reverse('bulk_import')}?kind={kind}")
+            failed = [r for r in rows if r['errors']]
+            messages.success(request, f'Imported {len(created)} {kind}(s). {len(failed)} row(s) skipped.')
+            context.update({
+                'kind': kind, 'columns': IMPORT_COLUMNS[kind], 'created': created, 'failed': failed,
+                'has_generated_passwords': any(c['password'] for c in created),
+            })
+    return render(request, 'admin/bulk_import.html', context)
+
+@login_required
+@user_passes_test(is_admin)
+def bulk_photo_upload(request):
+    """Attach photos in bulk from a ZIP named by admission/employee number."""
+    report = None
+    if request.method == 'POST':
+        upload = request.FILES.get('archive')
+        if not upload:
+            messages.error(request, 'Choose a ZIP file to upload.')
+            return redirect('bulk_photo_upload')
+        try:
+            report = ingest_photo_zip(upload)
+        except zipfile.BadZipFile:
+            messages.error(request, 'The file is not a valid ZIP archive.')
+        else:
+            messages.success(request, f"Updated {report['students']} student and {report['teachers']} teacher photo(s).")
+    return render(request, 'admin/photo_upload.html', {'report': report})
+
+# Teacher Views
+def _teacher_term_figures(teacher, teacher_classes, active_term):
+    """Class and subject statistics and recent marks for the teacher dashboard."""
     # Get performance statistics for each class and subject taught by this teacher
     class_statistics = []
     if active_term:
-        for class_obj in teacher_classes:
-            class_stats = Mark.objects.filter(
-                teacher=teacher,
-                class_assigned=class_obj,
-                term=active_term
-            ).aggregate(
+        teacher_marks = Mark.objects.filter(teacher=teacher, term=active_term)
+
+        # One grouped query for every class, then matched up in Python
+        class_rows = {
+            row['class_assigned_id']: row
+            for row in teacher_marks.values('class_assigned_id').annotate(
                 avg_score=Avg('total_marks'),
                 total_students=Count('student', distinct=True),
                 assignments_pending=Count('id', filter=Q(assignment_marks=0)),
                 exams_pending=Count('id', filter=Q(exam_marks=0))
             )
-            class_stats['class'] = class_obj
-            class_statistics.append(class_stats)
+        }
+        for class_obj in teacher_classes:
+            row = class_rows.get(class_obj.id, {})
+            class_statistics.append({
+                'avg_score': row.get('avg_score'),
+                'total_students': row.get('total_students', 0),
+                'assignments_pending': row.get('assignments_pending', 0),
+                'exams_pending': row.get('exams_pending', 0),
+                'class': class_obj,
+            })
             
         # Get subject-wise performance
-        subject_statistics = Mark.objects.filter(
-            teacher=teacher,
-            term=active_term
-        ).values(
+        subject_statistics = list(teacher_marks.values(
             'subject__name'
         ).annotate(
             avg_score=Avg('total_marks'),
             total_students=Count('student', distinct=True),
             assignments_complete=Count('id', filter=~Q(assignment_marks=0)),
             exams_complete=Count('id', filter=~Q(exam_marks=0))
-        )
+        ))
         
         # Recent activities (marks entered in last 7 days)
-        recent_activities = Mark.objects.filter(
-            teacher=teacher,
-            term=active_term,
+        recent_activities = list(teacher_marks.filter(
             updated_at__gte=timezone.now() - timezone.timedelta(days=7)
-        ).select_related('student', 'subject').order_by('-updated_at')[:10]
+        ).select_related('student__user', 'subject').order_by('-updated_at')[:10])
     else:
         subject_statistics = []
         recent_activities = []
     
-    terms = Term.objects.all()
+    return {
+        'class_statistics': class_statistics,
+        'subject_statistics': subject_statistics,
+        'recent_activities': recent_activities,
+    }
+
+@login_required
+@user_passes_test(is_teacher)
+def teacher_dashboard(request):
+    teacher = _role_profile_or_404(request, Teacher)
+    active_term = academic_calendar.active_term()
+    
+    # Get teacher's classes and subjects (already prefetched)
+    teacher_classes = teacher.classes.all()
+    teacher_subjects = teacher.subjects.all()
+    
+    # Marks-derived figures are only computed when the cached fragment
+    # (varied on the term's marks version) has to be re-rendered
+    figures = SimpleLazyObject(lambda: _teacher_term_figures(teacher, teacher_classes, active_term))
+
+    terms = academic_calendar.all_terms()
     context = {
         'teacher': teacher,
         'classes': teacher_classes,
         'subjects': teacher_subjects,
         'terms': terms,
         'active_term': active_term,
-        'class_statistics': class_statistics,
-        'subject_statistics': subject_statistics,
-        'recent_activities': recent_activities,
+        'figures': figures,
+        'today': timezone.now().date(),
     }
     return render(request, 'teacher/dashboard.html', context)
 
 @login_required
 @user_passes_test(is_teacher)
 def enter_marks(request):
-    teacher = Teacher.objects.get(user=request.user)
+    teacher = _role_profile_or_404(request, Teacher)
     classes = teacher.classes.all()
     subjects = teacher.subjects.all()
-    terms = Term.objects.all()
-    active_term = Term.objects.filter(is_active=True).first()
+    terms = academic_calendar.all_terms()
+    active_term = academic_calendar.active_term()
 
     if request.method == 'POST':
         student_id = request.POST.get('student_id')
@@ -672,9 +939,9 @@ def enter_marks(request):
 @login_required
 @user_passes_test(is_teacher)
 def add_comments(request):
-    teacher = Teacher.objects.get(user=request.user)
+    teacher = _role_profile_or_404(request, Teacher)
     classes = teacher.classes.all()
-    terms = Term.objects.all()
+    terms = academic_calendar.all_terms()
     
     if request.method == 'POST':
         student_id = request.POST.get('student_id')
@@ -707,8 +974,8 @@ def add_comments(request):
 @login_required
 @user_passes_test(is_student)
 def student_dashboard(request):
-    student = Student.objects.get(user=request.user)
-    active_term = Term.objects.filter(is_active=True).first()
+    student = _role_profile_or_404(request, Student)
+    active_term = academic_calendar.active_term()
     
     # Get student's current marks and performance
     current_marks = Mark.objects.filter(
@@ -780,7 +1047,7 @@ def student_dashboard(request):
 @login_required
 @user_passes_test(is_student)
 def view_report(request, term_id):
-    student = Student.objects.get(user=request.user)
+    student = _role_profile_or_404(request, Student)
     term = get_object_or_404(Term, id=term_id)
     
     marks = Mark.objects.filter(
@@ -807,10 +1074,10 @@ def view_report(request, term_id):
 @login_required
 @user_passes_test(is_student)
 def student_my_fees(request):
-    student = Student.objects.get(user=request.user)
-    terms = Term.objects.all()
+    student = _role_profile_or_404(request, Student)
+    terms = academic_calendar.all_terms()
     term_id = request.GET.get('term_id')
-    term = get_object_or_404(Term, id=term_id) if term_id else Term.objects.filter(is_active=True).first()
+    term = get_object_or_404(Term, id=term_id) if term_id else academic_calendar.active_term()
 
     if term:
         fees = ClassFee.objects.filter(
@@ -842,6 +1109,7 @@ def student_my_fees(request):
     return render(request, 'student/fees.html', context)
 
 @login_required
+@conditional.download(conditional.student_report)
 def generate_pdf_report(request, student_id, term_id):
     student = get_object_or_404(Student, id=student_id)
     term = get_object_or_404(Term, id=term_id)
@@ -934,8 +1202,8 @@ def generate_pdf_report(request, student_id, term_id):
 @user_passes_test(is_admin)
 def manage_fees(request):
     classes = Class.objects.all()
-    active_term = Term.objects.filter(is_active=True).first()
-    terms = Term.objects.all()
+    active_term = academic_calendar.active_term()
+    terms = academic_calendar.all_terms()
     
     if request.method == 'POST':
         class_id = request.POST.get('class_id')
@@ -967,7 +1235,7 @@ def manage_fees(request):
 @user_passes_test(is_admin)
 def class_fee_detail(request, class_id):
     class_obj = get_object_or_404(Class, id=class_id)
-    active_term = Term.objects.filter(is_active=True).first()
+    active_term = academic_calendar.active_term()
     
     fees = ClassFee.objects.filter(
         class_assigned=class_obj,
@@ -999,11 +1267,8 @@ def class_fee_detail(request, class_id):
     }
     return render(request, 'admin/class_fee_detail.html', context)
 
-@login_required
-@user_passes_test(lambda u: is_bursar(u) or is_admin(u))
-def bursar_dashboard(request):
-    active_term = Term.objects.filter(is_active=True).first()
-    
+def _bursar_term_figures(active_term):
+    """Collection totals, class statistics and chart series for the bursar dashboard."""
     if active_term:
         # Today's collections
         today = timezone.now().date()
@@ -1069,8 +1334,7 @@ def bursar_dashboard(request):
         daily_labels = []
         daily_values = []
     
-    context = {
-        'active_term': active_term,
+    return {
         'today_total': today_total,
         'week_total': week_total,
         'total_expected': total_expected,
@@ -1078,18 +1342,30 @@ def bursar_dashboard(request):
         'collection_rate': round(collection_rate, 2),
         'payment_methods': payment_methods,
         'class_stats': class_stats,
-        'recent_payments': FeePayment.objects.select_related('student', 'term').order_by('-payment_date')[:10],
-        'daily_labels': json.dumps(daily_labels),
-        'daily_values': json.dumps(daily_values),
-        'method_labels': json.dumps(method_labels),
-        'method_values': json.dumps(method_values),
+        'daily_chart': {'labels': daily_labels, 'values': daily_values},
+        'method_chart': {'labels': method_labels, 'values': method_values},
+    }
+
+@login_required
+@user_passes_test(lambda u: is_bursar(u) or is_admin(u))
+def bursar_dashboard(request):
+    active_term = academic_calendar.active_term()
+    # Only computed when the cached fragment (varied on the term's payment
+    # and fee versions) has to be re-rendered
+    figures = SimpleLazyObject(lambda: _bursar_term_figures(active_term))
+
+    context = {
+        'active_term': active_term,
+        'figures': figures,
+        'today': timezone.now().date(),
+        'recent_payments': FeePayment.objects.select_related('student__user', 'term').order_by('-payment_date')[:10],
     }
     return render(request, 'bursar/dashboard.html', context)
 
 @login_required
 @user_passes_test(lambda u: is_bursar(u) or is_admin(u))
 def manage_payments(request):
-    active_term = Term.objects.filter(is_active=True).first()
+    active_term = academic_calendar.active_term()
     prefill_student = None
     prefill_summary = None
     try:
@@ -1175,13 +1451,13 @@ def student_fee_detail(request, student_id):
     # Allow bursar/admin to view any student, but allow a student to view their own fees.
     student = get_object_or_404(Student, id=student_id)
     # Permission check
-    if not (is_bursar(request.user) or is_admin(request.user) or (is_student(request.user) and getattr(request.user, 'student', None) and request.user.student.id == student_id)):
+    if not (is_bursar(request.user) or is_admin(request.user) or (is_student(request.user) and getattr(get_role_profile(request), 'id', None) == student_id)):
         messages.error(request, 'You do not have permission to view this student\'s fees.')
         return redirect('login')
 
-    terms = Term.objects.all()
+    terms = academic_calendar.all_terms()
     term_id = request.GET.get('term_id')
-    term = get_object_or_404(Term, id=term_id) if term_id else Term.objects.filter(is_active=True).first()
+    term = get_object_or_404(Term, id=term_id) if term_id else academic_calendar.active_term()
     
     if term:
         fees = ClassFee.objects.filter(
@@ -1214,6 +1490,7 @@ def student_fee_detail(request, student_id):
 
 @login_required
 @user_passes_test(lambda u: is_bursar(u) or is_admin(u))
+@conditional.download(conditional.fee_receipt)
 def generate_fee_receipt(request, payment_id):
     payment = get_object_or_404(FeePayment, id=payment_id)
     
@@ -1410,10 +1687,11 @@ def promotion_view(request):
     """Run automatic student promotion for a source academic year into the next year.
     Creates/activates the target year, creates class shells for that year if missing,
     and generates Enrollment records for each student with status promoted/repeating/graduated.
+    Submitting with ``dry_run`` renders the full plan without writing anything.
     """
     # Determine default source year from latest active term or max class year
     def guess_current_year():
-        t = Term.objects.filter(is_active=True).first()
+        t = academic_calendar.active_term()
         if t:
             return t.academic_year
         c = Class.objects.order_by('-academic_year').values_list('academic_year', flat=True).first()
@@ -1422,144 +1700,103 @@ def promotion_view(request):
     if request.method == 'GET':
         source_year = request.GET.get('source_year') or guess_current_year()
         next_year = AcademicYear.next_code(source_year)
-        years = AcademicYear.objects.all().order_by('-code')
+        years = academic_calendar.academic_years()
         return render(request, 'admin/promotion.html', {
             'source_year': source_year,
             'target_year': next_year,
             'years': years,
+            'stream_policies': STREAM_POLICIES,
+            'stream_policy': settings.PROMOTION_STREAM_POLICY,
         })
 
-    # POST – run promotion
+    # POST – preview the plan, or hand a real run to the job runner
     source_year = request.POST.get('source_year')
     target_year_code = request.POST.get('target_year') or AcademicYear.next_code(source_year)
+    stream_policy = request.POST.get('stream_policy')
+    if stream_policy not in dict(STREAM_POLICIES):
+        stream_policy = settings.PROMOTION_STREAM_POLICY
 
-    # Ensure target AcademicYear exists and is active
-    target_year, _ = AcademicYear.objects.get_or_create(code=target_year_code, defaults={'is_active': True})
-
-    # Optionally deactivate other years and activate this one
-    if request.POST.get('activate_target') == 'on':
-        AcademicYear.objects.update(is_active=False)
-        target_year.is_active = True
-        target_year.save()
-
-    # Ensure classes exist for target year; copy basic metadata and promotion_rank
-    current_classes = list(Class.objects.filter(academic_year=source_year))
-    existing_target = {(c.name, c.level): c for c in Class.objects.filter(academic_year=target_year_code)}
-    for c in current_classes:
-        key = (c.name, c.level)
-        if key not in existing_target:
-            Class.objects.create(
-                name=c.name,
-                level=c.level,
-                class_teacher=None,
-                academic_year=target_year_code,
-                promotion_rank=c.promotion_rank,
-            )
-    target_classes = { (c.name, c.level, c.promotion_rank): c for c in Class.objects.filter(academic_year=target_year_code) }
-
-    # Build helper to resolve next class by promotion_rank
-    def next_class_for(current: Class):
-        # Prefer rank +1 match within target year
-        for c in target_classes.values():
-            if c.promotion_rank == current.promotion_rank + 1:
-                return c
-        return None
-
-    # Compute per-student averages for source year
-    terms_in_year = Term.objects.filter(academic_year=source_year)
-    students = Student.objects.select_related('user', 'student_class').filter(student_class__academic_year=source_year)
-
-    promoted = 0
-    repeating = 0
-    graduated = 0
-    results = []
+    if request.POST.get('dry_run'):
+        return render(request, 'admin/promotion.html', {
+            'source_year': source_year,
+            'target_year': target_year_code,
+            'years': academic_calendar.academic_years(),
+            'plan': build_promotion_plan(source_year, target_year_code, stream_policy),
+            'stream_policies': STREAM_POLICIES,
+            'stream_policy': stream_policy,
+            'activate_target': request.POST.get('activate_target') == 'on',
+        })
 
-    for s in students:
-        avg = Mark.objects.filter(student=s, term__in=terms_in_year).aggregate(a=Avg('total_marks'))['a'] or 0
-        current_class = s.student_class
-        nxt = next_class_for(current_class) if current_class else None
-        if avg >= 50 and nxt is not None:
-            status = 'promoted'
-            new_class = nxt
-            promoted += 1
-        elif avg >= 50 and nxt is None:
-            status = 'graduated'
-            new_class = None
-            graduated += 1
-        else:
-            status = 'repeating'
-            # Repeat same class in target year (class with same promotion_rank)
-            same_rank = None
-            for c in target_classes.values():
-                if current_class and c.promotion_rank == current_class.promotion_rank:
-                    same_rank = c
-                    break
-            new_class = same_rank
-            repeating += 1
-
-        # Create/Update enrollment for target year
-        enr, _ = Enrollment.objects.update_or_create(
-            student=s,
-            academic_year=target_year,
-            defaults={
-                'class_assigned': new_class,
-                'status': status,
-                'average_score': avg,
-            }
-        )
+    run = PromotionRun.objects.create(
+        source_year=source_year,
+        target_year=target_year_code,
+        stream_policy=stream_policy,
+        activate_target=request.POST.get('activate_target') == 'on',
+        created_by=request.user,
+    )
+    start_promotion_run(run)
 
-        # Update student's current placement
-        if status == 'graduated':
-            s.is_graduated = True
-            s.graduation_year = target_year_code
-            s.student_class = None
-        else:
-            s.is_graduated = False
-            s.graduation_year = None
-            s.student_class = new_class
-        s.save(update_fields=['is_graduated', 'graduation_year', 'student_class'])
+    messages.success(request, f"Promotion run #{run.id} started for {source_year} → {target_year_code}.")
+    return redirect(f"{reverse('promotion_report')}?run={run.id}")
 
-        results.append({
-            'student': s.id,
-            'average': float(avg),
-            'from_class': current_class.name if current_class else '-',
-            'to_class': new_class.name if new_class else ('Graduated' if status=='graduated' else '-'),
-            'status': status,
-        })
 
-    # Build class performance summary for source year
-    class_stats = Mark.objects.filter(term__academic_year=source_year).values('class_assigned__name').annotate(average_score=Avg('total_marks'), count=Count('student', distinct=True)).order_by('class_assigned__name')
+@login_required
+@user_passes_test(is_admin)
+def promotion_report(request):
+    fail_stale_runs()
+    runs = PromotionRun.objects.select_related('created_by')[:50]
+    run_id = request.GET.get('run')
+    if run_id:
+        try:
+            run = get_object_or_404(PromotionRun, id=int(run_id))
+        except ValueError:
+            raise Http404('Invalid promotion run.')
+    else:
+        run = PromotionRun.objects.first()
+    return render(request, 'admin/promotion_report.html', {
+        'runs': runs,
+        'run': run,
+        'source_year': run.source_year if run else None,
+        'target_year': run.target_year if run else None,
+        'promoted': run.promoted if run else 0,
+        'repeating': run.repeating if run else 0,
+        'graduated': run.graduated if run else 0,
+        'class_stats': run.class_stats if run else [],
+    })
 
-    request.session['promotion_report'] = {
-        'source_year': source_year,
-        'target_year': target_year_code,
-        'promoted': promoted,
-        'repeating': repeating,
-        'graduated': graduated,
-        'class_stats': list(class_stats),
-    }
 
-    messages.success(request, f"Promotion completed: {promoted} promoted, {repeating} repeating, {graduated} graduated.")
-    return redirect('promotion_report')
+@login_required
+@user_passes_test(is_admin)
+def promotion_rollback(request, run_id):
+    """Undo a promotion run by restoring the placements it snapshotted."""
+    run = get_object_or_404(PromotionRun, id=run_id)
+    if request.method != 'POST':
+        return redirect(f"{reverse('promotion_report')}?run={run.id}")
+    try:
+        restored = rollback_promotion(run)
+    except RollbackError as exc:
+        messages.error(request, str(exc))
+    else:
+        messages.success(request, f'Run #{run.id} rolled back: {restored} student placements restored.')
+    return redirect(f"{reverse('promotion_report')}?run={run.id}")
 
 
 @login_required
 @user_passes_test(is_admin)
-def promotion_report(request):
-    data = request.session.get('promotion_report') or {}
-    source_year = data.get('source_year')
-    target_year = data.get('target_year')
-    promoted = data.get('promoted', 0)
-    repeating = data.get('repeating', 0)
-    graduated = data.get('graduated', 0)
-    class_stats = data.get('class_stats', [])
-    return render(request, 'admin/promotion_report.html', {
-        'source_year': source_year,
-        'target_year': target_year,
-        'promoted': promoted,
-        'repeating': repeating,
-        'graduated': graduated,
-        'class_stats': class_stats,
+def promotion_run_status(request, run_id):
+    """Progress of a promotion run as JSON (polled by the report page)."""
+    fail_stale_runs()
+    run = get_object_or_404(PromotionRun, id=run_id)
+    return JsonResponse({
+        'id': run.id,
+        'status': run.status,
+        'processed': run.processed,
+        'total': run.total_students,
+        'progress': run.progress,
+        'promoted': run.promoted,
+        'repeating': run.repeating,
+        'graduated': run.graduated,
+        'error': run.error,
     })
 
 
@@ -1619,6 +1856,7 @@ def admin_id_cards(request):
 
 @login_required
 @user_passes_test(is_admin)
+@conditional.download(conditional.school_data('student_id_card'))
 def student_id_card_pdf(request, student_id):
     student = get_object_or_404(Student, id=student_id)
     buffer = BytesIO()
@@ -1640,6 +1878,7 @@ def student_id_card_pdf(request, student_id):
 
 @login_required
 @user_passes_test(is_admin)
+@conditional.download(conditional.school_data('class_student_id_cards'))
 def class_student_id_cards_pdf(request, class_id):
     class_obj = get_object_or_404(Class, id=class_id)
     students = Student.objects.filter(student_class=class_obj).select_related('user').order_by('user__first_name', 'user__last_name')
@@ -1676,6 +1915,7 @@ def class_student_id_cards_pdf(request, class_id):
 
 @login_required
 @user_passes_test(is_admin)
+@conditional.download(conditional.school_data('teacher_id_card'))
 def teacher_id_card_pdf(request, teacher_id):
     teacher = get_object_or_404(Teacher, id=teacher_id)
     buffer = BytesIO()
@@ -1697,6 +1937,7 @@ def teacher_id_card_pdf(request, teacher_id):
 
 @login_required
 @user_passes_test(is_admin)
+@conditional.download(conditional.school_data('all_teacher_id_cards'))
 def all_teacher_id_cards_pdf(request):
     teachers = Teacher.objects.select_related('user').order_by('user__first_name', 'user__last_name')
     buffer = BytesIO()
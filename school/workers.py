@@ -0,0 +1,33 @@
+"""Process pools for CPU-bound bulk jobs (password hashing, image resizing)."""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+
+def _init_worker():
+    # Spawned/forkserver workers start without Django configured
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+class _SerialPool:
+    def map(self, fn, items, chunksize=1):
+        return map(fn, items)
+
+
+@contextmanager
+def process_pool(workers=None):
+    """A process pool (or an in-process stand-in when only one worker is wanted)."""
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        yield _SerialPool()
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        yield pool
+
+
+def chunksize_for(items, workers_hint=32):
+    """A ``map`` chunk size that spreads ``items`` evenly without per-item IPC."""
+    return max(1, len(items) // workers_hint)
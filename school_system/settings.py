@@ -1,4 +1,5 @@
 import os
+import tempfile
 import dj_database_url
 from pathlib import Path
 from dotenv import load_dotenv
@@ -42,6 +43,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'school.middleware.RoleProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -86,6 +88,67 @@ else:
         }
     }
 
+# SQLite tuning, applied to every new connection (Django runs init_command
+# on connect). IMMEDIATE transactions take the write lock when they begin, so
+# concurrent writers queue on the busy timeout instead of failing with
+# "database is locked" when a read lock cannot be upgraded.
+# synchronous=NORMAL is safe under WAL (a power cut can lose the last
+# commits, never corrupt the file). The journal mode is stored in the
+# database file itself, so it is not set here, where every manage.py command
+# would rewrite the file: `manage.py sqlite_journal_mode` switches it to
+# SQLITE_JOURNAL_MODE once. SQLITE_TUNING=False restores Django's defaults;
+# scripts/sqlite_concurrency_benchmark.py compares the two.
+SQLITE_TUNING = os.environ.get('SQLITE_TUNING', 'True') == 'True'
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_PRAGMAS = {
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    # Bytes of the file read through mmap instead of read() calls
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024))),
+    # Page cache per connection; negative values are KiB
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', '-20000')),
+}
+if SQLITE_TUNING and DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('OPTIONS', {}).update({
+        # Seconds to wait for a lock (SQLite's busy_timeout)
+        'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '20000')) / 1000,
+        'transaction_mode': os.environ.get('SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+        'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+    })
+
+# Cache
+# CACHE_BACKEND selects the tier: locmem (per process, the default for
+# development), file (a directory shared by the workers on one host), db (a
+# table in the default database; build.sh runs createcachetable) or redis
+# (any Redis-compatible server at REDIS_URL; needs the redis package).
+# Setting REDIS_URL alone selects redis. Bump CACHE_VERSION when a deploy
+# changes the shape of cached data to orphan every old entry at once.
+REDIS_URL = os.environ.get('REDIS_URL')
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'redis' if REDIS_URL else 'locmem')
+CACHE_BACKENDS = {
+    'locmem': {'BACKEND': 'school.cache.LocMemCache', 'LOCATION': 'school'},
+    'file': {'BACKEND': 'school.cache.FileBasedCache', 'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / 'cache'))},
+    'db': {'BACKEND': 'school.cache.DatabaseCache', 'LOCATION': os.environ.get('CACHE_LOCATION', 'cache_entries')},
+    'redis': {'BACKEND': 'school.cache.RedisCache', 'LOCATION': REDIS_URL or 'redis://127.0.0.1:6379/0'},
+}
+CACHES = {
+    'default': {
+        **CACHE_BACKENDS[CACHE_BACKEND],
+        'KEY_PREFIX': os.environ.get('CACHE_KEY_PREFIX', 'school'),
+        'VERSION': int(os.environ.get('CACHE_VERSION', '1')),
+    },
+}
+if CACHE_BACKEND != 'redis':
+    # Redis evicts by its own policy; the others cull once this many keys exist
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '10000'))}
+# Seconds a cached academic calendar (school/academic_calendar.py) is trusted.
+# Signals drop it at once in the process that wrote, but with a per-process
+# backend (locmem) other processes only see the change when it expires
+CALENDAR_CACHE_TIMEOUT = int(os.environ.get('CALENDAR_CACHE_TIMEOUT', '60'))
+# Seconds the admin dashboard snapshot and other write-invalidated entries
+# are kept with a per-process backend (school.cache.invalidated_timeout); a
+# shared backend keeps them until the data changes
+LOCAL_CACHE_TIMEOUT = int(os.environ.get('LOCAL_CACHE_TIMEOUT', '60'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -106,6 +169,17 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Django's default hashers, plus the wrapper rehash_passwords --upgrade-iterations
+# uses to strengthen old PBKDF2 hashes without the raw password
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'school.hashing.PBKDF2WrappedPBKDF2PasswordHasher',
+]
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -126,17 +200,65 @@ STATICFILES_DIRS = [
     BASE_DIR / 'school' / 'static',
 ]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# Minified bundles written by `manage.py build_assets` (school/assets.py);
+# collected like any other static directory once built
+ASSET_BUILD_DIR = BASE_DIR / 'build' / 'assets'
+if ASSET_BUILD_DIR.exists():
+    STATICFILES_DIRS.append(ASSET_BUILD_DIR)
 
 # Media files (uploaded photos)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Serve MEDIA_URL from Django: logged-in users only, each limited to the
+# photos their role may see, with private immutable caching for
+# content-hashed names. Set to False only when a front-end web server serves
+# MEDIA_ROOT with its own access control
+SERVE_MEDIA = os.environ.get('SERVE_MEDIA', 'True') == 'True'
+
+# Uploads are stored under content-hash names (school/storage.py)
+STORAGES = {
+    'default': {'BACKEND': 'school.storage.ContentHashedStorage'},
+    # Fingerprinted names plus gzip (and brotli, with the Brotli package)
+    # copies written by collectstatic; WhiteNoise serves them with far-future
+    # caching headers
+    'staticfiles': {'BACKEND': 'school.storage.FingerprintedStaticFilesStorage'},
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Stream assignment for automatic promotion: same_stream, balance or first
+PROMOTION_STREAM_POLICY = os.environ.get('PROMOTION_STREAM_POLICY', 'same_stream')
+# Students written per transaction by a promotion run, and whether runs are
+# handed to a background thread (False runs them inside the request)
+PROMOTION_CHUNK_SIZE = int(os.environ.get('PROMOTION_CHUNK_SIZE', '500'))
+PROMOTION_RUN_IN_BACKGROUND = os.environ.get('PROMOTION_RUN_IN_BACKGROUND', 'True') == 'True'
+# Background threads die with their worker; runs with no progress for this
+# long are marked failed (and picked up again by manage.py run_promotions)
+PROMOTION_STALE_MINUTES = int(os.environ.get('PROMOTION_STALE_MINUTES', '10'))
+
+# CSV onboarding: uploads wait for confirmation in IMPORT_UPLOAD_DIR, and the
+# web page takes at most IMPORT_MAX_WEB_ROWS rows because every password is
+# hashed inside the request (~0.4 s of CPU each); larger files go through
+# manage.py import_people
+IMPORT_UPLOAD_DIR = os.environ.get('IMPORT_UPLOAD_DIR', os.path.join(tempfile.gettempdir(), 'school-imports'))
+IMPORT_MAX_WEB_ROWS = int(os.environ.get('IMPORT_MAX_WEB_ROWS', '50'))
+
+# Generated admission numbers and employee IDs: prefix plus a zero-padded
+# counter at least `width` digits wide (see school/sequences.py)
+ID_SEQUENCES = {
+    'student': {
+        'prefix': os.environ.get('STUDENT_ID_PREFIX', 'ST'),
+        'width': int(os.environ.get('STUDENT_ID_WIDTH', '4')),
+    },
+    'teacher': {
+        'prefix': os.environ.get('TEACHER_ID_PREFIX', 'TC'),
+        'width': int(os.environ.get('TEACHER_ID_WIDTH', '4')),
+    },
+}
+
 # Authentication redirects
 LOGIN_URL = '/'  # login view is at project root
 LOGIN_REDIRECT_URL = 'admin_dashboard'
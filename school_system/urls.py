@@ -15,15 +15,16 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path , include
+from django.urls import path , include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from school.views import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('school.urls'))
 ]
 
-# Serve media files in development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Serve media files unless a front-end server handles MEDIA_URL
+if settings.SERVE_MEDIA:
+    urlpatterns += [re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), serve_media)]
@@ -0,0 +1,201 @@
+"""Concurrency benchmark for the SQLite connection settings.
+
+Simulates term-end load: teachers entering marks (the enter_marks write path)
+and bursars posting payments (manage_payments) at the same time, each worker
+its own process with its own connection, as under a multi-worker server. It
+runs once with Django's stock SQLite settings (SQLITE_TUNING=False) and once
+with the tuned profile from settings.py, and reports throughput, "database is
+locked" errors and latency for each.
+
+Everything runs against a throwaway database in a temporary directory; the
+project's db.sqlite3 is never opened.
+
+    python scripts/sqlite_concurrency_benchmark.py --teachers 6 --bursars 2 --ops 150
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import closing
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+PROFILES = {
+    'stock': {'SQLITE_TUNING': 'False'},
+    'tuned': {'SQLITE_TUNING': 'True'},
+}
+# The journal mode lives in the database file; manage.py sqlite_journal_mode
+# sets it on a real deployment
+JOURNAL_MODES = {'stock': 'DELETE', 'tuned': 'WAL'}
+STUDENTS = 120
+SUBJECTS = 8
+
+
+def setup_django(db_path, env):
+    os.environ.update(env)
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'school_system.settings'
+    sys.path.insert(0, str(BASE_DIR))
+    import django
+    django.setup()
+
+
+def prepare(db_path):
+    """Migrate and seed the template database (runs in its own process)."""
+    setup_django(db_path, PROFILES['stock'])
+    import datetime
+    from decimal import Decimal
+
+    from django.core.management import call_command
+    from school.models import Class, ClassFee, Student, Subject, Teacher, Term, User
+
+    call_command('migrate', verbosity=0)
+    today = datetime.date.today()
+    term = Term.objects.create(term='1', academic_year='2024/2025', start_date=today, end_date=today, is_active=True)
+    school_class = Class.objects.create(name='Bench 1', level='1')
+    for i in range(SUBJECTS):
+        Subject.objects.create(name=f'Subject {i}', code=f'BEN{i:03d}')
+    ClassFee.objects.create(class_assigned=school_class, term=term, amount=Decimal('500000'), due_date=today)
+    for i in range(STUDENTS):
+        user = User.objects.create(username=f'bench_student{i}', user_type='student')
+        Student.objects.create(user=user, admission_number=f'BEN{i:05d}', student_class=school_class,
+                               date_of_birth=today, guardian_name='Guardian', guardian_phone='0700000000')
+    for i in range(8):
+        user = User.objects.create(username=f'bench_teacher{i}', user_type='teacher')
+        Teacher.objects.create(user=user, employee_id=f'BENT{i:03d}')
+    User.objects.create(username='bench_bursar', user_type='bursar')
+
+
+def worker(db_path, env, role, ops, seed, barrier, results):
+    setup_django(db_path, env)
+    from decimal import Decimal
+
+    from django.db import IntegrityError, OperationalError, connection
+    from django.db.models import Avg, Count, Sum
+    from school.models import Class, FeePayment, Mark, Student, Subject, Teacher, Term, User
+
+    rng = random.Random(seed)
+    term = Term.objects.get(is_active=True)
+    school_class = Class.objects.get()
+    students = list(Student.objects.values_list('id', flat=True))
+    subjects = list(Subject.objects.values_list('id', flat=True))
+    teacher = Teacher.objects.order_by('id')[seed % Teacher.objects.count()]
+    bursar = User.objects.get(username='bench_bursar')
+    connection.close()
+
+    def enter_marks():
+        mark, _ = Mark.objects.get_or_create(
+            student_id=rng.choice(students), subject_id=rng.choice(subjects), term=term,
+            class_assigned=school_class, defaults={'teacher': teacher},
+        )
+        mark.assignment_marks = Decimal(rng.randint(0, 20))
+        mark.midterm_marks = Decimal(rng.randint(0, 30))
+        mark.exam_marks = Decimal(rng.randint(0, 50))
+        mark.save()
+
+    def class_summary():
+        Mark.objects.filter(term=term, class_assigned=school_class).aggregate(Avg('total_marks'), Count('id'))
+
+    def post_payment():
+        FeePayment.objects.create(
+            student_id=rng.choice(students), term=term, amount_paid=Decimal(rng.randint(1, 50) * 1000),
+            payment_method='cash', processed_by=bursar,
+        )
+
+    def term_collections():
+        FeePayment.objects.filter(term=term).aggregate(Sum('amount_paid'))
+
+    write, read = (enter_marks, class_summary) if role == 'teacher' else (post_payment, term_collections)
+    outcome = {'ok': 0, 'locked': 0, 'conflict': 0, 'other': 0, 'latencies': []}
+    barrier.wait()
+    started = time.perf_counter()
+    for i in range(ops):
+        # One dashboard read for every three writes
+        operation = read if i % 4 == 3 else write
+        begin = time.perf_counter()
+        try:
+            operation()
+        except OperationalError as exc:
+            outcome['locked' if 'locked' in str(exc) else 'other'] += 1
+            continue
+        except IntegrityError:
+            # Two payments racing for the same receipt number
+            outcome['conflict'] += 1
+            continue
+        outcome['ok'] += 1
+        outcome['latencies'].append(time.perf_counter() - begin)
+    outcome['elapsed'] = time.perf_counter() - started
+    connection.close()
+    results.put(outcome)
+
+
+def run_profile(ctx, template, workdir, name, args):
+    db_path = Path(workdir) / f'{name}.sqlite3'
+    shutil.copyfile(template, db_path)
+    with closing(sqlite3.connect(db_path)) as db:
+        db.execute(f'PRAGMA journal_mode={JOURNAL_MODES[name]}')
+    roles = ['teacher'] * args.teachers + ['bursar'] * args.bursars
+    barrier = ctx.Barrier(len(roles))
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=worker, args=(str(db_path), PROFILES[name], role, args.ops, seed, barrier, results))
+        for seed, role in enumerate(roles)
+    ]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    latencies = sorted(latency for outcome in outcomes for latency in outcome['latencies'])
+    total = len(roles) * args.ops
+    ok = sum(outcome['ok'] for outcome in outcomes)
+    locked = sum(outcome['locked'] for outcome in outcomes)
+    return {
+        'ops': total,
+        'ok': ok,
+        'locked': locked,
+        'conflict': sum(outcome['conflict'] for outcome in outcomes),
+        'other': sum(outcome['other'] for outcome in outcomes),
+        'lock_rate': locked / total * 100,
+        'throughput': ok / max(outcome['elapsed'] for outcome in outcomes),
+        'p50': statistics.median(latencies) * 1000 if latencies else 0,
+        'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--teachers', type=int, default=6, help='concurrent mark-entry workers')
+    parser.add_argument('--bursars', type=int, default=2, help='concurrent payment workers')
+    parser.add_argument('--ops', type=int, default=150, help='operations per worker')
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    workdir = tempfile.mkdtemp(prefix='sqlite-bench-')
+    try:
+        template = Path(workdir) / 'template.sqlite3'
+        seeding = ctx.Process(target=prepare, args=(str(template),))
+        seeding.start()
+        seeding.join()
+        if seeding.exitcode:
+            sys.exit('Seeding the benchmark database failed')
+
+        print(f'{args.teachers} teachers + {args.bursars} bursars, {args.ops} operations each\n')
+        print(f"{'profile':<8}{'ops':>7}{'ok':>7}{'locked':>8}{'lock %':>8}{'conflict':>10}{'other':>7}{'ops/s':>9}{'p50 ms':>9}{'p95 ms':>9}")
+        for name in PROFILES:
+            r = run_profile(ctx, template, workdir, name, args)
+            print(f"{name:<8}{r['ops']:>7}{r['ok']:>7}{r['locked']:>8}{r['lock_rate']:>8.1f}{r['conflict']:>10}{r['other']:>7}"
+                  f"{r['throughput']:>9.1f}{r['p50']:>9.1f}{r['p95']:>9.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()